@@ -0,0 +1,157 @@
+# Time-series order analytics backed by pre-aggregated rollups
+#
+# order_rollups holds one row per (restaurant, granularity, bucket_start) for hourly
+# and daily buckets. Order writes adjust the affected rows in the same transaction
+# (record_order), so dashboard reads only touch the handful of rows in the requested
+# range, however long the order history is. Weekly series are folded from daily rows.
+#
+# Backfill existing data with:  python analytics.py backfill
+import asyncio
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import delete, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import OrderRollup, Order, ArchivedOrder
+
+GRANULARITIES = ("hour", "day")
+BUCKETS = ("hour", "day", "week")
+# Orders in these statuses don't count towards volume or revenue
+EXCLUDED_STATUSES = ("cancelled",)
+
+
+# Normalize to naive UTC (how SQLite hands timestamps back)
+def to_naive_utc(ts: datetime) -> datetime:
+    if ts.tzinfo is not None:
+        ts = ts.astimezone(timezone.utc).replace(tzinfo=None)
+    return ts
+
+
+# Start of the bucket containing `ts`
+def bucket_start(ts: datetime, bucket: str) -> datetime:
+    ts = to_naive_utc(ts).replace(minute=0, second=0, microsecond=0)
+    if bucket == "hour":
+        return ts
+    ts = ts.replace(hour=0)
+    if bucket == "day":
+        return ts
+    return ts - timedelta(days=ts.weekday())  # weeks start on Monday
+
+
+# INSERT ... ON CONFLICT DO UPDATE adding the deltas to an existing rollup row
+def _upsert(dialect: str, rows: List[dict]):
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = dialect_insert(OrderRollup).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[OrderRollup.restaurant_id, OrderRollup.granularity, OrderRollup.bucket_start],
+        set_={
+            "order_count": OrderRollup.order_count + stmt.excluded.order_count,
+            "revenue": OrderRollup.revenue + stmt.excluded.revenue,
+        },
+    )
+
+
+# Apply an order write to the rollups. Runs in the caller's transaction (no commit).
+async def record_order(
+    db: AsyncSession, restaurant_id: int, order_date: datetime,
+    count_delta: int = 1, revenue_delta: Decimal = Decimal("0")
+) -> None:
+    rows = [
+        {
+            "restaurant_id": restaurant_id,
+            "granularity": granularity,
+            "bucket_start": bucket_start(order_date, granularity),
+            "order_count": count_delta,
+            "revenue": revenue_delta,
+        }
+        for granularity in GRANULARITIES
+    ]
+    await db.execute(_upsert(db.bind.dialect.name, rows))
+
+
+# Rebuild rollups from the hot and archived order tables. Rows are streamed and folded
+# into per-bucket totals in memory (one entry per bucket, not per order), then written
+# back in batches. Pass restaurant_id to rebuild a single restaurant.
+async def backfill(db: AsyncSession, restaurant_id: Optional[int] = None, batch_size: int = 1000) -> int:
+    queries = []
+    for table in (Order, ArchivedOrder):
+        query = select(table.restaurant_id, table.order_date, table.total_amount).where(
+            table.order_status.notin_(EXCLUDED_STATUSES)
+        )
+        if restaurant_id is not None:
+            query = query.where(table.restaurant_id == restaurant_id)
+        queries.append(query)
+
+    totals: Dict[Tuple[int, str, datetime], List] = defaultdict(lambda: [0, Decimal("0")])
+    stream = await db.stream(union_all(*queries).execution_options(yield_per=batch_size))
+    async for rid, order_date, amount in stream:
+        if order_date is None:
+            continue
+        for granularity in GRANULARITIES:
+            entry = totals[(rid, granularity, bucket_start(order_date, granularity))]
+            entry[0] += 1
+            entry[1] += Decimal(str(amount or 0))
+
+    clear = delete(OrderRollup)
+    if restaurant_id is not None:
+        clear = clear.where(OrderRollup.restaurant_id == restaurant_id)
+    await db.execute(clear)
+    rows = [
+        {"restaurant_id": rid, "granularity": granularity, "bucket_start": start,
+         "order_count": count, "revenue": revenue}
+        for (rid, granularity, start), (count, revenue) in totals.items()
+    ]
+    for i in range(0, len(rows), batch_size):
+        await db.execute(_upsert(db.bind.dialect.name, rows[i:i + batch_size]))
+    await db.commit()
+    return len(rows)
+
+
+# Time series for one restaurant over [start, end) in hour/day/week buckets
+async def get_series(db: AsyncSession, restaurant_id: int, start: datetime, end: datetime, bucket: str) -> List[dict]:
+    granularity = "hour" if bucket == "hour" else "day"
+    result = await db.execute(
+        select(OrderRollup.bucket_start, OrderRollup.order_count, OrderRollup.revenue)
+        .where(
+            OrderRollup.restaurant_id == restaurant_id,
+            OrderRollup.granularity == granularity,
+            OrderRollup.bucket_start >= bucket_start(start, granularity),
+            OrderRollup.bucket_start < to_naive_utc(end),
+        )
+        .order_by(OrderRollup.bucket_start)
+    )
+    series: Dict[datetime, List] = {}
+    for start_ts, count, revenue in result:
+        entry = series.setdefault(bucket_start(start_ts, bucket), [0, Decimal("0")])
+        entry[0] += count
+        entry[1] += Decimal(str(revenue or 0))
+    return [
+        {
+            "bucket_start": start_ts,
+            "order_count": count,
+            "revenue": float(revenue),
+            "average_ticket": float(revenue / count) if count else 0.0,
+        }
+        for start_ts, (count, revenue) in series.items()
+        if count
+    ]
+
+
+if __name__ == "__main__":
+    import sys
+    from database import AsyncSessionLocal, engine
+    import migrations
+
+    async def _main() -> None:
+        await migrations.upgrade(engine)
+        async with AsyncSessionLocal() as session:
+            rid = int(sys.argv[2]) if len(sys.argv) > 2 else None
+            print(f"Rebuilt {await backfill(session, restaurant_id=rid)} rollup rows")
+
+    if len(sys.argv) < 2 or sys.argv[1] != "backfill":
+        sys.exit("usage: python analytics.py backfill [restaurant_id]")
+    asyncio.run(_main())
@@ -0,0 +1,125 @@
+# Benchmark: cost of the route layer (routing, validation, serialization) against the
+# database-backed repository and the in-memory one
+# Run from the zomato_v1 directory:  python benchmarks/bench_routes.py [--profile memory|sql]
+#
+# Requests go through the ASGI app in process (httpx ASGITransport, no sockets, startup
+# events not run), with the response cache off. Both backends get the same data through
+# the repository API: BENCH_RESTAURANTS restaurants with BENCH_MENU_SIZE dishes each and
+# BENCH_CUSTOMERS customers; the database one is a fresh SQLite file in a temporary
+# directory. The difference between the two runs is what the storage costs; what the
+# memory run still spends is the framework and our own route code. --profile prints the
+# top functions (cProfile, cumulative) of one backend's run.
+import asyncio
+import cProfile
+import os
+import pstats
+import random
+import shutil
+import sys
+import tempfile
+import time
+from datetime import time as clock
+from decimal import Decimal
+
+APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP)
+WORKDIR = tempfile.mkdtemp(prefix="bench_routes_")
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{WORKDIR}/bench.db"  # never seed a real database
+os.environ.setdefault("SQL_ECHO", "0")
+
+import httpx
+from fastapi_cache import FastAPICache
+from fastapi_cache.backends.inmemory import InMemoryBackend
+
+import database
+import main
+import migrations
+from repository import MemoryRepository, SqlRepository, get_repository
+from schemas import CustomerCreate, MenuItemCreate, RestaurantCreate
+
+REQUESTS = int(os.getenv("BENCH_REQUESTS", "5000"))
+RESTAURANTS = int(os.getenv("BENCH_RESTAURANTS", "50"))
+MENU_SIZE = int(os.getenv("BENCH_MENU_SIZE", "20"))
+CUSTOMERS = int(os.getenv("BENCH_CUSTOMERS", "200"))
+CUISINES = ["Italian", "Indian", "Thai", "Mexican", "Japanese"]
+
+
+async def seed(repo) -> None:
+    for i in range(1, RESTAURANTS + 1):
+        restaurant = await repo.create_restaurant(RestaurantCreate(
+            name=f"Restaurant {i}", description="A long description " * 5, cuisine_type=CUISINES[i % len(CUISINES)],
+            address=f"{i} Main Street", phone_number="+1234567890", opening_time=clock(9), closing_time=clock(22)
+        ))
+        for j in range(MENU_SIZE):
+            await repo.create_menu_item(restaurant.id, MenuItemCreate(
+                name=f"Dish {j}", description="Tasty", price=Decimal("9.99"), category=["Main", "Starter"][j % 2],
+                is_vegetarian=j % 3 == 0, preparation_time=15
+            ))
+    for i in range(1, CUSTOMERS + 1):
+        await repo.create_customer(CustomerCreate(
+            name=f"Customer {i}", email=f"customer{i}@example.com", phone_number="+1234567890", address=f"{i} Side Street"
+        ))
+
+
+# The request mix: the repository-backed reads
+def pick_path(rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.35:
+        return f"/restaurants/{rng.randint(1, RESTAURANTS)}"
+    if roll < 0.60:
+        return f"/restaurants/{rng.randint(1, RESTAURANTS)}/menu?limit=20"
+    if roll < 0.75:
+        return f"/menu-items/{rng.randint(1, RESTAURANTS * MENU_SIZE)}"
+    if roll < 0.85:
+        return f"/customers/{rng.randint(1, CUSTOMERS)}"
+    if roll < 0.95:
+        return f"/restaurants/search?cuisine={rng.choice(CUISINES)}"
+    return "/menu-items/search/?category=main&vegetarian=true"
+
+
+async def drive(profile: bool) -> float:
+    rng = random.Random(0)
+    paths = [pick_path(rng) for _ in range(REQUESTS)]
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        for path in paths[:100]:  # warm up
+            assert (await client.get(path)).status_code == 200, path
+        profiler = cProfile.Profile() if profile else None
+        started = time.perf_counter()
+        if profiler:
+            profiler.enable()
+        for path in paths:
+            await client.get(path)
+        if profiler:
+            profiler.disable()
+        elapsed = time.perf_counter() - started
+    if profiler:
+        pstats.Stats(profiler).sort_stats("cumulative").print_stats(25)
+    return REQUESTS / elapsed
+
+
+async def main_async(profile: str) -> None:
+    FastAPICache.init(InMemoryBackend(), prefix="fastapi-cache", enable=False)
+    await migrations.upgrade(database.engine)
+    async with database.AsyncSessionLocal() as session:
+        await seed(SqlRepository(session))
+    memory = MemoryRepository()
+    await seed(memory)
+
+    main.app.dependency_overrides.pop(get_repository, None)
+    sql_rate = await drive(profile == "sql")
+    main.app.dependency_overrides[get_repository] = lambda: memory
+    memory_rate = await drive(profile == "memory")
+    main.app.dependency_overrides.pop(get_repository, None)
+
+    print(f"{REQUESTS} requests, {RESTAURANTS} restaurants x {MENU_SIZE} dishes, {CUSTOMERS} customers")
+    print(f"sql      {sql_rate:8.0f} req/s   {1e3 / sql_rate:6.3f} ms/request")
+    print(f"memory   {memory_rate:8.0f} req/s   {1e3 / memory_rate:6.3f} ms/request")
+    print(f"storage share of the sql request time: {1 - sql_rate / memory_rate:.0%}")
+    await database.engine.dispose()
+    shutil.rmtree(WORKDIR, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    profile = sys.argv[2] if len(sys.argv) > 2 and sys.argv[1] == "--profile" else ""
+    asyncio.run(main_async(profile))
@@ -0,0 +1,61 @@
+# Benchmark: FastAPI's default response path vs. the compiled-serializer + orjson path
+# Run from the zomato_v1 directory:  python benchmarks/bench_serialization.py
+import json
+import os
+import sys
+import timeit
+from datetime import datetime, time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.encoders import jsonable_encoder
+
+from models import Restaurant, MenuItem
+from schemas import RestaurantOut, RestaurantWithMenu
+from serializers import SERIALIZERS, FastJSONResponse
+
+NOW = datetime(2024, 1, 1, 12, 0, 0)
+
+
+# Build detached ORM rows shaped like what the DB returns
+def make_restaurant(i: int, menu_size: int = 0) -> Restaurant:
+    restaurant = Restaurant(
+        id=i, name=f"Restaurant {i}", description="A long description " * 10,
+        cuisine_type="Italian", address=f"{i} Main Street", phone_number="+1234567890",
+        rating=4.2, is_active=True, opening_time=time(9), closing_time=time(22),
+        created_at=NOW, updated_at=NOW
+    )
+    restaurant.menu_items = [
+        MenuItem(
+            id=i * 1000 + j, name=f"Dish {j}", description="Tasty", price=Decimal("9.99"),
+            category="Main", is_vegetarian=j % 2 == 0, is_vegan=False, is_available=True,
+            preparation_time=15, restaurant_id=i, created_at=NOW, updated_at=NOW
+        )
+        for j in range(menu_size)
+    ]
+    return restaurant
+
+
+# What FastAPI does today: validate through the response_model, jsonable_encoder, json.dumps
+def current_path(schema, rows):
+    validated = [schema.from_orm(row) for row in rows]
+    return json.dumps(jsonable_encoder(validated)).encode()
+
+
+# Trusted path: compiled attribute copy + orjson
+def fast_path(schema, rows):
+    serializer = SERIALIZERS[schema]
+    return FastJSONResponse([serializer(row) for row in rows]).body
+
+
+def bench(label, schema, rows, number):
+    assert json.loads(current_path(schema, rows)) == json.loads(fast_path(schema, rows))
+    slow = min(timeit.repeat(lambda: current_path(schema, rows), number=number, repeat=5))
+    fast = min(timeit.repeat(lambda: fast_path(schema, rows), number=number, repeat=5))
+    print(f"{label:<40} current {slow / number * 1e3:8.3f} ms   fast {fast / number * 1e3:8.3f} ms   x{slow / fast:5.1f}")
+
+
+if __name__ == "__main__":
+    bench("list_restaurants (100 x RestaurantOut)", RestaurantOut, [make_restaurant(i) for i in range(100)], 50)
+    bench("full-details (1 x 200 menu items)", RestaurantWithMenu, [make_restaurant(1, 200)], 50)
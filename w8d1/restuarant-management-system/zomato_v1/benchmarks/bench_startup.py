@@ -0,0 +1,86 @@
+# Benchmark: cold start to first request, and the slowest first-party imports
+# Run from the zomato_v1 directory:  python benchmarks/bench_startup.py [runs]
+#
+# Each run is a fresh interpreter: import main, run the startup event, serve one
+# GET /restaurants/. "new db" starts from an empty SQLite file (schema created),
+# "existing db" reuses it (schema version check only). Redis is not required: cache
+# writes fail fast and are logged, as they would be with Redis down.
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = """
+import json, logging, sys, time
+from fastapi.testclient import TestClient  # test harness import, not part of the app
+logging.disable(logging.CRITICAL)
+sys.path.insert(0, {app!r})
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+with TestClient(main.app) as client:
+    ready = time.perf_counter()
+    client.get("/restaurants/")
+    served = time.perf_counter()
+print(json.dumps({{
+    "import_ms": (imported - started) * 1000,
+    "startup_ms": (ready - imported) * 1000,
+    "first_request_ms": (served - ready) * 1000,
+    "total_ms": (served - started) * 1000,
+}}))
+"""
+
+
+def run_once(workdir: str) -> dict:
+    env = dict(os.environ, JOB_WORKERS="0")
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD.format(app=APP)], cwd=workdir, env=env,
+        capture_output=True, text=True, check=True
+    )
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+# Cumulative import time (ms) of first-party modules, slowest first
+def slowest_imports(limit: int = 10) -> list:
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"], cwd=APP,
+        capture_output=True, text=True, check=True
+    )
+    first_party = {name[:-3] for name in os.listdir(APP) if name.endswith(".py")} | {"routes"}
+    timings = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name.strip()
+        if name.split(".")[0] in first_party and cumulative.strip().isdigit():
+            timings.append((int(cumulative) / 1000, name))
+    return sorted(timings, reverse=True)[:limit]
+
+
+def report(label: str, runs: list) -> None:
+    print(f"{label}:")
+    for key in ("import_ms", "startup_ms", "first_request_ms", "total_ms"):
+        values = [run[key] for run in runs]
+        print(f"  {key:<17} median {statistics.median(values):8.1f}   min {min(values):8.1f}")
+
+
+def main(runs: int) -> None:
+    new_db, existing_db = [], []
+    for _ in range(runs):
+        with tempfile.TemporaryDirectory() as workdir:
+            new_db.append(run_once(workdir))
+            existing_db.append(run_once(workdir))
+    report(f"Cold start, new db ({runs} runs)", new_db)
+    report(f"Cold start, existing db ({runs} runs)", existing_db)
+    print("Slowest first-party imports (cumulative ms):")
+    for ms, name in slowest_imports():
+        print(f"  {ms:8.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 5)
@@ -0,0 +1,138 @@
+# Benchmark: API throughput by number of gunicorn worker processes
+# Run from the zomato_v1 directory:  python benchmarks/bench_workers.py [workers ...]
+#
+# Seeds a SQLite database in a temporary directory with seed.py (BENCH_SCALE, default
+# small), then for each worker count starts `gunicorn -c gunicorn_conf.py main:app`,
+# waits for /ready and drives a read-heavy mix of endpoints from CLIENT_PROCS
+# load-generator processes for DURATION seconds.
+# Reports requests/second and latency percentiles per worker count.
+#
+# By default the response cache is off (CACHE_ENABLED=0), so every request does the
+# database, validation and JSON work that extra workers are meant to spread over more
+# cores; set BENCH_CACHE=1 (needs Redis at REDIS_URL) to measure the cached path.
+# Throughput can only scale up to the number of cores left over by the load generators.
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+APP = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, APP)
+
+from seed import SCALES
+
+DURATION = float(os.getenv("BENCH_DURATION", "10"))
+CONCURRENCY = int(os.getenv("BENCH_CONCURRENCY", "32"))  # open requests per load generator
+CLIENT_PROCS = int(os.getenv("BENCH_CLIENT_PROCS", "2"))
+PORT = int(os.getenv("BENCH_PORT", "8765"))
+SCALE = os.getenv("BENCH_SCALE", "small")
+RESTAURANTS, CUSTOMERS = SCALES[SCALE]["restaurants"], SCALES[SCALE]["customers"]
+
+
+# The shared benchmark dataset (seed.py, fixed seed), built in `workdir`
+def seed(workdir: str) -> None:
+    subprocess.run([sys.executable, os.path.join(APP, "seed.py"), "--scale", SCALE], cwd=workdir, check=True,
+                   env=dict(os.environ, SQL_ECHO="0"), capture_output=True)
+
+
+# The request mix: mostly restaurant and menu reads, some customer reads
+def pick_path(rng: random.Random) -> str:
+    roll = rng.random()
+    if roll < 0.35:
+        return f"/restaurants/{rng.randint(1, RESTAURANTS)}"
+    if roll < 0.60:
+        return f"/restaurants/{rng.randint(1, RESTAURANTS)}/menu"
+    if roll < 0.75:
+        return f"/restaurants/?skip={rng.randint(0, 10) * 10}&limit=10"
+    if roll < 0.90:
+        return f"/customers/{rng.randint(1, CUSTOMERS)}/orders"
+    return "/menu-items/popular?window=24h"
+
+
+# One load-generator process: CONCURRENCY request loops until the deadline
+def drive(seed_value: int, deadline: float, results) -> None:
+    import httpx
+
+    async def run() -> dict:
+        rng = random.Random(seed_value)
+        latencies, errors = [], 0
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=30) as client:
+            async def loop() -> None:
+                nonlocal errors
+                while time.time() < deadline:
+                    started = time.perf_counter()
+                    response = await client.get(pick_path(rng))
+                    if response.status_code >= 500:
+                        errors += 1
+                    latencies.append(time.perf_counter() - started)
+            await asyncio.gather(*(loop() for _ in range(CONCURRENCY)))
+        return {"latencies": latencies, "errors": errors}
+
+    results.put(asyncio.run(run()))
+
+
+def wait_ready(timeout: float = 60) -> None:
+    import httpx
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            if httpx.get(f"http://127.0.0.1:{PORT}/ready", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("server did not become ready")
+
+
+def run(workdir: str, workers: int) -> dict:
+    env = dict(
+        os.environ, WEB_CONCURRENCY=str(workers), BIND=f"127.0.0.1:{PORT}", JOB_WORKERS="0",
+        CACHE_ENABLED=os.getenv("BENCH_CACHE", "0"), PYTHONPATH=APP
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", os.path.join(APP, "gunicorn_conf.py"), "main:app"],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_ready()
+        results = multiprocessing.Queue()
+        deadline = time.time() + DURATION
+        clients = [multiprocessing.Process(target=drive, args=(i, deadline, results)) for i in range(CLIENT_PROCS)]
+        for client in clients:
+            client.start()
+        outcomes = [results.get() for _ in clients]
+        for client in clients:
+            client.join()
+    finally:
+        server.terminate()
+        server.wait(timeout=60)
+    latencies = sorted(latency for outcome in outcomes for latency in outcome["latencies"])
+    return {
+        "workers": workers,
+        "requests_per_second": round(len(latencies) / DURATION, 1),
+        "p50_ms": round(statistics.median(latencies) * 1000, 1),
+        "p99_ms": round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 1),
+        "errors": sum(outcome["errors"] for outcome in outcomes),
+    }
+
+
+def main(worker_counts: list) -> None:
+    print(f"{multiprocessing.cpu_count()} cores, {CLIENT_PROCS} load generators x {CONCURRENCY} connections, {DURATION:.0f}s per run")
+    with tempfile.TemporaryDirectory() as workdir:
+        seed(workdir)
+        baseline = None
+        for workers in worker_counts:
+            result = run(workdir, workers)
+            baseline = baseline or result["requests_per_second"]
+            result["speedup"] = round(result["requests_per_second"] / baseline, 2)
+            print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main([int(arg) for arg in sys.argv[1:]] or [1, 2, 4])
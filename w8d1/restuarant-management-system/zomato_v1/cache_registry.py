@@ -0,0 +1,79 @@
+# Registries of cache entries, so a group of them can be invalidated together
+#
+# A registry is a named set of members (strings identifying cache entries), each scored
+# with the time its entry expires. Expired members are pruned on every add and read, so
+# a registry only holds what may still be in the cache, however many distinct entries
+# (search terms, list pages...) have come and gone before.
+#
+# Registries live in a Redis sorted set so every worker process can invalidate what the
+# others cached; backends without Redis serve a single process and keep them in memory.
+import time
+from collections import defaultdict
+from typing import Dict, Iterable, List, Set
+
+from fastapi_cache import FastAPICache
+
+# name -> {member: expires_at}, for backends without Redis
+_local: Dict[str, Dict[str, float]] = defaultdict(dict)
+
+
+def _key(name: str) -> str:
+    return f"{FastAPICache.get_prefix()}:registry:{name}"
+
+
+def _prune_local(name: str, now: float) -> Dict[str, float]:
+    registry = _local[name]
+    for member in [m for m, expires_at in registry.items() if expires_at <= now]:
+        del registry[member]
+    return registry
+
+
+# (Re)register a member; the newest entry stored under it sets its expiry
+async def add(name: str, member: str, expires_at: float) -> None:
+    redis = getattr(FastAPICache.get_backend(), "redis", None)
+    now = time.time()
+    if redis is None:
+        _prune_local(name, now)[member] = expires_at
+        return
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zremrangebyscore(_key(name), "-inf", now)
+        pipe.zadd(_key(name), {member: expires_at})
+        await pipe.execute()
+
+
+# The members whose entries have not expired yet
+async def members(name: str) -> Set[str]:
+    redis = getattr(FastAPICache.get_backend(), "redis", None)
+    now = time.time()
+    if redis is None:
+        return set(_prune_local(name, now))
+    async with redis.pipeline(transaction=False) as pipe:
+        pipe.zremrangebyscore(_key(name), "-inf", now)
+        pipe.zrange(_key(name), 0, -1)
+        _, found = await pipe.execute()
+    return {m.decode() if isinstance(m, bytes) else m for m in found}
+
+
+async def remove(name: str, stale: Iterable[str]) -> None:
+    stale = list(stale)
+    redis = getattr(FastAPICache.get_backend(), "redis", None)
+    if redis is None:
+        for member in stale:
+            _local[name].pop(member, None)
+    elif stale:
+        await redis.zrem(_key(name), *stale)
+
+
+# Delete cache entries by key (the registered ones, once a group is invalidated)
+async def delete_entries(keys: List[str]) -> None:
+    backend = FastAPICache.get_backend()
+    redis = getattr(backend, "redis", None)
+    if redis is not None:
+        if keys:
+            await redis.delete(*keys)
+        return
+    for key in keys:
+        try:
+            await backend.clear(key=key)
+        except KeyError:  # already expired
+            pass
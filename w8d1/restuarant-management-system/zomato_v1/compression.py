@@ -0,0 +1,306 @@
+# Response compression: gzip/brotli middleware and a cache of precompressed JSON bodies
+import asyncio
+import gzip
+import logging
+import math
+import os
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from fastapi import Request, Response
+from fastapi_cache import FastAPICache
+from starlette.datastructures import Headers
+from starlette.middleware.gzip import GZipMiddleware, IdentityResponder
+from starlette.types import ASGIApp, Receive, Scope, Send
+
+import cache_registry
+from serializers import FastJSONResponse
+from singleflight import SingleFlight
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Bodies smaller than this are sent as-is; compressing them costs more than it saves
+MINIMUM_SIZE = int(os.getenv("COMPRESSION_MINIMUM_SIZE", "500"))
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# Every encoding choose_encoding can pick on this install
+ENCODINGS = ("br", "gzip", "identity") if brotli is not None else ("gzip", "identity")
+# Seconds an expired entry may still be served while it is rebuilt in the background
+STALE_GRACE = int(os.getenv("CACHE_STALE_GRACE", "30"))
+# >1 refreshes earlier, <1 later (see _should_refresh)
+XFETCH_BETA = float(os.getenv("CACHE_XFETCH_BETA", "1.0"))
+
+# A worker that finds a key being built by another worker process polls the shared
+# cache this long (at most) before building it itself
+FILL_LOCK_TIMEOUT = float(os.getenv("CACHE_FILL_LOCK_TIMEOUT", "5"))
+FILL_POLL_INTERVAL = 0.05
+
+# In-flight document builds, per cache key (this process)
+_flights = SingleFlight()
+
+
+# Pick the best encoding the client accepts: br > gzip > identity
+def choose_encoding(accept_encoding: str) -> str:
+    accepted = set()
+    for part in accept_encoding.split(","):
+        name, _, params = part.partition(";")
+        quality = params.strip()
+        if quality.startswith("q="):
+            try:
+                if float(quality[2:]) == 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(name.strip().lower())
+    if brotli is not None and "br" in accepted:
+        return "br"
+    if "gzip" in accepted:
+        return "gzip"
+    return "identity"
+
+
+# One-shot compression of a complete body
+def compress(body: bytes, encoding: str) -> bytes:
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    if encoding == "gzip":
+        return gzip.compress(body, compresslevel=GZIP_LEVEL)
+    return body
+
+
+# Streaming brotli counterpart of starlette's GZipResponder
+class BrotliResponder(IdentityResponder):
+    content_encoding = "br"
+
+    def __init__(self, app: ASGIApp, minimum_size: int) -> None:
+        super().__init__(app, minimum_size)
+        self.compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+
+    def apply_compression(self, body: bytes, *, more_body: bool) -> bytes:
+        data = self.compressor.process(body)
+        if not more_body:
+            data += self.compressor.finish()
+        return data
+
+
+# gzip middleware that prefers brotli when the client accepts it and brotli is installed.
+# Responses that already carry a Content-Encoding (see cached_json) are passed through untouched.
+class CompressionMiddleware(GZipMiddleware):
+    def __init__(self, app: ASGIApp, minimum_size: int = MINIMUM_SIZE) -> None:
+        super().__init__(app, minimum_size=minimum_size, compresslevel=GZIP_LEVEL)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] == "http" and brotli is not None:
+            if choose_encoding(Headers(scope=scope).get("Accept-Encoding", "")) == "br":
+                await BrotliResponder(self.app, self.minimum_size)(scope, receive, send)
+                return
+        await super().__call__(scope, receive, send)
+
+
+def _cache_key(key: str, encoding: str) -> str:
+    return f"{FastAPICache.get_prefix()}:resp:{key}:{encoding}"
+
+
+# (encoding actually used, body); small bodies stay uncompressed
+def _encode(body: bytes, encoding: str) -> tuple:
+    if len(body) < MINIMUM_SIZE:
+        encoding = "identity"
+    return encoding, compress(body, encoding)
+
+
+# Entries are b"<encoding>:<expires_at>:<build seconds>:<body>". The backend keeps them
+# STALE_GRACE seconds past expires_at so an expired entry can still be served while
+# it is refreshed. Anything that doesn't parse is treated as a miss.
+def _pack(encoding: str, blob: bytes, expires_at: float, delta: float) -> bytes:
+    return f"{encoding}:{expires_at:.3f}:{delta:.4f}:".encode() + blob
+
+
+def _unpack(entry: bytes) -> Optional[Tuple[str, bytes, float, float]]:
+    try:
+        encoding, expires_at, delta, blob = entry.split(b":", 3)
+        return encoding.decode(), blob, float(expires_at), float(delta)
+    except ValueError:
+        return None
+
+
+# Probabilistic early expiration ("XFetch"): the closer to expiry, and the longer the
+# document takes to build, the likelier a read is to trigger a refresh ahead of time.
+# Hot keys are therefore refreshed before they expire, by one request, at a random time.
+def _should_refresh(expires_at: float, delta: float, now: float) -> bool:
+    return now - delta * XFETCH_BETA * math.log(1.0 - random.random()) >= expires_at
+
+
+def _registry(group: str) -> str:
+    return f"json:{group}"
+
+
+# Build a document once and store it in every encoding; returns {requested: (encoding, blob)}.
+# With a group, the key is registered under it for invalidate_json.
+async def _fill(
+    key: str, expire: int, build: Callable[[], Awaitable[Any]], group: Optional[str] = None
+) -> Dict[str, Tuple[str, bytes]]:
+    started = time.monotonic()
+    body = FastJSONResponse(await build()).body
+    delta = time.monotonic() - started
+    expires_at = time.time() + expire
+    entries = {requested: _encode(body, requested) for requested in ENCODINGS}
+    backend = FastAPICache.get_backend()
+    if group is not None:
+        try:
+            await cache_registry.add(_registry(group), key, expires_at + STALE_GRACE)
+        except Exception:
+            logger.warning(f"Could not register cache key '{key}' in group '{group}'", exc_info=True)
+    for requested, (encoding, blob) in entries.items():
+        cache_key = _cache_key(key, requested)
+        try:
+            await backend.set(cache_key, _pack(encoding, blob, expires_at, delta), expire + STALE_GRACE)
+        except Exception:
+            logger.warning(f"Error setting cache key '{cache_key}' in backend:", exc_info=True)
+    return entries
+
+
+# Cross-process lock in the shared cache (Redis SET NX with a TTL). Backends without
+# one (the in-memory backend) serve a single process, so the lock is always granted,
+# as it is when Redis is unreachable: building locally beats failing the request.
+async def try_lock(name: str, ttl: float) -> bool:
+    redis = getattr(FastAPICache.get_backend(), "redis", None)
+    if redis is None:
+        return True
+    try:
+        return bool(await redis.set(f"{FastAPICache.get_prefix()}:lock:{name}", os.getpid(), nx=True, px=int(ttl * 1000)))
+    except Exception:
+        logger.warning(f"Could not take cache lock '{name}'", exc_info=True)
+        return True
+
+
+async def release_lock(name: str) -> None:
+    redis = getattr(FastAPICache.get_backend(), "redis", None)
+    if redis is None:
+        return
+    try:
+        await redis.delete(f"{FastAPICache.get_prefix()}:lock:{name}")
+    except Exception:
+        logger.warning(f"Could not release cache lock '{name}'", exc_info=True)
+
+
+# Every encoding of a fresh entry, or None if any is missing
+async def _read_all(key: str) -> Optional[Dict[str, Tuple[str, bytes]]]:
+    backend = FastAPICache.get_backend()
+    entries = {}
+    for requested in ENCODINGS:
+        entry = await backend.get(_cache_key(key, requested))
+        cached = _unpack(entry) if entry is not None else None
+        if cached is None or cached[2] <= time.time():
+            return None
+        entries[requested] = cached[:2]
+    return entries
+
+
+# _fill, once across all worker processes: the worker holding the key's lock builds,
+# the others wait for its result to appear in the shared cache. With wait=False
+# (background refreshes) a worker that doesn't get the lock just returns None.
+async def _fill_shared(
+    key: str, expire: int, build: Callable[[], Awaitable[Any]], wait: bool = True, group: Optional[str] = None
+) -> Optional[Dict[str, Tuple[str, bytes]]]:
+    if await try_lock(f"fill:{key}", FILL_LOCK_TIMEOUT):
+        try:
+            return await _fill(key, expire, build, group)
+        finally:
+            await release_lock(f"fill:{key}")
+    if not wait:
+        return None
+    deadline = time.monotonic() + FILL_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(FILL_POLL_INTERVAL)
+        try:
+            entries = await _read_all(key)
+        except Exception:
+            break
+        if entries is not None:
+            return entries
+    return await _fill(key, expire, build, group)
+
+
+async def _refresh(key: str, expire: int, build: Callable[[], Awaitable[Any]], group: Optional[str] = None) -> None:
+    try:
+        await _fill_shared(key, expire, build, wait=False, group=group)
+    except Exception:
+        logger.warning(f"Background refresh of '{key}' failed", exc_info=True)
+
+
+# Pre-populate the cached_json entries for `key` in every encoding from JSON-ready
+# content (used by the startup warmer).
+async def store_json(key: str, expire: int, content: Any, group: Optional[str] = None) -> None:
+    async def build() -> Any:
+        return content
+    await _fill(key, expire, build, group)
+
+
+# Drop cached documents after a write has committed: `keys`, and every key cached under
+# one of `groups` (see cached_json), in every encoding, stale-grace copies included.
+# A build that was already running when the write committed can still store the old
+# document; its TTL bounds that.
+async def invalidate_json(keys: Iterable[str] = (), groups: Iterable[str] = ()) -> None:
+    if not FastAPICache.get_enable():
+        return
+    try:
+        stale = set(keys)
+        registered = {group: await cache_registry.members(_registry(group)) for group in groups}
+        for members in registered.values():
+            stale |= members
+        if stale:
+            await cache_registry.delete_entries([_cache_key(key, encoding) for key in stale for encoding in ENCODINGS])
+        for group, members in registered.items():
+            await cache_registry.remove(_registry(group), members)
+    except Exception:
+        logger.warning(f"Could not invalidate cached documents {sorted(keys)} / groups {sorted(groups)}", exc_info=True)
+
+
+# Serve a JSON document from the cache backend, stored already compressed for the
+# client's encoding. A hit is returned as the stored bytes with no JSON encoding and
+# no compression work. Concurrent misses for the same key share one build() (single
+# flight, within the process and across worker processes via a lock in the cache),
+# and hot entries are rebuilt in the background shortly before they expire, or just
+# after, while the stale copy is served.
+# `build` must not depend on request-scoped state (e.g. the request's DB session):
+# it may run after the response has been sent. Documents that vary in ways their
+# writers can't name one by one (list pages by skip/limit/fields) are cached under a
+# `group`, which invalidate_json drops as a whole.
+async def cached_json(
+    request: Request, key: str, expire: int, build: Callable[[], Awaitable[Any]], group: Optional[str] = None
+) -> Response:
+    encoding = choose_encoding(request.headers.get("accept-encoding", ""))
+    use_cache = FastAPICache.get_enable() and request.headers.get("cache-control") not in ("no-store", "no-cache")
+    cache_key = _cache_key(key, encoding)
+
+    entry = None
+    if use_cache:
+        try:
+            entry = await FastAPICache.get_backend().get(cache_key)
+        except Exception:
+            logger.warning(f"Error retrieving cache key '{cache_key}' from backend:", exc_info=True)
+    cached = _unpack(entry) if entry is not None else None
+
+    if cached is not None:
+        encoding, blob, expires_at, delta = cached
+        now = time.time()
+        state = "STALE" if now >= expires_at else "HIT"
+        if state == "STALE" or _should_refresh(expires_at, delta, now):
+            _flights.spawn(key, lambda: _refresh(key, expire, build, group))
+    elif use_cache:
+        state = "MISS"
+        encoding, blob = (await _flights.do(key, lambda: _fill_shared(key, expire, build, group=group)))[encoding]
+    else:
+        state = "MISS"
+        encoding, blob = _encode(FastJSONResponse(await build()).body, encoding)
+
+    headers = {"Vary": "Accept-Encoding", "X-Cache": state}
+    if encoding != "identity":
+        headers["Content-Encoding"] = encoding
+    return Response(blob, media_type="application/json", headers=headers)
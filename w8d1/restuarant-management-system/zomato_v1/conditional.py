@@ -0,0 +1,85 @@
+# Helpers for HTTP conditional requests (ETag / Last-Modified -> 304 Not Modified,
+# If-Match -> optimistic concurrency on updates)
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+
+from fastapi import HTTPException, Request, Response, status
+
+
+# Build a strong ETag from the parts that identify a resource version
+def make_etag(*parts) -> str:
+    raw = "|".join("" if part is None else str(part) for part in parts)
+    return '"' + hashlib.sha1(raw.encode()).hexdigest()[:20] + '"'
+
+
+# ETag of a versioned row (restaurants, menu items, orders, customers). It carries the
+# row's version column, so an If-Match header maps straight to the expected version of
+# a conditional UPDATE, without reading the row first.
+def version_etag(kind: str, entity_id: int, version: int) -> str:
+    return f'"{kind}-{entity_id}-v{version}"'
+
+
+# The version an update must apply to, from If-Match: None when the header is absent or
+# "*" (unconditional). Raises 409 when no listed ETag is a version of this entity.
+# Weak ETags never match (If-Match uses strong comparison).
+def if_match_version(request: Request, kind: str, entity_id: int) -> Optional[int]:
+    if_match = request.headers.get("if-match")
+    if if_match is None or if_match.strip() == "*":
+        return None
+    prefix = f'"{kind}-{entity_id}-v'
+    for tag in if_match.split(","):
+        tag = tag.strip()
+        if tag.startswith(prefix) and tag.endswith('"') and tag[len(prefix):-1].isdigit():
+            return int(tag[len(prefix):-1])
+    raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="If-Match does not match this resource")
+
+
+# SQLite returns naive datetimes for server-side now(), which is UTC
+def _as_utc(value: datetime) -> datetime:
+    if value.tzinfo is None:
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
+
+
+# Format a datetime as an HTTP-date (second resolution)
+def http_date(value: Optional[datetime]) -> Optional[str]:
+    if value is None:
+        return None
+    return format_datetime(_as_utc(value).replace(microsecond=0), usegmt=True)
+
+
+# Decide whether the client's cached copy is still fresh.
+# If-None-Match wins over If-Modified-Since when both are present (RFC 7232).
+def is_not_modified(request: Request, etag: str, last_modified: Optional[datetime]) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return etag in candidates
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since is None or last_modified is None:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since)
+    except (TypeError, ValueError):
+        return False
+    return _as_utc(last_modified).replace(microsecond=0) <= _as_utc(since)
+
+
+# Attach validators to an outgoing response
+def set_validators(response: Response, etag: str, last_modified: Optional[datetime]) -> None:
+    response.headers["ETag"] = etag
+    if last_modified is not None:
+        response.headers["Last-Modified"] = http_date(last_modified)
+    response.headers["Cache-Control"] = "no-cache"
+
+
+# Bodyless 304 carrying the same validators
+def not_modified(etag: str, last_modified: Optional[datetime]) -> Response:
+    response = Response(status_code=status.HTTP_304_NOT_MODIFIED)
+    set_validators(response, etag, last_modified)
+    return response
@@ -1,24 +1,70 @@
 
 # CRUD operations for Restaurant and MenuItem models using async SQLAlchemy
-import asyncio
 from time import time
 from sqlalchemy.future import select
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy import update, delete, func
+from sqlalchemy import insert, update, delete, func, case
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
-from models import Restaurant, MenuItem, Review, Order, OrderItem, Customer
+from sqlalchemy.orm import selectinload, load_only
+from sqlalchemy.dialects import postgresql, sqlite
+from models import Restaurant, MenuItem, Review, Order, OrderItem, Customer, ArchivedOrder, Neighbor, OrderRollup
 from schemas import (
     RestaurantCreate, RestaurantUpdate,
     MenuItemCreate, MenuItemUpdate,
     ReviewCreate, ReviewUpdate,
-    OrderCreate, OrderUpdate,
+    OrderCreate, OrderUpdate, OrderStatusChange,
     OrderItemCreate, OrderItemUpdate,
     CustomerCreate, CustomerUpdate
 )
-from typing import List, Optional
+from typing import List, Optional, Sequence, Tuple
+from datetime import datetime, timedelta, timezone
+from collections import defaultdict
+import os
 from fastapi import HTTPException, status
-from fastapi_cache.decorator import cache
+import analytics
+import leaderboard
+import customer_summary
+import email_index
+import search_cache
+import eta
+from compression import invalidate_json
+
+# Response-cache documents (compression.cached_json) that the writes below drop after
+# committing: the restaurant page by key, the paginated lists by group
+RESTAURANT_LISTS = "restaurant-lists"  # GET /restaurants/ and /restaurants/active
+MENU_ITEM_LISTS = "menu-item-lists"  # GET /menu-items/
+RESTAURANT_PAGES = "restaurant-pages"  # GET /restaurants/{id}/page, for writes touching them all
+
+def page_cache_key(restaurant_id: int) -> str:
+    return f"restaurants:page:{restaurant_id}"
+
+# Sparse fieldsets: only read the requested columns (the primary key is always loaded)
+def project(query, model, fields: Optional[Sequence[str]] = None):
+    if fields:
+        query = query.options(load_only(*(getattr(model, name) for name in fields)))
+    return query
+
+# Update one versioned row (Restaurant, MenuItem, Order, Customer) in a single statement:
+#   UPDATE ... SET ..., version = version + 1 WHERE id = :id [AND version = :expected] RETURNING *
+# instead of read-modify-write, so concurrent writers can't silently overwrite each other
+# and no lock is held. Returns the updated row, or None if there is no such row; raises
+# 409 if the row exists at another version. The caller commits.
+async def versioned_update(db: AsyncSession, model, row_id: int, values: dict, expected_version: Optional[int] = None):
+    stmt = update(model).where(model.id == row_id).values(**values, version=model.version + 1)
+    if expected_version is not None:
+        stmt = stmt.where(model.version == expected_version)
+    result = await db.execute(
+        stmt.returning(model).execution_options(synchronize_session=False, populate_existing=True)
+    )
+    row = result.scalar_one_or_none()
+    if row is None and expected_version is not None:
+        current = (await db.execute(select(model.version).where(model.id == row_id))).scalar()
+        if current is not None:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"{model.__name__} {row_id} was modified (now version {current}); reload and retry"
+            )
+    return row
 
 # Create a new restaurant
 async def create_restaurant(db: AsyncSession, restaurant: RestaurantCreate) -> Restaurant:
@@ -28,6 +74,8 @@ async def create_restaurant(db: AsyncSession, restaurant: RestaurantCreate) -> R
     try:
         await db.commit()  # Commit transaction
         await db.refresh(db_restaurant)  # Refresh instance with DB data
+        await search_cache.invalidate("cuisine", [db_restaurant.cuisine_type])
+        await invalidate_json(groups=[RESTAURANT_LISTS])
         return db_restaurant
     except IntegrityError:
         await db.rollback()
@@ -46,27 +94,89 @@ async def create_menu_item(db: AsyncSession, restaurant_id: int, item: MenuItemC
     db.add(db_item)
     await db.commit()
     await db.refresh(db_item)
+    await search_cache.invalidate("menu", [db_item.category])
+    await invalidate_json([page_cache_key(restaurant_id)], [MENU_ITEM_LISTS])
     return db_item
 
+# Replace a restaurant's whole menu with `items` in one transaction.
+# Items are matched to existing rows by name; only changed rows are updated and the
+# inserts/updates/deletes each go out as a single batched statement.
+async def sync_menu(db: AsyncSession, restaurant_id: int, items: List[MenuItemCreate], delete_missing: bool = True) -> dict:
+    if not await get_restaurant_version(db, restaurant_id):
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+
+    columns = list(MenuItemCreate.__fields__)
+    result = await db.execute(
+        select(MenuItem.id, MenuItem.version, *(getattr(MenuItem, name) for name in columns))
+        .where(MenuItem.restaurant_id == restaurant_id)
+    )
+    existing = {row.name: row for row in result}
+
+    inserts, updates = [], []
+    unchanged = 0
+    categories = set()  # of every added, changed or removed item, old and new (search_cache)
+    for item in items:
+        values = item.dict()
+        current = existing.pop(item.name, None)
+        if current is None:
+            inserts.append({**values, "restaurant_id": restaurant_id})
+            categories.add(values["category"])
+        elif any(getattr(current, name) != values[name] for name in columns):
+            # The version makes each UPDATE conditional (a concurrent edit raises StaleDataError -> 409)
+            updates.append({**values, "id": current.id, "version": current.version})
+            categories.update((current.category, values["category"]))
+        else:
+            unchanged += 1
+    deletes = [row.id for row in existing.values()] if delete_missing else []
+    if delete_missing:
+        categories.update(row.category for row in existing.values())
+
+    try:
+        if inserts:
+            await db.execute(insert(MenuItem), inserts)
+        if updates:
+            await db.execute(update(MenuItem), updates)
+        if deletes:
+            await db.execute(delete(MenuItem).where(MenuItem.id.in_(deletes)))
+        await db.commit()
+    except IntegrityError:
+        await db.rollback()
+        raise HTTPException(status_code=400, detail="Menu sync failed, no changes were applied")
+    if categories:
+        await search_cache.invalidate("menu", categories)
+        await invalidate_json([page_cache_key(restaurant_id)], [MENU_ITEM_LISTS])
+
+    return {
+        "inserted": len(inserts),
+        "updated": len(updates),
+        "deleted": len(deletes),
+        "unchanged": unchanged + (len(existing) if not delete_missing else 0),
+    }
+
 # Get menu item by ID
 async def get_menu_item(db: AsyncSession, item_id: int) -> Optional[MenuItem]:
     result = await db.execute(select(MenuItem).where(MenuItem.id == item_id))
     return result.scalar_one_or_none()
 
 # List all menu items
-async def list_menu_items(db: AsyncSession, skip: int = 0, limit: int = 10) -> List[MenuItem]:
-    result = await db.execute(select(MenuItem).offset(skip).limit(limit))
+async def list_menu_items(db: AsyncSession, skip: int = 0, limit: int = 10, fields: Optional[Sequence[str]] = None) -> List[MenuItem]:
+    result = await db.execute(project(select(MenuItem), MenuItem, fields).offset(skip).limit(limit))
     return result.scalars().all()
 
-# Update menu item
-async def update_menu_item(db: AsyncSession, item_id: int, item: MenuItemUpdate) -> Optional[MenuItem]:
-    db_item = await get_menu_item(db, item_id)
-    if not db_item:
-        return None
-    for key, value in item.dict(exclude_unset=True).items():
-        setattr(db_item, key, value)
+# Update menu item (only if still at expected_version, when given)
+async def update_menu_item(
+    db: AsyncSession, item_id: int, item: MenuItemUpdate, expected_version: Optional[int] = None
+) -> Optional[MenuItem]:
+    values = item.dict(exclude_unset=True)
+    # Searches match on category and vegetarian: a change moves the item between results
+    affects_search = "category" in values or "is_vegetarian" in values
+    old_category = (await db.execute(select(MenuItem.category).where(MenuItem.id == item_id))).scalar() if affects_search else None
+    db_item = await versioned_update(db, MenuItem, item_id, values, expected_version)
     await db.commit()
-    await db.refresh(db_item)
+    if db_item is not None:
+        await invalidate_json([page_cache_key(db_item.restaurant_id)], [MENU_ITEM_LISTS])
+        if affects_search:
+            await search_cache.invalidate("menu", [old_category, db_item.category])
     return db_item
 
 # Delete menu item
@@ -76,12 +186,14 @@ async def delete_menu_item(db: AsyncSession, item_id: int) -> bool:
         return False
     await db.delete(db_item)
     await db.commit()
+    await search_cache.invalidate("menu", [db_item.category])
+    await invalidate_json([page_cache_key(db_item.restaurant_id)], [MENU_ITEM_LISTS])
     return True
 
 # Get all menu items for a restaurant
-async def get_menu_for_restaurant(db: AsyncSession, restaurant_id: int, skip: int = 0, limit: int = 10) -> List[MenuItem]:
+async def get_menu_for_restaurant(db: AsyncSession, restaurant_id: int, skip: int = 0, limit: int = 10, fields: Optional[Sequence[str]] = None) -> List[MenuItem]:
     result = await db.execute(
-        select(MenuItem).where(MenuItem.restaurant_id == restaurant_id).offset(skip).limit(limit)
+        project(select(MenuItem), MenuItem, fields).where(MenuItem.restaurant_id == restaurant_id).offset(skip).limit(limit)
     )
     return result.scalars().all()
 
@@ -99,15 +211,29 @@ async def get_restaurant_with_menu(db: AsyncSession, restaurant_id: int) -> Opti
     )
     return result.scalar_one_or_none()
 
-# Search menu items by category and dietary preference
+# Load rows by primary key, in the order of `ids` (rows gone since are skipped)
+async def _hydrate(db: AsyncSession, model, ids: List[int], fields: Optional[Sequence[str]] = None) -> list:
+    if not ids:
+        return []
+    result = await db.execute(project(select(model), model, fields).where(model.id.in_(ids)))
+    rows = {row.id: row for row in result.scalars()}
+    return [rows[row_id] for row_id in ids if row_id in rows]
+
+# Search menu items by category and dietary preference. The matching ids are cached per
+# normalized filter (see search_cache.py); the items are then read by primary key.
 async def search_menu_items(db: AsyncSession, category: Optional[str] = None, vegetarian: Optional[bool] = None, skip: int = 0, limit: int = 10) -> List[MenuItem]:
-    query = select(MenuItem)
-    if category:
-        query = query.where(MenuItem.category.ilike(f"%{category}%"))
-    if vegetarian is not None:
-        query = query.where(MenuItem.is_vegetarian == vegetarian)
-    result = await db.execute(query.offset(skip).limit(limit))
-    return result.scalars().all()
+    term = search_cache.normalize(category)
+
+    async def build() -> List[int]:
+        query = select(MenuItem.id).join(MenuItem.restaurant)  # not of deleted restaurants
+        if term:
+            query = query.where(MenuItem.category.ilike(f"%{term}%"))
+        if vegetarian is not None:
+            query = query.where(MenuItem.is_vegetarian == vegetarian)
+        return list((await db.execute(query.order_by(MenuItem.id).offset(skip).limit(limit))).scalars())
+
+    ids = await search_cache.cached_ids("menu", (term, vegetarian, skip, limit), build)
+    return await _hydrate(db, MenuItem, ids)
 
 # Calculate average menu price per restaurant
 async def get_average_menu_price(db: AsyncSession, restaurant_id: int) -> Optional[float]:
@@ -117,74 +243,189 @@ async def get_average_menu_price(db: AsyncSession, restaurant_id: int) -> Option
     avg_price = result.scalar()
     return float(avg_price) if avg_price is not None else None
 
+# Cheap version lookup for a restaurant (no full row load), used for ETag/Last-Modified:
+# (id, updated_at, version)
+async def get_restaurant_version(db: AsyncSession, restaurant_id: int) -> Optional[Tuple[int, Optional[datetime], int]]:
+    result = await db.execute(
+        select(Restaurant.id, Restaurant.updated_at, Restaurant.version).where(Restaurant.id == restaurant_id)
+    )
+    row = result.first()
+    return (row.id, row.updated_at, row.version) if row else None
+
+# Cheap version lookup for a restaurant's menu: (newest change, item count, restaurant
+# version, sum of item versions). The count catches deletes, which don't bump any
+# remaining updated_at; the versions catch edits within the same second.
+async def get_menu_version(db: AsyncSession, restaurant_id: int) -> Optional[Tuple[Optional[datetime], int, int, int]]:
+    restaurant_version = await get_restaurant_version(db, restaurant_id)
+    if not restaurant_version:
+        return None
+    result = await db.execute(
+        select(func.max(MenuItem.updated_at), func.count(MenuItem.id), func.coalesce(func.sum(MenuItem.version), 0))
+        .where(MenuItem.restaurant_id == restaurant_id)
+    )
+    menu_updated_at, item_count, item_versions = result.one()
+    last_modified = max(
+        (ts for ts in (restaurant_version[1], menu_updated_at) if ts is not None),
+        default=None
+    )
+    return last_modified, item_count, restaurant_version[2], item_versions
+
 # Get a restaurant by ID
-@cache(expire=1000, key_builder=lambda restaurant_id: f"restaurant_{restaurant_id}")
+# (hot restaurants are served from the cached page/list documents, see warmup.py)
 async def get_restaurant(db: AsyncSession, restaurant_id: int) -> Optional[Restaurant]:
     result = await db.execute(select(Restaurant).where(Restaurant.id == restaurant_id))
     return result.scalar_one_or_none()
 
 # List all restaurants with pagination
-@cache(expire=300, key_builder=lambda *args, **kwargs: f"restaurants_list_{kwargs.get('skip', 0)}_{kwargs.get('limit', 10)}")
-async def list_restaurants(db: AsyncSession, skip: int = 0, limit: int = 10) -> List[Restaurant]:
-    result = await db.execute(select(Restaurant).offset(skip).limit(limit))
-    asyncio.sleep(4)
+# (cached at the response level, precompressed, by the list route - see compression.cached_json)
+async def list_restaurants(db: AsyncSession, skip: int = 0, limit: int = 10, fields: Optional[Sequence[str]] = None) -> List[Restaurant]:
+    result = await db.execute(project(select(Restaurant), Restaurant, fields).offset(skip).limit(limit))
     return result.scalars().all()
 
-# Update a restaurant by ID
-async def update_restaurant(db: AsyncSession, restaurant_id: int, restaurant: RestaurantUpdate) -> Optional[Restaurant]:
-    db_restaurant = await get_restaurant(db, restaurant_id)
-    if not db_restaurant:
-        return None
-    for key, value in restaurant.dict(exclude_unset=True).items():
-        setattr(db_restaurant, key, value)
+# Update a restaurant by ID (only if still at expected_version, when given)
+async def update_restaurant(
+    db: AsyncSession, restaurant_id: int, restaurant: RestaurantUpdate, expected_version: Optional[int] = None
+) -> Optional[Restaurant]:
+    values = restaurant.dict(exclude_unset=True)
+    old_cuisine = None
+    if "cuisine_type" in values:  # moves the restaurant between cuisine searches
+        old_cuisine = (await db.execute(select(Restaurant.cuisine_type).where(Restaurant.id == restaurant_id))).scalar()
     try:
+        db_restaurant = await versioned_update(db, Restaurant, restaurant_id, values, expected_version)
         await db.commit()
-        await db.refresh(db_restaurant)
+        if db_restaurant is not None:
+            await invalidate_json([page_cache_key(restaurant_id)], [RESTAURANT_LISTS])
+            if old_cuisine is not None:
+                await search_cache.invalidate("cuisine", [old_cuisine, db_restaurant.cuisine_type])
         return db_restaurant
     except IntegrityError:
         await db.rollback()
         raise HTTPException(status_code=400, detail="Restaurant name already exists.")
 
-# Delete a restaurant by ID
+# Soft-delete a restaurant: one UPDATE setting deleted_at, after which every query stops
+# seeing it (see models._hide_deleted_restaurants). Its menu, orders and reviews are
+# removed later by purge_restaurant. False if there is no such (undeleted) restaurant.
 async def delete_restaurant(db: AsyncSession, restaurant_id: int) -> bool:
-    db_restaurant = await get_restaurant(db, restaurant_id)
-    if not db_restaurant:
+    result = await db.execute(
+        update(Restaurant)
+        .where(Restaurant.id == restaurant_id)
+        .values(deleted_at=func.now(), version=Restaurant.version + 1)
+        .returning(Restaurant.cuisine_type)
+        .execution_options(synchronize_session=False)
+    )
+    cuisine_type = result.scalar()
+    if cuisine_type is None:
+        await db.rollback()
         return False
-    await db.delete(db_restaurant)
+    categories = (await db.execute(
+        select(MenuItem.category).where(MenuItem.restaurant_id == restaurant_id).distinct()
+        .execution_options(include_deleted=True)  # its menu items are hidden from here on
+    )).scalars().all()
     await db.commit()
+    await search_cache.invalidate("cuisine", [cuisine_type])
+    await search_cache.invalidate("menu", categories)
+    await invalidate_json([page_cache_key(restaurant_id)], [RESTAURANT_LISTS, MENU_ITEM_LISTS])
     return True
 
-# Search restaurants by cuisine type
-async def search_by_cuisine(db: AsyncSession, cuisine_type: str, skip: int = 0, limit: int = 10) -> List[Restaurant]:
-    result = await db.execute(
-        select(Restaurant).where(Restaurant.cuisine_type.ilike(f"%{cuisine_type}%")).offset(skip).limit(limit)
-    )
-    return result.scalars().all()
+# Rows removed per statement (and transaction) when purging a restaurant
+PURGE_CHUNK_SIZE = int(os.getenv("PURGE_CHUNK_SIZE", "1000"))
+
+# Permanently remove a soft-deleted restaurant and everything under it, in chunks so no
+# statement or transaction grows with the restaurant's size. Deleting a chunk of orders
+# or menu items lets the database's ON DELETE CASCADE remove their order items and
+# reviews. Runs on its own connection because SQLite only enforces foreign keys (and
+# so cascades) where enabled, and the rest of the app relies on it being off: archived
+# orders keep their reviews.
+async def purge_restaurant(db: AsyncSession, restaurant_id: int, chunk_size: int = PURGE_CHUNK_SIZE) -> dict:
+    purged = {"orders": 0, "menu_items": 0}
+    async with db.bind.connect() as conn:
+        sqlite_db = conn.dialect.name == "sqlite"
+        if sqlite_db:
+            await conn.exec_driver_sql("PRAGMA foreign_keys=ON")
+        try:
+            deleted = (await conn.execute(
+                select(Restaurant.id).where(Restaurant.id == restaurant_id, Restaurant.deleted_at.isnot(None))
+            )).scalar()
+            if deleted is None:
+                return {**purged, "restaurant": 0}  # not soft-deleted (or already purged)
+            while True:
+                rows = (await conn.execute(
+                    select(Order.id, Order.customer_id).where(Order.restaurant_id == restaurant_id).limit(chunk_size)
+                )).all()
+                if not rows:
+                    break
+                await conn.execute(delete(Order).where(Order.id.in_([order_id for order_id, _ in rows])))
+                await customer_summary.invalidate_many(conn, list({customer_id for _, customer_id in rows}))
+                await conn.commit()
+                purged["orders"] += len(rows)
+            while True:
+                ids = (await conn.execute(
+                    select(MenuItem.id).where(MenuItem.restaurant_id == restaurant_id).limit(chunk_size)
+                )).scalars().all()
+                if not ids:
+                    break
+                await conn.execute(delete(MenuItem).where(MenuItem.id.in_(ids)))
+                await conn.commit()
+                purged["menu_items"] += len(ids)
+            # Reviews of its archived orders, then the restaurant itself
+            await conn.execute(delete(Review).where(Review.restaurant_id == restaurant_id))
+            await conn.execute(delete(OrderRollup).where(OrderRollup.restaurant_id == restaurant_id))
+            await conn.execute(delete(Restaurant).where(Restaurant.id == restaurant_id))
+            await conn.commit()
+            return {**purged, "restaurant": 1}
+        finally:
+            if sqlite_db:
+                await conn.rollback()
+                await conn.exec_driver_sql("PRAGMA foreign_keys=OFF")
+
+# Search restaurants by cuisine type (ids cached per normalized cuisine, like search_menu_items)
+async def search_by_cuisine(db: AsyncSession, cuisine_type: str, skip: int = 0, limit: int = 10, fields: Optional[Sequence[str]] = None) -> List[Restaurant]:
+    term = search_cache.normalize(cuisine_type)
+
+    async def build() -> List[int]:
+        result = await db.execute(
+            select(Restaurant.id).where(Restaurant.cuisine_type.ilike(f"%{term}%")).order_by(Restaurant.id).offset(skip).limit(limit)
+        )
+        return list(result.scalars())
+
+    ids = await search_cache.cached_ids("cuisine", (term, skip, limit), build)
+    return await _hydrate(db, Restaurant, ids, fields)
 
 # List only active restaurants
-async def list_active_restaurants(db: AsyncSession, skip: int = 0, limit: int = 10) -> List[Restaurant]:
+async def list_active_restaurants(db: AsyncSession, skip: int = 0, limit: int = 10, fields: Optional[Sequence[str]] = None) -> List[Restaurant]:
     result = await db.execute(
-        select(Restaurant).where(Restaurant.is_active == True).offset(skip).limit(limit)
+        project(select(Restaurant), Restaurant, fields).where(Restaurant.is_active == True).offset(skip).limit(limit)
     )
     return result.scalars().all()
 
 # --- REVIEW CRUD OPERATIONS ---
 
-# Create a new review
+# Create a new review, filed under the order's restaurant and customer (the order may
+# already be archived)
 async def create_review(db: AsyncSession, order_id: int, review: ReviewCreate) -> Review:
-    db_review = Review(**review.dict(), order_id=order_id)
+    owner = (await db.execute(
+        select(Order.restaurant_id, Order.customer_id).where(Order.id == order_id)
+    )).first() or (await db.execute(
+        select(ArchivedOrder.restaurant_id, ArchivedOrder.customer_id).where(ArchivedOrder.id == order_id)
+    )).first()
+    if owner is None:
+        raise HTTPException(status_code=404, detail="Order not found")
+    db_review = Review(
+        **review.dict(), order_id=order_id, restaurant_id=owner.restaurant_id, customer_id=owner.customer_id
+    )
     db.add(db_review)
     try:
         await db.commit()
-        await db.refresh(db_review)
-        return db_review
     except IntegrityError:
         await db.rollback()
         raise HTTPException(status_code=400, detail="Review already exists for this order")
+    await invalidate_json([page_cache_key(owner.restaurant_id)])  # top reviews and rating
+    db.expunge(db_review)
+    return await get_review(db, db_review.id)
 
 # Get a specific review
 async def get_review(db: AsyncSession, review_id: int) -> Optional[Review]:
-    result = await db.execute(select(Review).where(Review.id == review_id))
+    result = await db.execute(select(Review).options(*REVIEW_LOAD_OPTIONS).where(Review.id == review_id))
     return result.scalar_one_or_none()
 
 # List all reviews with pagination
@@ -203,6 +444,7 @@ async def update_review(db: AsyncSession, review_id: int, review: ReviewUpdate)
     
     await db.commit()
     await db.refresh(db_review)
+    await invalidate_json([page_cache_key(db_review.restaurant_id)])
     return db_review
 
 # Delete a review
@@ -212,6 +454,7 @@ async def delete_review(db: AsyncSession, review_id: int) -> bool:
         return False
     await db.delete(db_review)
     await db.commit()
+    await invalidate_json([page_cache_key(db_review.restaurant_id)])
     return True
 
 # Get reviews for a restaurant
@@ -225,6 +468,16 @@ async def get_restaurant_reviews(db: AsyncSession, restaurant_id: int, skip: int
     )
     return result.scalars().all()
 
+# Best and most recent reviews for a restaurant (restaurant page)
+async def get_top_reviews(db: AsyncSession, restaurant_id: int, limit: int = 5) -> List[Review]:
+    result = await db.execute(
+        select(Review)
+        .where(Review.restaurant_id == restaurant_id)
+        .order_by(Review.rating.desc(), Review.created_at.desc())
+        .limit(limit)
+    )
+    return result.scalars().all()
+
 # Get reviews by a customer
 async def get_customer_reviews(db: AsyncSession, customer_id: int, skip: int = 0, limit: int = 10) -> List[Review]:
     result = await db.execute(
@@ -253,69 +506,270 @@ async def calculate_restaurant_rating(db: AsyncSession, restaurant_id: int) -> O
     avg_rating = result.scalar()
     return float(avg_rating) if avg_rating is not None else None
 
+# Store the average review rating on restaurants (all of them, or one); returns rows updated
+async def recompute_restaurant_ratings(db: AsyncSession, restaurant_id: Optional[int] = None) -> int:
+    average = (
+        select(func.coalesce(func.avg(Review.rating), 0.0))
+        .where(Review.restaurant_id == Restaurant.id)
+        .scalar_subquery()
+    )
+    stmt = update(Restaurant).values(rating=average, version=Restaurant.version + 1)
+    if restaurant_id is not None:
+        stmt = stmt.where(Restaurant.id == restaurant_id)
+    result = await db.execute(stmt)
+    await db.commit()
+    # The lists and pages show the rating (and the page the restaurant's version)
+    if restaurant_id is not None:
+        await invalidate_json([page_cache_key(restaurant_id)], [RESTAURANT_LISTS])
+    else:
+        await invalidate_json(groups=[RESTAURANT_LISTS, RESTAURANT_PAGES])
+    return result.rowcount
+
 # --- ORDER CRUD OPERATIONS ---
 
-# Create a new order
+# Create a new order with its items; the total is computed from the items and the
+# analytics rollups are updated in the same transaction
 async def create_order(db: AsyncSession, order: OrderCreate) -> Order:
-    db_order = Order(**order.dict())
+    # Ensure the restaurant exists and isn't being deleted (its purge would miss the order)
+    if (await db.execute(select(Restaurant.id).where(Restaurant.id == order.restaurant_id))).scalar() is None:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    item_ids = [item.menu_item_id for item in order.order_items]
+    # Menu preparation times are only read for items the ETA model hasn't seen ready yet
+    unseen = eta.unseen_items(item_ids)
+    preparation_minutes = dict((await db.execute(
+        select(MenuItem.id, MenuItem.preparation_time).where(MenuItem.id.in_(unseen))
+    )).all()) if unseen else {}
+    db_order = Order(
+        **order.dict(exclude={"order_items"}),
+        total_amount=sum(item.item_price * item.quantity for item in order.order_items),
+        estimated_delivery_time=datetime.now(timezone.utc).replace(tzinfo=None)
+        + eta.estimate(order.restaurant_id, item_ids, preparation_minutes),
+        order_items=[OrderItem(**item.dict()) for item in order.order_items]
+    )
     db.add(db_order)
+    await db.flush()
+    await db.refresh(db_order, ["order_date"])
+    await analytics.record_order(db, db_order.restaurant_id, db_order.order_date, 1, db_order.total_amount)
+    await customer_summary.record_order(db, db_order, [(item.menu_item_id, item.quantity) for item in order.order_items])
     await db.commit()
-    await db.refresh(db_order)
-    return db_order
+    for item in order.order_items:
+        leaderboard.record(db_order.restaurant_id, item.menu_item_id, item.quantity, leaderboard.order_ts(db_order.order_date))
+    # Re-read with the eager loads OrderOut needs (drop the half-loaded instances first)
+    db.expunge(db_order)
+    return await get_order(db, db_order.id)
+
+# Eager loads needed to serialize an OrderOut (lazy loading isn't available on AsyncSession)
+ORDER_LOAD_OPTIONS = (
+    selectinload(Order.order_items).selectinload(OrderItem.menu_item),
+    selectinload(Order.restaurant),
+    selectinload(Order.customer),
+)
+
+# Eager loads needed to serialize a ReviewOut (lazy loading isn't available on AsyncSession)
+REVIEW_LOAD_OPTIONS = (
+    selectinload(Review.customer),
+    selectinload(Review.restaurant),
+    selectinload(Review.order).options(*ORDER_LOAD_OPTIONS),
+)
 
-# Get order by ID
-async def get_order(db: AsyncSession, order_id: int) -> Optional[Order]:
+# Get order by ID (falls back to the archive for orders moved to cold storage)
+async def get_order(db: AsyncSession, order_id: int, include_archived: bool = False) -> Optional[Order]:
     result = await db.execute(
         select(Order)
-        .options(selectinload(Order.items))
+        .options(*ORDER_LOAD_OPTIONS)
         .where(Order.id == order_id)
     )
-    return result.scalar_one_or_none()
+    order = result.scalar_one_or_none()
+    if order is None and include_archived:
+        return await db.get(ArchivedOrder, order_id)
+    return order
 
 # List all orders with pagination
 async def list_orders(db: AsyncSession, skip: int = 0, limit: int = 10) -> List[Order]:
     result = await db.execute(
         select(Order)
-        .options(selectinload(Order.items))
+        .options(*ORDER_LOAD_OPTIONS)
         .offset(skip)
         .limit(limit)
     )
     return result.scalars().all()
 
-# Update order status
-async def update_order_status(db: AsyncSession, order_id: int, order: OrderUpdate) -> Optional[Order]:
-    db_order = await get_order(db, order_id)
-    if not db_order:
+# Update order status (cancelling an order takes it out of the analytics rollups,
+# un-cancelling puts it back; the customer's summary is rebuilt on its next read).
+# The rollups need the old status, so it is read first (without loading the order) and
+# the update is conditional on the version read: a concurrent change gives a 409.
+async def update_order_status(
+    db: AsyncSession, order_id: int, order: OrderUpdate, expected_version: Optional[int] = None
+) -> Optional[Order]:
+    current = (await db.execute(
+        select(Order.order_status, Order.version).where(Order.id == order_id)
+    )).first()
+    if current is None:
         return None
-    
-    for key, value in order.dict(exclude_unset=True).items():
-        setattr(db_order, key, value)
-    
+    if expected_version is not None and current.version != expected_version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Order {order_id} was modified (now version {current.version}); reload and retry"
+        )
+
+    values = order.dict(exclude_unset=True)
+    moved = values.get("order_status") not in (None, current.order_status)
+    if moved:
+        values.update(_phase_timestamps(values["order_status"]))
+    db_order = await versioned_update(db, Order, order_id, values, current.version)
+    if db_order is None:  # archived (or deleted) since the read above
+        await db.rollback()
+        return None
+    was_counted = current.order_status not in analytics.EXCLUDED_STATUSES
+    is_counted = db_order.order_status not in analytics.EXCLUDED_STATUSES
+    if was_counted != is_counted:
+        sign = 1 if is_counted else -1
+        await analytics.record_order(
+            db, db_order.restaurant_id, db_order.order_date, sign, sign * db_order.total_amount
+        )
+    await customer_summary.invalidate(db, db_order.customer_id)
     await db.commit()
-    await db.refresh(db_order)
+    db_order = await get_order(db, order_id)
+    if moved:
+        _observe_phase(db_order, [item.menu_item_id for item in db_order.order_items])
     return db_order
 
-# Get orders for a customer
-async def get_customer_orders(db: AsyncSession, customer_id: int, skip: int = 0, limit: int = 10) -> List[Order]:
+# Timestamps recorded when an order enters a status (feeding the ETA model, see eta.py)
+def _phase_timestamps(order_status: str) -> dict:
+    if order_status == "out_for_delivery":
+        return {"dispatched_at": func.now()}
+    if order_status == "delivered":
+        return {"delivery_time": func.coalesce(Order.delivery_time, func.now())}
+    return {}
+
+# Feed a finished phase of `order` (now in its new status) to the ETA model
+def _observe_phase(order, menu_item_ids: List[int]) -> None:
+    if order.order_status == "out_for_delivery" and order.dispatched_at is not None:
+        seconds = (analytics.to_naive_utc(order.dispatched_at) - analytics.to_naive_utc(order.order_date)).total_seconds()
+        eta.observe_prep(order.restaurant_id, menu_item_ids, seconds)
+    elif order.order_status == "delivered" and order.dispatched_at is not None and order.delivery_time is not None:
+        seconds = (analytics.to_naive_utc(order.delivery_time) - analytics.to_naive_utc(order.dispatched_at)).total_seconds()
+        eta.observe_delivery(order.restaurant_id, seconds)
+
+MAX_STATUS_BATCH = 500
+
+# _phase_timestamps for a batch: one CASE per timestamp over the orders entering that status
+def _batch_phase_timestamps(by_id: dict) -> dict:
+    values = {}
+    for column, status_name in (("dispatched_at", "out_for_delivery"), ("delivery_time", "delivered")):
+        ids = [i for i, c in by_id.items() if c.order_status == status_name and c.expected_status != status_name]
+        if ids:
+            values[column] = case(
+                (Order.id.in_(ids), _phase_timestamps(status_name)[column]), else_=getattr(Order, column)
+            )
+    return values
+
+# Move many orders between statuses with one set-based UPDATE and optimistic concurrency:
+# an order only moves if it is still in its expected status. No ORM objects are loaded;
+# rollups and customer summaries are adjusted from the RETURNING rows, as
+# update_order_status does for a single order. One result per change, in request order.
+async def update_order_statuses(db: AsyncSession, changes: Sequence[OrderStatusChange]) -> List[dict]:
+    if len(changes) > MAX_STATUS_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_STATUS_BATCH} status changes per request")
+    by_id = {change.order_id: change for change in changes}
+    if len(by_id) != len(changes):
+        raise HTTPException(status_code=400, detail="Each order may appear only once per batch")
+    if not by_id:
+        return []
+
     result = await db.execute(
-        select(Order)
-        .options(selectinload(Order.items))
-        .where(Order.customer_id == customer_id)
-        .offset(skip)
-        .limit(limit)
+        update(Order)
+        .where(
+            Order.id.in_(list(by_id)),
+            Order.order_status == case({i: c.expected_status for i, c in by_id.items()}, value=Order.id)
+        )
+        .values(
+            order_status=case({i: c.order_status for i, c in by_id.items()}, value=Order.id),
+            version=Order.version + 1,
+            **_batch_phase_timestamps(by_id)
+        )
+        .returning(
+            Order.id, Order.customer_id, Order.restaurant_id, Order.order_date, Order.total_amount,
+            Order.order_status, Order.dispatched_at, Order.delivery_time
+        )
+        .execution_options(synchronize_session=False)
     )
-    return result.scalars().all()
+    updated = result.all()
+    for order_id, _, restaurant_id, order_date, total_amount, *_ in updated:
+        was_counted = by_id[order_id].expected_status not in analytics.EXCLUDED_STATUSES
+        is_counted = by_id[order_id].order_status not in analytics.EXCLUDED_STATUSES
+        if was_counted != is_counted:
+            sign = 1 if is_counted else -1
+            await analytics.record_order(db, restaurant_id, order_date, sign, sign * total_amount)
+    await customer_summary.invalidate_many(db, sorted({row.customer_id for row in updated}))
+    await db.commit()
 
-# Get orders for a restaurant
-async def get_restaurant_orders(db: AsyncSession, restaurant_id: int, skip: int = 0, limit: int = 10) -> List[Order]:
+    moved = [row for row in updated if by_id[row.id].expected_status != by_id[row.id].order_status]
+    dispatched = [row.id for row in moved if row.order_status == "out_for_delivery"]
+    items_by_order = defaultdict(list)
+    if dispatched:
+        for order_id, menu_item_id in (await db.execute(
+            select(OrderItem.order_id, OrderItem.menu_item_id).where(OrderItem.order_id.in_(dispatched))
+        )).all():
+            items_by_order[order_id].append(menu_item_id)
+    for row in moved:
+        _observe_phase(row, items_by_order[row.id])
+
+    # Tell conflicts (report the status the order is actually in) from unknown ids
+    updated_ids = {row.id for row in updated}
+    missing = [order_id for order_id in by_id if order_id not in updated_ids]
+    current = {}
+    if missing:
+        current = dict((await db.execute(
+            select(Order.id, Order.order_status).where(Order.id.in_(missing))
+        )).all())
+    results = []
+    for order_id, change in by_id.items():
+        if order_id in updated_ids:
+            results.append({"order_id": order_id, "result": "updated", "order_status": change.order_status})
+        elif order_id in current:
+            results.append({"order_id": order_id, "result": "conflict", "order_status": current[order_id]})
+        else:
+            results.append({"order_id": order_id, "result": "not_found", "order_status": None})
+    return results
+
+# Page through one owner's orders newest first: the hot table, then (optionally) the
+# archive once the hot rows run out. The archive is only touched for deep pages.
+async def _orders_for(db: AsyncSession, column: str, value: int, skip: int, limit: int, include_archived: bool) -> list:
     result = await db.execute(
         select(Order)
-        .options(selectinload(Order.items))
-        .where(Order.restaurant_id == restaurant_id)
+        .options(*ORDER_LOAD_OPTIONS)
+        .where(getattr(Order, column) == value)
+        .order_by(Order.order_date.desc(), Order.id.desc())
         .offset(skip)
         .limit(limit)
     )
-    return result.scalars().all()
+    orders = list(result.scalars().all())
+    if not include_archived or len(orders) == limit:
+        return orders
+
+    if orders:
+        hot_total = skip + len(orders)
+    else:
+        hot_total = (await db.execute(
+            select(func.count(Order.id)).where(getattr(Order, column) == value)
+        )).scalar()
+    archived = await db.execute(
+        select(ArchivedOrder)
+        .where(getattr(ArchivedOrder, column) == value)
+        .order_by(ArchivedOrder.order_date.desc(), ArchivedOrder.id.desc())
+        .offset(max(0, skip - hot_total))
+        .limit(limit - len(orders))
+    )
+    return orders + list(archived.scalars().all())
+
+# Get orders for a customer
+async def get_customer_orders(db: AsyncSession, customer_id: int, skip: int = 0, limit: int = 10, include_archived: bool = False) -> List[Order]:
+    return await _orders_for(db, "customer_id", customer_id, skip, limit, include_archived)
+
+# Get orders for a restaurant
+async def get_restaurant_orders(db: AsyncSession, restaurant_id: int, skip: int = 0, limit: int = 10, include_archived: bool = False) -> List[Order]:
+    return await _orders_for(db, "restaurant_id", restaurant_id, skip, limit, include_archived)
 
 # Calculate order total
 async def calculate_order_total(db: AsyncSession, order_id: int) -> Optional[float]:
@@ -327,12 +781,21 @@ async def calculate_order_total(db: AsyncSession, order_id: int) -> Optional[flo
     total = result.scalar()
     return float(total) if total is not None else None
 
-# Add item to order
+# Add item to order (keeps the order total and the revenue rollups in step)
 async def add_order_item(db: AsyncSession, order_id: int, item: OrderItemCreate) -> OrderItem:
+    db_order = await db.get(Order, order_id)
+    if not db_order:
+        raise HTTPException(status_code=404, detail="Order not found")
     db_item = OrderItem(**item.dict(), order_id=order_id)
     db.add(db_item)
+    amount = item.item_price * item.quantity
+    db_order.total_amount += amount
+    if db_order.order_status not in analytics.EXCLUDED_STATUSES:
+        await analytics.record_order(db, db_order.restaurant_id, db_order.order_date, 0, amount)
+    await customer_summary.invalidate(db, db_order.customer_id)
     await db.commit()
-    await db.refresh(db_item)
+    leaderboard.record(db_order.restaurant_id, item.menu_item_id, item.quantity, leaderboard.order_ts(db_order.order_date))
+    await db.refresh(db_item, ["menu_item"])
     return db_item
 
 # Remove item from order
@@ -344,8 +807,17 @@ async def remove_order_item(db: AsyncSession, order_id: int, item_id: int) -> bo
     db_item = db_item.scalar_one_or_none()
     if not db_item:
         return False
+    db_order = await db.get(Order, order_id)
+    amount = db_item.item_price * db_item.quantity
+    db_order.total_amount -= amount
+    if db_order.order_status not in analytics.EXCLUDED_STATUSES:
+        await analytics.record_order(db, db_order.restaurant_id, db_order.order_date, 0, -amount)
+    await customer_summary.invalidate(db, db_order.customer_id)
     await db.delete(db_item)
     await db.commit()
+    leaderboard.record(
+        db_order.restaurant_id, db_item.menu_item_id, -db_item.quantity, leaderboard.order_ts(db_order.order_date)
+    )
     return True
 
 # Get order items
@@ -357,19 +829,164 @@ async def get_order_items(db: AsyncSession, order_id: int) -> List[OrderItem]:
     )
     return result.scalars().all()
 
+# --- ORDER ARCHIVE (hot/cold storage) ---
+
+# Delivered orders older than this many days are moved to orders_archive
+ORDER_ARCHIVE_AFTER_DAYS = int(os.getenv("ORDER_ARCHIVE_AFTER_DAYS", "90"))
+ARCHIVABLE_STATUSES = ("delivered",)
+
+# Move old delivered orders (and their items) out of the hot tables in chunks.
+# Each chunk is copied into orders_archive and deleted from orders/order_items in the
+# same transaction, so an order is always in exactly one place. Returns how many moved.
+async def archive_orders(db: AsyncSession, older_than_days: int = ORDER_ARCHIVE_AFTER_DAYS, batch_size: int = 500) -> int:
+    # SQLite stores server-side timestamps as naive UTC
+    cutoff = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=older_than_days)
+    moved = 0
+    while True:
+        ids = (await db.execute(
+            select(Order.id)
+            .where(Order.order_status.in_(ARCHIVABLE_STATUSES), Order.order_date < cutoff)
+            .order_by(Order.id)
+            .limit(batch_size)
+        )).scalars().all()
+        if not ids:
+            return moved
+
+        items_by_order = defaultdict(list)
+        items = await db.execute(select(OrderItem.__table__).where(OrderItem.order_id.in_(ids)))
+        for item in items.mappings():
+            items_by_order[item["order_id"]].append({
+                "id": item["id"],
+                "menu_item_id": item["menu_item_id"],
+                "quantity": item["quantity"],
+                "item_price": str(item["item_price"]),
+                "special_requests": item["special_requests"],
+            })
+        orders = await db.execute(select(Order.__table__).where(Order.id.in_(ids)))
+        await db.execute(insert(ArchivedOrder), [
+            {**order, "order_items": items_by_order[order["id"]]}
+            for order in orders.mappings()
+        ])
+        await db.execute(delete(OrderItem).where(OrderItem.order_id.in_(ids)))
+        await db.execute(delete(Order).where(Order.id.in_(ids)))
+        await db.commit()
+        moved += len(ids)
+
+# The ETA model's current averages for a restaurant and its menu items (None if no such restaurant)
+async def get_eta_model(db: AsyncSession, restaurant_id: int) -> Optional[dict]:
+    if not await get_restaurant_version(db, restaurant_id):
+        return None
+    items = (await db.execute(
+        select(MenuItem.id, MenuItem.name, MenuItem.preparation_time)
+        .where(MenuItem.restaurant_id == restaurant_id).order_by(MenuItem.id)
+    )).all()
+    return {
+        "restaurant_id": restaurant_id,
+        "alpha": eta.ETA_EWMA_ALPHA,
+        "overall": eta.snapshot(eta.GLOBAL),
+        "restaurant": eta.snapshot(("restaurant", restaurant_id)),
+        "items": [
+            {"menu_item_id": item_id, "name": name, "preparation_time": preparation_time, **eta.snapshot(("item", item_id))}
+            for item_id, name, preparation_time in items
+        ],
+    }
+
+# Menu items for a leaderboard: hydrate names for the ids the counters returned
+async def get_popular_menu_items(db: AsyncSession, window: str, limit: int = 10, restaurant_id: Optional[int] = None) -> List[dict]:
+    ranking = leaderboard.top_items(window, limit, restaurant_id)
+    if not ranking:
+        return []
+    result = await db.execute(
+        select(MenuItem.id, MenuItem.name).where(MenuItem.id.in_([entry["menu_item_id"] for entry in ranking]))
+    )
+    names = dict(result.all())
+    return [{**entry, "name": names[entry["menu_item_id"]]} for entry in ranking if entry["menu_item_id"] in names]
+
 # --- CUSTOMER CRUD OPERATIONS ---
 
-# Create a new customer
+# Home-screen summary for a customer: one lookup of the precomputed document
+async def get_customer_summary(db: AsyncSession, customer_id: int) -> dict:
+    return customer_summary.to_response(customer_id, await customer_summary.get_document(db, customer_id))
+
+# How much of the customer's history seeds their recommendations
+RECOMMENDATION_SEED_ITEMS = 5
+RECOMMENDATION_SEED_RESTAURANTS = 3
+
+# Merge the neighbour lists of the seeds, dropping anything the customer already knows
+def _rank_neighbors(rows: list, exclude: set, limit: int) -> List[tuple]:
+    scores = {}
+    details = {}
+    for neighbor_id, score, *detail in rows:
+        if neighbor_id in exclude:
+            continue
+        scores[neighbor_id] = scores.get(neighbor_id, 0.0) + score
+        details[neighbor_id] = detail
+    best = sorted(scores, key=scores.get, reverse=True)[:limit]
+    return [(neighbor_id, scores[neighbor_id], details[neighbor_id]) for neighbor_id in best]
+
+# Personalized recommendations: menu items and restaurants the customer hasn't ordered
+# yet, scored by similarity to their most reordered items and favourite restaurants.
+# Reads only the precomputed neighbours of a few seeds (see recommendations.py).
+async def get_customer_recommendations(db: AsyncSession, customer_id: int, limit: int = 10) -> dict:
+    summary = await get_customer_summary(db, customer_id)
+    seed_items = [item["menu_item_id"] for item in summary["reorder_items"][:RECOMMENDATION_SEED_ITEMS]]
+    seed_restaurants = [r["restaurant_id"] for r in summary["favorite_restaurants"][:RECOMMENDATION_SEED_RESTAURANTS]]
+
+    menu_items = []
+    if seed_items:
+        rows = (await db.execute(
+            select(Neighbor.neighbor_id, Neighbor.score, MenuItem.name, MenuItem.restaurant_id, MenuItem.price)
+            .join(MenuItem, MenuItem.id == Neighbor.neighbor_id)
+            .where(Neighbor.kind == "item", Neighbor.entity_id.in_(seed_items), MenuItem.is_available.is_(True))
+        )).all()
+        known_items = {item["menu_item_id"] for item in summary["reorder_items"]}
+        menu_items = [
+            {"menu_item_id": item_id, "score": score, "name": name, "restaurant_id": restaurant_id, "price": price}
+            for item_id, score, (name, restaurant_id, price) in _rank_neighbors(rows, known_items, limit)
+        ]
+
+    restaurants = []
+    if seed_restaurants:
+        rows = (await db.execute(
+            select(Neighbor.neighbor_id, Neighbor.score, Restaurant.name, Restaurant.cuisine_type, Restaurant.rating)
+            .join(Restaurant, Restaurant.id == Neighbor.neighbor_id)
+            .where(Neighbor.kind == "restaurant", Neighbor.entity_id.in_(seed_restaurants), Restaurant.is_active.is_(True))
+        )).all()
+        known_restaurants = {r["restaurant_id"] for r in summary["favorite_restaurants"]}
+        restaurants = [
+            {"restaurant_id": restaurant_id, "score": score, "name": name, "cuisine_type": cuisine_type, "rating": rating}
+            for restaurant_id, score, (name, cuisine_type, rating) in _rank_neighbors(rows, known_restaurants, limit)
+        ]
+
+    return {"customer_id": customer_id, "menu_items": menu_items, "restaurants": restaurants}
+
+# Create a new customer in one statement: INSERT ... ON CONFLICT (email) DO NOTHING
+# RETURNING *. A taken email inserts nothing and returns no row, so there is no
+# lookup beforehand and no failed insert to roll back.
 async def create_customer(db: AsyncSession, customer: CustomerCreate) -> Customer:
-    db_customer = Customer(**customer.dict())
-    db.add(db_customer)
-    try:
-        await db.commit()
-        await db.refresh(db_customer)
-        return db_customer
-    except IntegrityError:
+    dialect_insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    result = await db.execute(
+        dialect_insert(Customer).values(**customer.dict())
+        .on_conflict_do_nothing(index_elements=[Customer.email])
+        .returning(Customer)
+    )
+    db_customer = result.scalar_one_or_none()
+    if db_customer is None:
         await db.rollback()
         raise HTTPException(status_code=400, detail="Email already registered")
+    await db.commit()
+    email_index.add(db_customer.email)
+    return db_customer
+
+# Is this email free to register? Certain "yes" answers come from email_index's
+# filter without a query; the rest are one lookup on the email index.
+async def email_available(db: AsyncSession, email: str) -> bool:
+    if not email_index.might_exist(email):
+        return True
+    result = await db.execute(
+        select(Customer.id).where(Customer.email == email_index.normalize_email(email))
+    )
+    return result.scalar() is None
 
 # Get customer by ID
 async def get_customer(db: AsyncSession, customer_id: int) -> Optional[Customer]:
@@ -381,7 +998,7 @@ async def get_customer(db: AsyncSession, customer_id: int) -> Optional[Customer]
 # Get customer by email
 async def get_customer_by_email(db: AsyncSession, email: str) -> Optional[Customer]:
     result = await db.execute(
-        select(Customer).where(Customer.email == email)
+        select(Customer).where(Customer.email == email_index.normalize_email(email))
     )
     return result.scalar_one_or_none()
 
@@ -392,24 +1009,18 @@ async def list_customers(db: AsyncSession, skip: int = 0, limit: int = 10) -> Li
     )
     return result.scalars().all()
 
-# Update customer
-async def update_customer(db: AsyncSession, customer_id: int, customer: CustomerUpdate) -> Optional[Customer]:
-    db_customer = await get_customer(db, customer_id)
-    if not db_customer:
-        return None
-    
-    # If email is being updated, check if new email already exists
-    if customer.email and customer.email != db_customer.email:
-        existing = await get_customer_by_email(db, customer.email)
-        if existing:
-            raise HTTPException(status_code=400, detail="Email already registered")
-    
-    for key, value in customer.dict(exclude_unset=True).items():
-        setattr(db_customer, key, value)
-    
+# Update customer (only if still at expected_version, when given)
+async def update_customer(
+    db: AsyncSession, customer_id: int, customer: CustomerUpdate, expected_version: Optional[int] = None
+) -> Optional[Customer]:
+    # A taken email is rejected by the unique index, no lookup beforehand
     try:
+        db_customer = await versioned_update(
+            db, Customer, customer_id, customer.dict(exclude_unset=True), expected_version
+        )
         await db.commit()
-        await db.refresh(db_customer)
+        if db_customer is not None and customer.email:
+            email_index.add(db_customer.email)
         return db_customer
     except IntegrityError:
         await db.rollback()
@@ -421,5 +1032,7 @@ async def delete_customer(db: AsyncSession, customer_id: int) -> bool:
     if not db_customer:
         return False
     await db.delete(db_customer)
+    await customer_summary.invalidate(db, customer_id)
     await db.commit()
+    email_index.remove(db_customer.email)
     return True
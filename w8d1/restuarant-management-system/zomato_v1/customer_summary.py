@@ -0,0 +1,160 @@
+# Per-customer order-history summary for the app home screen
+#
+# customer_summaries keeps one JSON document per customer with their last few orders
+# and running per-restaurant / per-item counters. Placing an order folds it into the
+# document in the same transaction (record_order); status changes and item edits just
+# drop the document (invalidate) and the next read rebuilds it from the order tables.
+# Reads are a single primary-key lookup plus a sort of a few small dicts.
+from datetime import datetime
+from typing import Dict, List
+
+from sqlalchemy import delete, select, union_all
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm.attributes import flag_modified
+
+from models import ArchivedOrder, CustomerSummary, MenuItem, Order, OrderItem, Restaurant
+
+RECENT_ORDERS = 10
+FAVORITE_RESTAURANTS = 5
+REORDER_ITEMS = 10
+# Orders in these statuses still show up in recent orders but don't count as favourites
+EXCLUDED_STATUSES = ("cancelled",)
+
+
+# Fold one order into a summary document. `items` is [(menu_item_id, quantity)].
+def _apply(data: dict, order: dict, items: List[tuple], restaurant_name: str, item_names: Dict[int, str]) -> None:
+    data["recent_orders"].insert(0, {**order, "restaurant_name": restaurant_name, "item_count": sum(q for _, q in items)})
+    data["recent_orders"].sort(key=lambda o: (o["order_date"], o["id"]), reverse=True)
+    del data["recent_orders"][RECENT_ORDERS:]
+    if order["order_status"] in EXCLUDED_STATUSES:
+        return
+
+    # JSON object keys are strings
+    restaurant = data["restaurants"].setdefault(str(order["restaurant_id"]), {"name": restaurant_name, "order_count": 0, "last_ordered": None})
+    restaurant["order_count"] += 1
+    restaurant["last_ordered"] = max(filter(None, [restaurant["last_ordered"], order["order_date"]]))
+    for menu_item_id in {menu_item_id for menu_item_id, _ in items}:
+        entry = data["items"].setdefault(str(menu_item_id), {
+            "name": item_names.get(menu_item_id, ""), "restaurant_id": order["restaurant_id"],
+            "order_count": 0, "quantity": 0,
+        })
+        entry["order_count"] += 1
+    for menu_item_id, quantity in items:
+        data["items"][str(menu_item_id)]["quantity"] += quantity
+
+
+def _order_fields(order_id: int, restaurant_id: int, order_date: datetime, total_amount, order_status: str) -> dict:
+    return {
+        "id": order_id,
+        "restaurant_id": restaurant_id,
+        "order_date": order_date.isoformat() if order_date else "",
+        "total_amount": float(total_amount or 0),
+        "order_status": order_status,
+    }
+
+
+def _empty() -> dict:
+    return {"recent_orders": [], "restaurants": {}, "items": {}}
+
+
+async def _names(db: AsyncSession, restaurant_ids, menu_item_ids) -> tuple:
+    restaurants = dict((await db.execute(
+        select(Restaurant.id, Restaurant.name).where(Restaurant.id.in_(set(restaurant_ids)))
+    )).all())
+    items = dict((await db.execute(
+        select(MenuItem.id, MenuItem.name).where(MenuItem.id.in_(set(menu_item_ids)))
+    )).all())
+    return restaurants, items
+
+
+# Build a customer's document from scratch (hot and archived orders)
+async def build(db: AsyncSession, customer_id: int) -> dict:
+    columns = lambda t: select(t.id, t.restaurant_id, t.order_date, t.total_amount, t.order_status)
+    orders = (await db.execute(union_all(
+        columns(Order).where(Order.customer_id == customer_id),
+        columns(ArchivedOrder).where(ArchivedOrder.customer_id == customer_id),
+    ))).all()
+
+    items: Dict[int, List[tuple]] = {order.id: [] for order in orders}
+    hot_items = await db.execute(
+        select(OrderItem.order_id, OrderItem.menu_item_id, OrderItem.quantity)
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.customer_id == customer_id)
+    )
+    for order_id, menu_item_id, quantity in hot_items:
+        items[order_id].append((menu_item_id, quantity))
+    archived_items = await db.execute(
+        select(ArchivedOrder.id, ArchivedOrder.order_items).where(ArchivedOrder.customer_id == customer_id)
+    )
+    for order_id, order_items in archived_items:
+        items[order_id] = [(item["menu_item_id"], item["quantity"]) for item in order_items or []]
+
+    restaurant_names, item_names = await _names(
+        db, [order.restaurant_id for order in orders],
+        [menu_item_id for order_items in items.values() for menu_item_id, _ in order_items]
+    )
+    data = _empty()
+    for order in sorted(orders, key=lambda o: (o.order_date or datetime.min, o.id)):
+        _apply(data, _order_fields(*order), items[order.id], restaurant_names.get(order.restaurant_id, ""), item_names)
+    return data
+
+
+# Fold a newly placed order into the customer's document. Runs in the caller's
+# transaction (no commit). If there is no document yet it is left to the next read.
+async def record_order(db: AsyncSession, order: Order, items: List[tuple]) -> None:
+    summary = (await db.execute(
+        select(CustomerSummary).where(CustomerSummary.customer_id == order.customer_id).with_for_update()
+    )).scalar_one_or_none()
+    if summary is None:
+        return
+    restaurant_names, item_names = await _names(db, [order.restaurant_id], [menu_item_id for menu_item_id, _ in items])
+    _apply(
+        summary.data, _order_fields(order.id, order.restaurant_id, order.order_date, order.total_amount, order.order_status),
+        items, restaurant_names.get(order.restaurant_id, ""), item_names
+    )
+    flag_modified(summary, "data")  # plain JSON column, in-place changes aren't tracked
+
+
+# Drop a customer's document; it is rebuilt on the next read. Runs in the caller's transaction.
+async def invalidate(db: AsyncSession, customer_id: int) -> None:
+    await db.execute(delete(CustomerSummary).where(CustomerSummary.customer_id == customer_id))
+
+
+# invalidate for several customers with one statement
+async def invalidate_many(db: AsyncSession, customer_ids: List[int]) -> None:
+    if customer_ids:
+        await db.execute(delete(CustomerSummary).where(CustomerSummary.customer_id.in_(customer_ids)))
+
+
+# The stored document, rebuilding and saving it first if it was missing or invalidated
+async def get_document(db: AsyncSession, customer_id: int) -> dict:
+    summary = await db.get(CustomerSummary, customer_id)
+    if summary is not None:
+        return summary.data
+    data = await build(db, customer_id)
+    db.add(CustomerSummary(customer_id=customer_id, data=data))
+    try:
+        await db.commit()
+    except IntegrityError:  # a concurrent read stored it first
+        await db.rollback()
+    return data
+
+
+# Shape a stored document for the API: top restaurants and most reordered items
+def to_response(customer_id: int, data: dict) -> dict:
+    restaurants = sorted(
+        data["restaurants"].items(), key=lambda kv: (kv[1]["order_count"], kv[1]["last_ordered"] or ""), reverse=True
+    )
+    items = sorted(data["items"].items(), key=lambda kv: (kv[1]["order_count"], kv[1]["quantity"]), reverse=True)
+    return {
+        "customer_id": customer_id,
+        "order_count": sum(entry["order_count"] for entry in data["restaurants"].values()),
+        "recent_orders": data["recent_orders"],
+        "favorite_restaurants": [
+            {"restaurant_id": int(rid), **entry} for rid, entry in restaurants[:FAVORITE_RESTAURANTS]
+        ],
+        "reorder_items": [
+            {"menu_item_id": int(mid), **entry} for mid, entry in items[:REORDER_ITEMS]
+        ],
+    }
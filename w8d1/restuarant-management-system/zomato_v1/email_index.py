@@ -0,0 +1,113 @@
+# Registered customer emails: normalization and an in-memory existence filter
+#
+# Emails are stored normalized (trimmed, lowercased), so the unique index on
+# customers.email is also the case-insensitive lookup index.
+#
+# The filter is a counting Bloom filter over every registered email. "Not in the
+# filter" is a definite answer, so most availability checks (GET /customers/email-available,
+# hit hard during signup spikes) never reach the database; "maybe" falls back to one
+# indexed lookup. It is rebuilt from the database at startup, and updated on create
+# (add) and delete (remove; counters instead of bits make that possible).
+#
+# The filter only answers availability checks. Writes never trust it: the unique
+# index settles conflicts (see crud.create_customer). When several worker processes
+# serve the API, each only sees its own signups, so every EMAIL_FILTER_SYNC_SECONDS
+# they rebuild the filter from the database (see sync_forever).
+import asyncio
+import hashlib
+import logging
+import math
+import os
+from typing import Optional
+
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import run_in_session
+from models import Customer
+
+logger = logging.getLogger(__name__)
+
+# Target false positive rate, and room for this many emails at least
+EMAIL_FILTER_FP_RATE = float(os.getenv("EMAIL_FILTER_FP_RATE", "0.01"))
+EMAIL_FILTER_MIN_CAPACITY = int(os.getenv("EMAIL_FILTER_MIN_CAPACITY", "100000"))
+# Seconds between rebuilds from the database; 0 (single process) disables them
+EMAIL_FILTER_SYNC_SECONDS = int(os.getenv("EMAIL_FILTER_SYNC_SECONDS", "0"))
+
+
+# The one spelling of an email that is stored, indexed and compared
+def normalize_email(email: str) -> str:
+    return email.strip().lower()
+
+
+class CountingBloomFilter:
+    # One byte counter per slot; a saturated counter (255) is never decremented again
+    def __init__(self, capacity: int, fp_rate: float) -> None:
+        self.size = max(64, int(-capacity * math.log(fp_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.capacity = capacity
+        self.counters = bytearray(self.size)
+
+    # Double hashing: slot i is h1 + i * h2, from one 128-bit digest
+    def _slots(self, key: str):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1, h2 = int.from_bytes(digest[:8], "little"), int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, key: str) -> None:
+        for slot in self._slots(key):
+            if self.counters[slot] < 255:
+                self.counters[slot] += 1
+
+    def remove(self, key: str) -> None:
+        for slot in self._slots(key):
+            if 0 < self.counters[slot] < 255:
+                self.counters[slot] -= 1
+
+    def __contains__(self, key: str) -> bool:
+        return all(self.counters[slot] for slot in self._slots(key))
+
+
+# None until the first load: every check then goes to the database
+_filter: Optional[CountingBloomFilter] = None
+
+
+# False only if the email is certainly not registered
+def might_exist(email: str) -> bool:
+    return _filter is None or normalize_email(email) in _filter
+
+
+def add(email: str) -> None:
+    if _filter is not None:
+        _filter.add(normalize_email(email))
+
+
+# Only for emails known to have been registered (a deleted customer's)
+def remove(email: str) -> None:
+    if _filter is not None:
+        _filter.remove(normalize_email(email))
+
+
+# Build a filter sized for twice the current customers from all stored emails, then
+# swap it in, so checks never see a half-loaded filter. Returns the number loaded.
+async def load(db: AsyncSession) -> int:
+    global _filter
+    total = (await db.execute(select(func.count(Customer.id)))).scalar() or 0
+    fresh = CountingBloomFilter(max(EMAIL_FILTER_MIN_CAPACITY, 2 * total), EMAIL_FILTER_FP_RATE)
+    result = await db.stream(select(Customer.email).execution_options(yield_per=5000))
+    loaded = 0
+    async for (email,) in result:
+        fresh.add(normalize_email(email))
+        loaded += 1
+    _filter = fresh
+    return loaded
+
+
+# Background task: pick up the signups and deletions other worker processes handled
+async def sync_forever(interval: int = EMAIL_FILTER_SYNC_SECONDS) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_session(load)
+        except Exception:
+            logger.warning("Email filter sync failed", exc_info=True)
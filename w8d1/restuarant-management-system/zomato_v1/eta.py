@@ -0,0 +1,180 @@
+# Delivery time estimates from observed preparation and delivery durations
+#
+# Every order status change that ends a phase is one observation:
+#   prep       placed -> out_for_delivery (order_date to dispatched_at)
+#   delivery   out_for_delivery -> delivered (dispatched_at to delivery_time)
+# Each is folded into exponentially weighted moving averages kept in memory: prep per
+# restaurant, per menu item (the orders containing it) and overall; delivery per
+# restaurant and overall. Recent orders weigh most (ETA_EWMA_ALPHA), no history is kept.
+#
+# estimate() is a handful of dict lookups per order item, so create_order predicts the
+# delivery time without touching past orders:
+#   prep     slowest item: its average, else its menu preparation_time, else the
+#            restaurant's average, else the overall one, else DEFAULT_PREP_SECONDS
+#   delivery the restaurant's average, else the overall one, else DEFAULT_DELIVERY_SECONDS
+#
+# The averages are checkpointed to eta_stats every ETA_CHECKPOINT_SECONDS (only the ones
+# that changed) and on shutdown, and loaded at startup. With several worker processes
+# each learns from the status changes it handles and they overwrite each other's rows:
+# all of them estimate the same averages, so that only loses a few samples.
+import asyncio
+import logging
+import os
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import run_in_session
+from models import EtaStat
+
+logger = logging.getLogger(__name__)
+
+# Weight of the newest observation
+ETA_EWMA_ALPHA = float(os.getenv("ETA_EWMA_ALPHA", "0.2"))
+# Seconds between checkpoints; 0 disables them (shutdown still saves)
+ETA_CHECKPOINT_SECONDS = int(os.getenv("ETA_CHECKPOINT_SECONDS", "60"))
+DEFAULT_PREP_SECONDS = 20 * 60
+DEFAULT_DELIVERY_SECONDS = 25 * 60
+# Longer phases are data problems (an order left open for days), not kitchen speed
+MAX_OBSERVATION_SECONDS = 4 * 3600
+CHECKPOINT_BATCH = 500  # rows per upsert statement
+
+Key = Tuple[str, int]  # (kind, entity_id): ("restaurant", id), ("item", id), ("global", 0)
+GLOBAL: Key = ("global", 0)
+
+
+@dataclass
+class Stat:
+    prep_seconds: Optional[float] = None
+    prep_samples: int = 0
+    delivery_seconds: Optional[float] = None
+    delivery_samples: int = 0
+
+
+def _ewma(current: Optional[float], value: float) -> float:
+    return value if current is None else current + ETA_EWMA_ALPHA * (value - current)
+
+
+STATS: Dict[Key, Stat] = {}
+_dirty: Set[Key] = set()
+
+
+def _stat(key: Key) -> Stat:
+    stat = STATS.get(key)
+    if stat is None:
+        stat = STATS[key] = Stat()
+    _dirty.add(key)
+    return stat
+
+
+def _usable(seconds: float) -> bool:
+    return 0 <= seconds <= MAX_OBSERVATION_SECONDS
+
+
+# An order went out for delivery `seconds` after it was placed
+def observe_prep(restaurant_id: int, menu_item_ids: Iterable[int], seconds: float) -> None:
+    if not _usable(seconds):
+        return
+    for key in [GLOBAL, ("restaurant", restaurant_id), *(("item", i) for i in set(menu_item_ids))]:
+        stat = _stat(key)
+        stat.prep_seconds = _ewma(stat.prep_seconds, seconds)
+        stat.prep_samples += 1
+
+
+# An order was delivered `seconds` after it went out
+def observe_delivery(restaurant_id: int, seconds: float) -> None:
+    if not _usable(seconds):
+        return
+    for key in (GLOBAL, ("restaurant", restaurant_id)):
+        stat = _stat(key)
+        stat.delivery_seconds = _ewma(stat.delivery_seconds, seconds)
+        stat.delivery_samples += 1
+
+
+# Items without a prep average, whose menu preparation_time estimate() will need
+def unseen_items(menu_item_ids: Iterable[int]) -> List[int]:
+    return [i for i in set(menu_item_ids) if STATS.get(("item", i), Stat()).prep_seconds is None]
+
+
+def _first(*values: Optional[float]) -> float:
+    return next(value for value in values if value is not None)
+
+
+# Predicted time from placing an order to its delivery. `preparation_minutes` maps the
+# unseen_items to their menu preparation_time (None if unset).
+def estimate(
+    restaurant_id: int, menu_item_ids: Iterable[int], preparation_minutes: Optional[Dict[int, Optional[int]]] = None
+) -> timedelta:
+    preparation_minutes = preparation_minutes or {}
+    restaurant = STATS.get(("restaurant", restaurant_id), Stat())
+    overall = STATS.get(GLOBAL, Stat())
+    fallback_prep = _first(restaurant.prep_seconds, overall.prep_seconds, DEFAULT_PREP_SECONDS)
+    prep = max(
+        (
+            _first(
+                STATS.get(("item", i), Stat()).prep_seconds,
+                preparation_minutes[i] * 60 if preparation_minutes.get(i) else None,
+                fallback_prep,
+            )
+            for i in set(menu_item_ids)
+        ),
+        default=fallback_prep,
+    )
+    delivery = _first(restaurant.delivery_seconds, overall.delivery_seconds, DEFAULT_DELIVERY_SECONDS)
+    return timedelta(seconds=prep + delivery)
+
+
+# Replace the in-memory averages with the checkpointed ones (startup)
+async def load(db: AsyncSession) -> int:
+    rows = (await db.execute(select(EtaStat))).scalars().all()
+    STATS.clear()
+    _dirty.clear()
+    for row in rows:
+        STATS[(row.kind, row.entity_id)] = Stat(
+            row.prep_seconds, row.prep_samples, row.delivery_seconds, row.delivery_samples
+        )
+    return len(rows)
+
+
+# Write the averages that changed since the last checkpoint; returns how many
+async def checkpoint(db: AsyncSession) -> int:
+    keys = list(_dirty)
+    if not keys:
+        return 0
+    _dirty.difference_update(keys)
+    rows = [
+        {"kind": kind, "entity_id": entity_id, **vars(STATS[(kind, entity_id)])}
+        for kind, entity_id in keys
+    ]
+    dialect_insert = postgresql.insert if db.bind.dialect.name == "postgresql" else sqlite.insert
+    try:
+        for i in range(0, len(rows), CHECKPOINT_BATCH):
+            stmt = dialect_insert(EtaStat).values(rows[i:i + CHECKPOINT_BATCH])
+            await db.execute(stmt.on_conflict_do_update(
+                index_elements=[EtaStat.kind, EtaStat.entity_id],
+                set_={name: stmt.excluded[name] for name in vars(Stat())},
+            ))
+        await db.commit()
+    except Exception:
+        _dirty.update(keys)  # retried at the next checkpoint
+        raise
+    return len(rows)
+
+
+# Background task: checkpoint every `interval` seconds
+async def checkpoint_forever(interval: int = ETA_CHECKPOINT_SECONDS) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_session(checkpoint)
+        except Exception:
+            logger.warning("ETA checkpoint failed", exc_info=True)
+
+
+# Current averages for the inspect endpoint
+def snapshot(key: Key) -> dict:
+    return dict(vars(STATS.get(key, Stat())))
@@ -0,0 +1,67 @@
+# Multi-process serving: gunicorn managing uvicorn workers
+#
+#   gunicorn -c gunicorn_conf.py main:app
+#
+# One uvicorn process is bound to one CPU core for Pydantic validation and JSON work;
+# this runs WEB_CONCURRENCY of them (default: one per core) behind one socket.
+#
+# What the workers share, and how:
+#   database      SQLite in WAL mode with a busy timeout (see database.py). Fine for
+#                 read-heavy traffic; writers still go one at a time, so with heavy
+#                 write traffic use Postgres: DATABASE_URL=postgresql+asyncpg://...
+#   schema        migrated once, here in the master before any worker starts; workers
+#                 only check the version (MIGRATE_ON_STARTUP=0 for them)
+#   cache         Redis (REDIS_URL) is the shared L2 cache; a miss is built by one worker
+#                 and the others wait for it (compression.cached_json), and only one
+#                 worker runs the startup warmup
+#   jobs          claimed through the jobs table, safe with any number of workers; for
+#                 big deployments prefer JOB_WORKERS=0 here plus `python jobs.py worker`
+#   leaderboard   in-process counters, rebuilt from the database every
+#                 LEADERBOARD_SYNC_SECONDS (default 30 here) so all workers converge
+#   email filter  in-process, rebuilt every EMAIL_FILTER_SYNC_SECONDS (default 60 here);
+#                 only availability checks read it, signups are settled by the database
+#   metrics       counted per worker, published to METRICS_DIR every METRICS_FLUSH_SECONDS;
+#                 GET /metrics on any worker reports the sum (see metrics.py)
+#
+# benchmarks/bench_workers.py measures throughput by worker count.
+import glob
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+
+try:
+    import uvicorn_worker  # noqa: F401  (pip install uvicorn-worker)
+    worker_class = "uvicorn_worker.UvicornWorker"
+except ImportError:
+    worker_class = "uvicorn.workers.UvicornWorker"  # deprecated copy bundled with uvicorn
+
+bind = os.getenv("BIND", "0.0.0.0:8000")
+workers = int(os.getenv("WEB_CONCURRENCY", str(multiprocessing.cpu_count())))
+# Each worker imports the app itself: no engine, connection pool or event loop is
+# created before the fork and then shared between processes
+preload_app = False
+timeout = int(os.getenv("WORKER_TIMEOUT", "60"))
+graceful_timeout = 30  # lets running background jobs finish (see jobs.stop_pool)
+keepalive = 5
+accesslog = os.getenv("ACCESS_LOG") or None
+
+# Defaults for the workers (they inherit the master's environment)
+os.environ.setdefault("SQL_ECHO", "0")
+os.environ.setdefault("LEADERBOARD_SYNC_SECONDS", "30" if workers > 1 else "0")
+os.environ.setdefault("EMAIL_FILTER_SYNC_SECONDS", "60" if workers > 1 else "0")
+if workers > 1:
+    os.environ.setdefault("METRICS_DIR", os.path.join(tempfile.gettempdir(), f"zomato-metrics-{bind.rsplit(':', 1)[-1]}"))
+
+
+# Migrate in the master, once, so workers starting together never race on the schema
+def on_starting(server):
+    if os.getenv("MIGRATE_ON_STARTUP", "1") != "0":
+        script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations.py")
+        subprocess.run([sys.executable, script, "upgrade"], check=True)
+    os.environ["MIGRATE_ON_STARTUP"] = "0"
+    # Counters start from zero with each server start, not from the previous run's workers
+    if os.getenv("METRICS_DIR"):
+        for path in glob.glob(os.path.join(os.environ["METRICS_DIR"], "worker-*.json")):
+            os.remove(path)
@@ -0,0 +1,368 @@
+# Background jobs: persisted job records plus an asyncio worker pool
+#
+# Jobs are rows in the jobs table. A worker claims a queued job with a conditional
+# UPDATE (status queued -> running), runs its handler on its own session and records
+# the result. Failures are retried with exponential backoff until max_attempts.
+# Each job type has a concurrency limit, counted across all workers from the running
+# rows, so e.g. two full recommendation builds never run at the same time. The count is
+# part of the claiming UPDATE's condition, and claims of one type are serialized (SQLite
+# has a single writer; Postgres takes a per-type advisory lock for the transaction), so
+# concurrent claims - from any worker process - can't both see a free slot.
+#
+# A claimed job records its owner ("host:pid") and the owner's pool refreshes its
+# heartbeat every JOB_HEARTBEAT_SECONDS. A running job is requeued only when its owner is
+# gone: on the same host, when that process no longer exists; elsewhere, when the
+# heartbeat is older than JOB_STALE_SECONDS. So restarting a gunicorn worker doesn't
+# run a job twice that another, live worker is still running.
+#
+# The pool runs inside the API process (JOB_WORKERS, default 2; 0 disables it) or as a
+# separate process:  python jobs.py worker
+import asyncio
+import inspect
+import logging
+import os
+import socket
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+import analytics
+import crud
+from database import AsyncSessionLocal
+from models import Job
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))
+RETRY_BASE_SECONDS = 5
+RETRY_MAX_SECONDS = 600
+HEARTBEAT_SECONDS = float(os.getenv("JOB_HEARTBEAT_SECONDS", "30"))
+# A running job whose owner (on another host) hasn't sent a heartbeat for this long is
+# assumed to belong to a dead worker and is requeued
+STALE_AFTER = timedelta(seconds=float(os.getenv("JOB_STALE_SECONDS", "300")))
+
+
+@dataclass
+class JobType:
+    handler: Callable[..., Awaitable[Any]]  # handler(db, **params) -> JSON-serializable result
+    concurrency: int = 1
+    max_attempts: int = 3
+
+
+JOB_TYPES: Dict[str, JobType] = {}
+
+
+# Register a coroutine as a job type
+def job_type(name: str, concurrency: int = 1, max_attempts: int = 3):
+    def register(handler: Callable[..., Awaitable[Any]]):
+        JOB_TYPES[name] = JobType(handler, concurrency, max_attempts)
+        return handler
+    return register
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# This process, as recorded on the jobs it claims (not cached: gunicorn forks workers)
+def _worker_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+# --- Built-in job types ---
+
+@job_type("recompute_ratings", concurrency=1)
+async def _recompute_ratings(db: AsyncSession, restaurant_id: Optional[int] = None) -> dict:
+    return {"updated": await crud.recompute_restaurant_ratings(db, restaurant_id=restaurant_id)}
+
+
+@job_type("analytics_backfill", concurrency=1)
+async def _analytics_backfill(db: AsyncSession, restaurant_id: Optional[int] = None) -> dict:
+    return {"rollup_rows": await analytics.backfill(db, restaurant_id=restaurant_id)}
+
+
+@job_type("archive_orders", concurrency=1)
+async def _archive_orders(db: AsyncSession, older_than_days: int = crud.ORDER_ARCHIVE_AFTER_DAYS) -> dict:
+    return {"archived": await crud.archive_orders(db, older_than_days=older_than_days)}
+
+
+@job_type("purge_restaurant", concurrency=2)
+async def _purge_restaurant(db: AsyncSession, restaurant_id: int) -> dict:
+    return await crud.purge_restaurant(db, restaurant_id)
+
+
+@job_type("recommendations_build", concurrency=1, max_attempts=2)
+async def _recommendations_build(db: AsyncSession) -> dict:
+    import recommendations  # NumPy/SciPy: only loaded where the job runs
+    return await recommendations.build(db)
+
+
+@job_type("recommendations_update", concurrency=1)
+async def _recommendations_update(db: AsyncSession) -> dict:
+    import recommendations
+    return await recommendations.update(db)
+
+
+@job_type("cache_warmup", concurrency=1)
+async def _cache_warmup(db: AsyncSession, top_n: Optional[int] = None) -> dict:
+    import warmup  # imports the route modules; only needed when this job runs
+    return dict(await warmup.warm_cache(top_n or warmup.WARMUP_TOP_N))
+
+
+# --- Submitting and inspecting ---
+
+# Queue a job; raises ValueError for an unknown type or params its handler doesn't take
+async def submit(db: AsyncSession, type: str, params: Optional[dict] = None, delay_seconds: int = 0) -> Job:
+    if type not in JOB_TYPES:
+        raise ValueError(f"Unknown job type: {type}")
+    params = params or {}
+    try:
+        # Checked here: a handler called with the wrong keywords would fail every retry
+        inspect.signature(JOB_TYPES[type].handler).bind(None, **params)
+    except TypeError as exc:
+        raise ValueError(f"Invalid params for {type}: {exc}")
+    job = Job(
+        type=type, params=params, status="queued",
+        max_attempts=JOB_TYPES[type].max_attempts,
+        run_after=_now() + timedelta(seconds=delay_seconds),
+    )
+    db.add(job)
+    await db.commit()
+    await db.refresh(job)
+    if _pool is not None:
+        _pool.wake()
+    return job
+
+
+async def get_job(db: AsyncSession, job_id: int) -> Optional[Job]:
+    return await db.get(Job, job_id)
+
+
+async def list_jobs(
+    db: AsyncSession, status: Optional[str] = None, type: Optional[str] = None, skip: int = 0, limit: int = 20
+) -> List[Job]:
+    query = select(Job).order_by(Job.id.desc())
+    if status:
+        query = query.where(Job.status == status)
+    if type:
+        query = query.where(Job.type == type)
+    result = await db.execute(query.offset(skip).limit(limit))
+    return result.scalars().all()
+
+
+# --- Running ---
+
+# Claim the next runnable job whose type is below its concurrency limit, or None
+async def _claim(db: AsyncSession) -> Optional[Job]:
+    running = dict((await db.execute(
+        select(Job.type, func.count()).where(Job.status == "running").group_by(Job.type)
+    )).all())
+    saturated = [name for name, spec in JOB_TYPES.items() if running.get(name, 0) >= spec.concurrency]
+    candidates = (await db.execute(
+        select(Job.id, Job.type)
+        .where(Job.status == "queued", Job.run_after <= _now(), Job.type.notin_(saturated))
+        .order_by(Job.run_after, Job.id)
+        .limit(5)
+    )).all()
+    await db.rollback()  # end the read; each claim below is its own write transaction
+    # The counts above are only a hint: the limit is enforced by the UPDATE itself
+    other = aliased(Job)
+    running_of_type = (
+        select(func.count()).select_from(other).where(other.type == Job.type, other.status == "running")
+        .scalar_subquery()
+    )
+    for job_id, job_type in candidates:
+        spec = JOB_TYPES.get(job_type)
+        if spec is None:
+            continue
+        if db.bind.dialect.name == "postgresql":
+            await db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": f"zomato_jobs:{job_type}"})
+        claimed = await db.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "queued", running_of_type < spec.concurrency)
+            .values(
+                status="running", attempts=Job.attempts + 1, started_at=_now(), error=None,
+                worker=_worker_id(), heartbeat_at=_now(),
+            )
+        )
+        await db.commit()
+        if claimed.rowcount == 1:
+            return await db.get(Job, job_id, populate_existing=True)
+    return None
+
+
+# Run one claimed job and record the outcome
+async def _execute(job: Job) -> None:
+    spec = JOB_TYPES.get(job.type)
+    try:
+        if spec is None:
+            raise ValueError(f"Unknown job type: {job.type}")
+        async with AsyncSessionLocal() as session:
+            result = await spec.handler(session, **job.params)
+        values = {"status": "succeeded", "result": result, "finished_at": _now()}
+    except Exception as exc:
+        logger.warning(f"Job {job.id} ({job.type}) failed on attempt {job.attempts}", exc_info=True)
+        values = {"error": f"{type(exc).__name__}: {exc}"}
+        if spec is not None and job.attempts < job.max_attempts:
+            backoff = min(RETRY_BASE_SECONDS * 2 ** (job.attempts - 1), RETRY_MAX_SECONDS)
+            values.update(status="queued", run_after=_now() + timedelta(seconds=backoff))
+        else:
+            values.update(status="failed", finished_at=_now())
+    async with AsyncSessionLocal() as session:
+        await session.execute(update(Job).where(Job.id == job.id).values(**values))
+        await session.commit()
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)  # signal 0: only checks that the process exists
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # exists, owned by another user
+        return True
+
+
+# Whether the process that claimed a running job is gone
+def _orphaned(worker: Optional[str], last_seen: Optional[datetime], now: datetime) -> bool:
+    host, _, pid = (worker or "").rpartition(":")
+    if host == socket.gethostname() and pid.isdigit():
+        return not _alive(int(pid))
+    return last_seen is None or last_seen < now - STALE_AFTER
+
+
+# Put jobs left "running" by a worker that died back in the queue
+async def requeue_stale(db: AsyncSession) -> int:
+    now = _now()
+    running = (await db.execute(
+        select(Job.id, Job.worker, func.coalesce(Job.heartbeat_at, Job.started_at)).where(Job.status == "running")
+    )).all()
+    orphans = [job_id for job_id, worker, last_seen in running if _orphaned(worker, last_seen, now)]
+    if not orphans:
+        await db.rollback()
+        return 0
+    result = await db.execute(
+        update(Job)
+        .where(Job.id.in_(orphans), Job.status == "running")
+        .values(status="queued", run_after=now, worker=None, heartbeat_at=None)
+    )
+    await db.commit()
+    return result.rowcount
+
+
+# Refresh the heartbeat of this process's running jobs
+async def _beat(db: AsyncSession) -> None:
+    await db.execute(
+        update(Job).where(Job.status == "running", Job.worker == _worker_id()).values(heartbeat_at=_now())
+    )
+    await db.commit()
+
+
+class WorkerPool:
+    def __init__(self, size: int = JOB_WORKERS, poll_interval: float = POLL_INTERVAL) -> None:
+        self.size = size
+        self.poll_interval = poll_interval
+        self._tasks: List[asyncio.Task] = []
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+        self._stopping = False
+
+    def wake(self) -> None:
+        self._wakeup.set()
+
+    async def _worker(self) -> None:
+        while not self._stopping:
+            try:
+                async with AsyncSessionLocal() as session:
+                    job = await _claim(session)
+            except Exception:
+                logger.warning("Job worker could not claim a job", exc_info=True)
+                job = None
+            if job is not None:
+                await _execute(job)
+                continue
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    # Heartbeat for this process's jobs; also picks up jobs of workers that died since start
+    async def _beat_forever(self) -> None:
+        while True:
+            await asyncio.sleep(HEARTBEAT_SECONDS)
+            try:
+                async with AsyncSessionLocal() as session:
+                    await _beat(session)
+                    requeued = await requeue_stale(session)
+                if requeued:
+                    logger.info(f"Requeued {requeued} jobs of dead workers")
+                    self.wake()
+            except Exception:
+                logger.warning("Job heartbeat failed", exc_info=True)
+
+    async def start(self) -> None:
+        async with AsyncSessionLocal() as session:
+            requeued = await requeue_stale(session)
+        if requeued:
+            logger.info(f"Requeued {requeued} jobs of dead workers")
+        self._heartbeat = asyncio.create_task(self._beat_forever())
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.size)]
+
+    # Stop taking new jobs and wait for the ones in progress
+    async def stop(self) -> None:
+        self._stopping = True
+        self.wake()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            await asyncio.gather(self._heartbeat, return_exceptions=True)
+            self._heartbeat = None
+
+
+# The in-process pool, if the API process runs one (see main.py)
+_pool: Optional[WorkerPool] = None
+
+
+async def start_pool(size: int = JOB_WORKERS) -> Optional[WorkerPool]:
+    global _pool
+    if size <= 0:
+        return None
+    _pool = WorkerPool(size)
+    await _pool.start()
+    return _pool
+
+
+async def stop_pool() -> None:
+    global _pool
+    if _pool is not None:
+        await _pool.stop()
+        _pool = None
+
+
+if __name__ == "__main__":
+    import sys
+    from database import engine
+    import migrations
+
+    async def _main() -> None:
+        await migrations.upgrade(engine)
+        await start_pool(max(JOB_WORKERS, 1))
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await stop_pool()
+
+    if len(sys.argv) < 2 or sys.argv[1] != "worker":
+        sys.exit("usage: python jobs.py worker")
+    logging.basicConfig(level=logging.INFO)
+    try:
+        asyncio.run(_main())
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,148 @@
+# Popular dishes: per-restaurant and global top-N menu items over sliding windows
+#
+# Each window is a ring of time buckets plus running totals. Recording an order item
+# adds its quantity to the current bucket and to the totals; when a bucket falls out
+# of the window its counts are subtracted again. Reads never touch order_items, they
+# take the top N straight from the totals with a heap.
+#
+# The counters live in each process. When several worker processes serve the API, each
+# only records the orders it handled, so every LEADERBOARD_SYNC_SECONDS they rebuild
+# their counters from the database (see sync_forever).
+import asyncio
+import heapq
+import logging
+import os
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from database import run_in_session
+from models import Order, OrderItem
+
+logger = logging.getLogger(__name__)
+
+# Seconds between rebuilds from the database; 0 (single process) disables them
+LEADERBOARD_SYNC_SECONDS = int(os.getenv("LEADERBOARD_SYNC_SECONDS", "0"))
+
+Key = Tuple[int, int]  # (restaurant_id, menu_item_id)
+
+
+class SlidingWindowCounter:
+    def __init__(self, bucket_seconds: int, num_buckets: int) -> None:
+        self.bucket_seconds = bucket_seconds
+        self.num_buckets = num_buckets
+        self.buckets: Dict[int, Counter] = {}
+        self.totals: Counter = Counter()
+        self.by_restaurant: Dict[int, Counter] = defaultdict(Counter)
+
+    def _expire(self, current_bucket: int) -> None:
+        oldest_kept = current_bucket - self.num_buckets + 1
+        for bucket_id in [b for b in self.buckets if b < oldest_kept]:
+            for key, quantity in self.buckets.pop(bucket_id).items():
+                self._bump(key, -quantity)
+
+    def _bump(self, key: Key, quantity: int) -> None:
+        restaurant_id, menu_item_id = key
+        self.totals[key] += quantity
+        self.by_restaurant[restaurant_id][menu_item_id] += quantity
+        if self.totals[key] <= 0:
+            del self.totals[key]
+            del self.by_restaurant[restaurant_id][menu_item_id]
+            if not self.by_restaurant[restaurant_id]:
+                del self.by_restaurant[restaurant_id]
+
+    def add(self, key: Key, quantity: int, ts: float) -> None:
+        current_bucket = int(time.time() // self.bucket_seconds)
+        self._expire(current_bucket)
+        bucket_id = int(ts // self.bucket_seconds)
+        if bucket_id < current_bucket - self.num_buckets + 1:
+            return  # already outside the window
+        self.buckets.setdefault(bucket_id, Counter())[key] += quantity
+        self._bump(key, quantity)
+
+    def top(self, n: int, restaurant_id: Optional[int] = None) -> List[Tuple[Key, int]]:
+        self._expire(int(time.time() // self.bucket_seconds))
+        if restaurant_id is None:
+            return heapq.nlargest(n, self.totals.items(), key=lambda kv: kv[1])
+        counts = self.by_restaurant.get(restaurant_id, {})
+        best = heapq.nlargest(n, counts.items(), key=lambda kv: kv[1])
+        return [((restaurant_id, item_id), quantity) for item_id, quantity in best]
+
+
+# Supported windows: 1h in minute buckets, 24h and 7d in hour buckets
+def _new_windows() -> Dict[str, SlidingWindowCounter]:
+    return {
+        "1h": SlidingWindowCounter(60, 60),
+        "24h": SlidingWindowCounter(3600, 24),
+        "7d": SlidingWindowCounter(3600, 24 * 7),
+    }
+
+
+WINDOWS: Dict[str, SlidingWindowCounter] = _new_windows()
+# Query parameter pattern accepting the window names
+WINDOW_PATTERN = f"^({'|'.join(WINDOWS)})$"
+
+
+# Count `quantity` units of a menu item ordered at `ts` (epoch seconds, default now).
+# Negative quantities undo earlier counts (e.g. an item removed from an order); pass
+# the order's time, so they land in the same bucket as the counts they undo.
+def record(
+    restaurant_id: int, menu_item_id: int, quantity: int, ts: Optional[float] = None,
+    windows: Optional[Dict[str, SlidingWindowCounter]] = None
+) -> None:
+    ts = time.time() if ts is None else ts
+    for window in (WINDOWS if windows is None else windows).values():
+        window.add((restaurant_id, menu_item_id), quantity, ts)
+
+
+# Epoch seconds of an order's order_date (stored as naive UTC)
+def order_ts(order_date: datetime) -> float:
+    return order_date.replace(tzinfo=timezone.utc).timestamp() if order_date.tzinfo is None else order_date.timestamp()
+
+
+# Top-N (menu_item_id, restaurant_id, quantity) for a window, globally or for one restaurant
+def top_items(window: str, n: int = 10, restaurant_id: Optional[int] = None) -> List[dict]:
+    return [
+        {"menu_item_id": item_id, "restaurant_id": rid, "quantity": quantity}
+        for (rid, item_id), quantity in WINDOWS[window].top(n, restaurant_id)
+    ]
+
+
+# Rebuild the in-memory counters from the last 7 days of orders (run at startup)
+async def load_recent(db: AsyncSession, windows: Optional[Dict[str, SlidingWindowCounter]] = None) -> int:
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=7)
+    result = await db.stream(
+        select(Order.restaurant_id, OrderItem.menu_item_id, OrderItem.quantity, Order.order_date)
+        .join(OrderItem, OrderItem.order_id == Order.id)
+        .where(Order.order_date >= since)
+        .order_by(Order.order_date)
+        .execution_options(yield_per=1000)
+    )
+    loaded = 0
+    async for restaurant_id, menu_item_id, quantity, order_date in result:
+        record(restaurant_id, menu_item_id, quantity, order_ts(order_date), windows)
+        loaded += 1
+    return loaded
+
+
+# Replace the counters with a fresh load, built off to the side so reads never see a
+# half-loaded leaderboard
+async def reload(db: AsyncSession) -> int:
+    fresh = _new_windows()
+    loaded = await load_recent(db, fresh)
+    WINDOWS.update(fresh)
+    return loaded
+
+
+# Background task: pick up the orders other worker processes recorded
+async def sync_forever(interval: int = LEADERBOARD_SYNC_SECONDS) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await run_in_session(reload)
+        except Exception:
+            logger.warning("Leaderboard sync failed", exc_info=True)
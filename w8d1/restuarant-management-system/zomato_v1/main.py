@@ -1,41 +1,149 @@
 # Main FastAPI app entry point
-from fastapi import FastAPI
-from models import Base
-from database import engine
+import time
+_IMPORT_STARTED = time.perf_counter()
+
+import logging
+import os
+from contextlib import contextmanager
+from typing import Dict
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from sqlalchemy.orm.exc import StaleDataError
+from database import engine, run_in_session
+import migrations
+import leaderboard
+import email_index
+import eta
+import jobs
+import metrics
+import warmup
 from routes import (
     restaurant_router,
     menu_router,
     order_router,
     customer_router,
-    review_router
+    review_router,
+    job_router
 )
 import asyncio
 from fastapi_cache import FastAPICache
-from fastapi_cache.backends.redis import RedisBackend
-from redis import asyncio as aioredis
+from serializers import FastJSONResponse
+from compression import CompressionMiddleware
+
+logger = logging.getLogger(__name__)
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379")
+# CACHE_ENABLED=0 serves everything from the database (e.g. to measure the uncached path)
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "1") != "0"
+
+# Startup profile (milliseconds): importing the app, then each startup phase. Reported
+# by GET /ready; benchmarks/bench_startup.py tracks it together with per-module imports.
+STARTUP_PROFILE: Dict[str, float] = {"imports_ms": round((time.perf_counter() - _IMPORT_STARTED) * 1000, 1)}
+
+@contextmanager
+def _phase(name: str):
+    started = time.perf_counter()
+    yield
+    STARTUP_PROFILE[f"{name}_ms"] = round((time.perf_counter() - started) * 1000, 1)
 
 app = FastAPI(
     title="Zomato V1 - Restaurant Management System",
     description="API for managing restaurants, orders, customers, and reviews.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=FastJSONResponse
 )
 
+# gzip/brotli for bodies above compression.MINIMUM_SIZE
+app.add_middleware(CompressionMiddleware)
+# Per-route latency, status and in-flight metrics (added last: outermost, so the time
+# includes compression); served by GET /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+metrics.instrument_pool(engine)
+
+# A row changed between loading it and flushing it (ORM version_id_col check): the
+# client's copy is outdated, same as an If-Match mismatch
+@app.exception_handler(StaleDataError)
+async def stale_data_handler(request: Request, exc: StaleDataError):
+    return JSONResponse({"detail": "Modified concurrently; reload and retry"}, status_code=409)
+
 # Include all route modules
 app.include_router(restaurant_router)
 app.include_router(menu_router)
 app.include_router(order_router)
 app.include_router(customer_router)
 app.include_router(review_router)
+app.include_router(job_router)
 
-# Create database tables on startup
+# Check the schema and prepare caches on startup
 @app.on_event("startup")
 async def on_startup():
-    # Create tables if they don't exist
-    redis = aioredis.from_url("redis://localhost:6379")
-    FastAPICache.init(RedisBackend(redis), prefix="fastapi-cache")
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
+    started = time.perf_counter()
+    with _phase("cache_init"):
+        # The Redis client is only imported once the app actually starts serving
+        from fastapi_cache.backends.redis import RedisBackend
+        from redis import asyncio as aioredis
+        FastAPICache.init(RedisBackend(aioredis.from_url(REDIS_URL)), prefix="fastapi-cache", enable=CACHE_ENABLED)
+    with _phase("schema_check"):
+        # One version lookup instead of create_all; applies pending migrations if any
+        await migrations.check(engine)
+    with _phase("leaderboard"):
+        # Rebuild the popular-dishes counters from the last week of orders
+        await run_in_session(leaderboard.load_recent)
+        if leaderboard.LEADERBOARD_SYNC_SECONDS > 0:
+            app.state.leaderboard_sync = asyncio.create_task(leaderboard.sync_forever())
+    with _phase("email_filter"):
+        # Registered emails, for availability checks without a query (see email_index.py)
+        await run_in_session(email_index.load)
+        if email_index.EMAIL_FILTER_SYNC_SECONDS > 0:
+            app.state.email_filter_sync = asyncio.create_task(email_index.sync_forever())
+    with _phase("eta"):
+        # Delivery time averages from the last checkpoint (see eta.py)
+        await run_in_session(eta.load)
+        if eta.ETA_CHECKPOINT_SECONDS > 0:
+            app.state.eta_checkpoint = asyncio.create_task(eta.checkpoint_forever())
+    with _phase("warmup"):
+        # Fill the hottest cache entries before taking traffic (see warmup.py)
+        await warmup.warm_cache()
+    with _phase("metrics"):
+        # Publish this worker's metrics for the others' /metrics (see metrics.py)
+        if metrics.METRICS_DIR:
+            app.state.metrics_flush = asyncio.create_task(metrics.flush_forever())
+    with _phase("jobs"):
+        # Background job workers (JOB_WORKERS=0 when they run as a separate process)
+        await jobs.start_pool()
+    STARTUP_PROFILE["startup_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"Startup profile: {STARTUP_PROFILE}")
 
+# Let running jobs finish before the process exits
+@app.on_event("shutdown")
+async def on_shutdown():
+    for task in ("leaderboard_sync", "email_filter_sync", "eta_checkpoint", "metrics_flush"):
+        if getattr(app.state, task, None) is not None:
+            getattr(app.state, task).cancel()
+    try:
+        await run_in_session(eta.checkpoint)
+    except Exception:
+        logger.warning("Final ETA checkpoint failed", exc_info=True)
+    if metrics.METRICS_DIR:
+        # This worker's final counts stay in the aggregate after it exits
+        metrics.flush_now()
+    await jobs.stop_pool()
+
+
+@app.get("/ready")
+async def readiness():
+    """
+    Readiness probe: 200 once the startup cache warmup has finished, 503 before.
+    """
+    state = dict(warmup.STATE, startup=STARTUP_PROFILE)
+    return JSONResponse(state, status_code=200 if state["status"] == "ready" else 503)
+
+@app.get("/metrics", include_in_schema=False)
+async def prometheus_metrics():
+    """
+    Request latency, status and in-flight metrics of all workers, in the Prometheus text format.
+    """
+    return PlainTextResponse(metrics.render(), media_type=metrics.CONTENT_TYPE)
 
 @app.get("/cache/stats") 
 async def cache_stats():
@@ -58,6 +166,8 @@ async def clear_cache():
     redis = FastAPICache.get_backend().redis
     print(redis)
     await redis.flushdb()
+    # Re-warm in the background; /ready reports "warming" until it is done
+    asyncio.create_task(warmup.warm_cache())
     return {
         "message": "Cache cleared successfully."
     }
\ No newline at end of file
@@ -0,0 +1,92 @@
+# Parsing for full-menu imports (JSON document or streamed CSV) used by PUT /restaurants/{id}/menu
+import codecs
+import csv
+import json
+from typing import AsyncIterator, Dict, List
+
+from fastapi import HTTPException, Request
+from pydantic import ValidationError
+
+from schemas import MenuItemCreate
+
+CSV_MEDIA_TYPES = ("text/csv", "application/csv")
+
+
+# Validate one raw row; empty CSV cells fall back to the schema defaults
+def _to_item(raw: Dict[str, object], row_number: int) -> MenuItemCreate:
+    if not isinstance(raw, dict):
+        raise HTTPException(status_code=422, detail={"row": row_number, "errors": "Expected an object"})
+    cleaned = {key.strip(): value for key, value in raw.items() if key and value not in ("", None)}
+    try:
+        return MenuItemCreate(**cleaned)
+    except ValidationError as exc:
+        raise HTTPException(status_code=422, detail={"row": row_number, "errors": exc.errors()})
+
+
+# Split a byte stream into complete CSV records as chunks arrive. A record ends at a
+# newline outside quotes (an even number of '"' so far, since escaped quotes come in pairs).
+async def _csv_records(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    pending = ""
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        start = 0
+        quotes = 0
+        for index, char in enumerate(pending):
+            if char == '"':
+                quotes += 1
+            elif char == "\n" and quotes % 2 == 0:
+                yield pending[start:index + 1]
+                start = index + 1
+                quotes = 0
+        pending = pending[start:]
+    pending += decoder.decode(b"", final=True)
+    if pending.strip():
+        yield pending
+
+
+# Parse a CSV upload (header row + one menu item per row) without buffering the whole body
+async def parse_menu_csv(chunks: AsyncIterator[bytes]) -> List[MenuItemCreate]:
+    items = []
+    header = None
+    row_number = 0
+    async for record in _csv_records(chunks):
+        if not record.strip():
+            continue
+        values = next(csv.reader([record]))
+        if header is None:
+            header = values
+            continue
+        row_number += 1
+        items.append(_to_item(dict(zip(header, values)), row_number))
+    if header is None:
+        raise HTTPException(status_code=422, detail="CSV upload is empty")
+    return items
+
+
+# Parse a JSON menu document: {"items": [...]} or a bare list of menu items
+def parse_menu_json(body: bytes) -> List[MenuItemCreate]:
+    try:
+        document = json.loads(body or b"null")
+    except ValueError:
+        raise HTTPException(status_code=422, detail="Request body is not valid JSON")
+    rows = document.get("items") if isinstance(document, dict) else document
+    if not isinstance(rows, list):
+        raise HTTPException(status_code=422, detail="Expected a list of menu items or {\"items\": [...]}")
+    return [_to_item(row, number) for number, row in enumerate(rows, start=1)]
+
+
+# Read the request body in whichever format the client sent
+async def read_menu_upload(request: Request) -> List[MenuItemCreate]:
+    content_type = request.headers.get("content-type", "").split(";")[0].strip().lower()
+    if content_type in CSV_MEDIA_TYPES:
+        items = await parse_menu_csv(request.stream())
+    else:
+        items = parse_menu_json(await request.body())
+
+    seen = set()
+    for item in items:
+        if item.name in seen:
+            raise HTTPException(status_code=422, detail=f"Duplicate menu item name: {item.name}")
+        seen.add(item.name)
+    return items
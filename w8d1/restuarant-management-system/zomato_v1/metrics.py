@@ -0,0 +1,266 @@
+# Request metrics in the Prometheus text format (GET /metrics)
+#
+#   http_request_duration_seconds   histogram per method and route template
+#                                   (/restaurants/{restaurant_id}, not /restaurants/7)
+#   http_requests_total             counter per method, route template and status code
+#   http_requests_in_flight         gauge, requests being handled right now
+#   db_pool_wait_seconds            histogram of the time to get a pooled connection
+#                                   (waiting for a free one, or opening a new one)
+#
+# Requests that match no route are counted under route="<unmatched>", so scanners
+# probing random paths can't blow up the number of series.
+#
+# Each worker process counts in plain dicts and lists. Everything is updated from the
+# event loop thread (the pool wait too: the async pool runs its checkout in the loop's
+# greenlet), so no locks are needed.
+#
+# Across processes: with METRICS_DIR set (gunicorn_conf.py does it for several workers)
+# every worker writes its snapshot to METRICS_DIR/worker-<pid>.json every
+# METRICS_FLUSH_SECONDS, and /metrics, on whichever worker serves it, adds the others'
+# latest snapshots to its own live numbers. Counters of exited workers keep counting
+# (a restarted worker must not make a counter go down); their in-flight gauge doesn't.
+# Other workers' numbers lag by up to METRICS_FLUSH_SECONDS.
+import asyncio
+import glob
+import json
+import logging
+import os
+import time
+from collections import defaultdict
+from typing import Dict, List, Tuple
+
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger(__name__)
+
+# Shared snapshot directory; unset for a single process
+METRICS_DIR = os.getenv("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = float(os.getenv("METRICS_FLUSH_SECONDS", "5"))
+# Histogram upper bounds (seconds); +Inf is implied
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+POOL_WAIT_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0)
+UNMATCHED = "<unmatched>"
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+
+class Histogram:
+    __slots__ = ("buckets", "counts", "sum")
+
+    def __init__(self, buckets: Tuple[float, ...]) -> None:
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # per bucket (not cumulative), last is +Inf
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            i = len(self.buckets)
+        self.counts[i] += 1
+        self.sum += value
+
+
+# This worker's numbers
+LATENCY: Dict[Tuple[str, str], Histogram] = {}  # (method, route) -> histogram
+REQUESTS: Dict[Tuple[str, str, str], int] = defaultdict(int)  # (method, route, status) -> count
+POOL_WAIT = Histogram(POOL_WAIT_BUCKETS)
+in_flight = 0
+
+
+def observe_request(method: str, route: str, status: int, seconds: float) -> None:
+    histogram = LATENCY.get((method, route))
+    if histogram is None:
+        histogram = LATENCY[(method, route)] = Histogram(LATENCY_BUCKETS)
+    histogram.observe(seconds)
+    REQUESTS[(method, route, str(status))] += 1
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        global in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        status = 500  # unless a response starts
+
+        async def send_with_status(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        in_flight += 1
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            in_flight -= 1
+            # The router stores the matched route in the (shared) scope
+            route = getattr(scope.get("route"), "path", UNMATCHED)
+            observe_request(scope["method"], route, status, time.perf_counter() - started)
+
+
+# Time every connection checkout of `engine`'s pool. The pool's class is swapped for a
+# subclass, which pool.recreate() (engine.dispose()) keeps.
+def instrument_pool(engine) -> None:
+    pool = engine.sync_engine.pool
+    base = type(pool)
+    if getattr(base, "_timed", False):
+        return
+
+    def connect(self):
+        started = time.perf_counter()
+        try:
+            return base.connect(self)
+        finally:
+            POOL_WAIT.observe(time.perf_counter() - started)
+
+    pool.__class__ = type(f"Timed{base.__name__}", (base,), {"connect": connect, "_timed": True})
+
+
+# --- Snapshots and aggregation ---
+
+def _histogram_state(histogram: Histogram) -> dict:
+    return {"counts": list(histogram.counts), "sum": histogram.sum}
+
+
+def snapshot() -> dict:
+    return {
+        "pid": os.getpid(),
+        "latency": [[method, route, _histogram_state(h)] for (method, route), h in LATENCY.items()],
+        "requests": [[*key, count] for key, count in REQUESTS.items()],
+        "pool_wait": _histogram_state(POOL_WAIT),
+        "in_flight": in_flight,
+    }
+
+
+def _path(pid: int) -> str:
+    return os.path.join(METRICS_DIR, f"worker-{pid}.json")
+
+
+def _write(state: dict) -> None:
+    tmp = _path(state["pid"]) + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, _path(state["pid"]))  # readers never see a half-written file
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+
+# The other workers' latest snapshots
+def _peer_snapshots() -> List[dict]:
+    states = []
+    for path in glob.glob(os.path.join(METRICS_DIR, "worker-*.json")):
+        try:
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):  # removed or replaced meanwhile
+            continue
+        if state["pid"] != os.getpid():
+            states.append(state)
+    return states
+
+
+def _add_histogram(into: dict, state: dict) -> None:
+    into["counts"] = [a + b for a, b in zip(into["counts"], state["counts"])] if into else list(state["counts"])
+    into["sum"] = into.get("sum", 0.0) + state["sum"]
+
+
+# This worker's live numbers plus the other workers' snapshots
+def aggregate() -> dict:
+    states = [snapshot()]
+    if METRICS_DIR:
+        states += _peer_snapshots()
+    latency: Dict[Tuple[str, str], dict] = defaultdict(dict)
+    requests: Dict[Tuple[str, str, str], int] = defaultdict(int)
+    pool_wait: dict = {}
+    total_in_flight = 0
+    for i, state in enumerate(states):
+        for method, route, histogram in state["latency"]:
+            _add_histogram(latency[(method, route)], histogram)
+        for method, route, status, count in state["requests"]:
+            requests[(method, route, status)] += count
+        _add_histogram(pool_wait, state["pool_wait"])
+        if i == 0 or _alive(state["pid"]):
+            total_in_flight += state["in_flight"]
+    return {"latency": latency, "requests": requests, "pool_wait": pool_wait, "in_flight": total_in_flight}
+
+
+# --- Exposition ---
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items())
+
+
+def _histogram_lines(name: str, buckets: Tuple[float, ...], state: dict, labels: str = "") -> List[str]:
+    sep = "," if labels else ""
+    lines, cumulative = [], 0
+    for bound, count in zip((*map(repr, buckets), "+Inf"), state["counts"]):
+        cumulative += count
+        lines.append(f'{name}_bucket{{{labels}{sep}le="{bound}"}} {cumulative}')
+    lines.append(f"{name}_sum{{{labels}}} {state['sum']}" if labels else f"{name}_sum {state['sum']}")
+    lines.append(f"{name}_count{{{labels}}} {cumulative}" if labels else f"{name}_count {cumulative}")
+    return lines
+
+
+def render() -> str:
+    totals = aggregate()
+    lines = [
+        "# HELP http_request_duration_seconds Request latency by route template",
+        "# TYPE http_request_duration_seconds histogram",
+    ]
+    for (method, route), state in sorted(totals["latency"].items()):
+        lines += _histogram_lines(
+            "http_request_duration_seconds", LATENCY_BUCKETS, state, _labels(method=method, route=route)
+        )
+    lines += [
+        "# HELP http_requests_total Requests by route template and status code",
+        "# TYPE http_requests_total counter",
+    ]
+    for (method, route, status), count in sorted(totals["requests"].items()):
+        lines.append(f"http_requests_total{{{_labels(method=method, route=route, status=status)}}} {count}")
+    lines += [
+        "# HELP http_requests_in_flight Requests being handled",
+        "# TYPE http_requests_in_flight gauge",
+        f"http_requests_in_flight {totals['in_flight']}",
+        "# HELP db_pool_wait_seconds Time to check out a database connection",
+        "# TYPE db_pool_wait_seconds histogram",
+        *_histogram_lines("db_pool_wait_seconds", POOL_WAIT_BUCKETS, totals["pool_wait"]),
+    ]
+    return "\n".join(lines) + "\n"
+
+
+# Publish this worker's snapshot for the others (also on shutdown)
+def flush_now() -> None:
+    try:
+        os.makedirs(METRICS_DIR, exist_ok=True)
+        _write(snapshot())
+    except OSError:
+        logger.warning("Metrics flush failed", exc_info=True)
+
+
+# Background task: flush_now every `interval` seconds, off the event loop
+async def flush_forever(interval: float = METRICS_FLUSH_SECONDS) -> None:
+    os.makedirs(METRICS_DIR, exist_ok=True)
+    while True:
+        try:
+            await asyncio.to_thread(_write, snapshot())
+        except Exception:
+            logger.warning("Metrics flush failed", exc_info=True)
+        await asyncio.sleep(interval)
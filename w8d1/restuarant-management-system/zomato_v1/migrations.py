@@ -0,0 +1,188 @@
+# Schema migrations
+#
+# schema_version records which migration the database is at. On startup the app only
+# reads that one row and compares it with LATEST (check), instead of inspecting every
+# table with create_all. Pending migrations run in order, each in its own transaction.
+#
+#   fresh database      create_all from the current models, stamped LATEST
+#   pre-migration DB    (tables exist, no schema_version) create_all for any missing
+#                       tables, stamped 1, then the later migrations
+#
+# So a migration after the baseline only has to bring an *existing* database up to the
+# current models (ALTER TABLE, backfills...). Add it to MIGRATIONS with the next number.
+#
+# upgrade holds a cross-process lock (a lock file next to the SQLite database, an
+# advisory lock on Postgres), so several workers starting at once on an outdated or
+# empty database migrate it exactly once; the others wait and then find it current.
+#
+#   python migrations.py upgrade     apply pending migrations
+#   python migrations.py current     print the database's version
+import asyncio
+import fcntl
+import logging
+import os
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, List, Tuple
+
+from sqlalchemy import delete, inspect, insert, select, text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+
+from models import Base, EtaStat, SchemaVersion
+
+logger = logging.getLogger(__name__)
+
+# Apply pending migrations at startup (set MIGRATE_ON_STARTUP=0 to require a manual upgrade)
+MIGRATE_ON_STARTUP = os.getenv("MIGRATE_ON_STARTUP", "1") != "0"
+
+
+async def _baseline(conn: AsyncConnection) -> None:
+    await conn.run_sync(Base.metadata.create_all)
+
+
+# Optimistic concurrency: a version counter on every row that can be edited concurrently
+async def _add_version_columns(conn: AsyncConnection) -> None:
+    for table in ("restaurants", "menu_items", "orders", "customers"):
+        columns = await conn.run_sync(lambda sync: {c["name"] for c in inspect(sync).get_columns(table)})
+        if "version" not in columns:
+            await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN version INTEGER NOT NULL DEFAULT 1"))
+
+
+# Store emails normalized (see email_index), so the unique index is case-insensitive.
+# Fails if two customers' emails differ only in case: merge those accounts first.
+async def _normalize_emails(conn: AsyncConnection) -> None:
+    await conn.execute(text("UPDATE customers SET email = lower(trim(email)) WHERE email != lower(trim(email))"))
+
+
+# Soft delete for restaurants (see crud.delete_restaurant)
+async def _add_restaurant_deleted_at(conn: AsyncConnection) -> None:
+    columns = await conn.run_sync(lambda sync: {c["name"] for c in inspect(sync).get_columns("restaurants")})
+    if "deleted_at" not in columns:
+        await conn.execute(text("ALTER TABLE restaurants ADD COLUMN deleted_at TIMESTAMP"))
+    await conn.execute(text("CREATE INDEX IF NOT EXISTS ix_restaurants_deleted_at ON restaurants (deleted_at)"))
+
+
+# Delivery time estimates (see eta.py)
+async def _add_eta(conn: AsyncConnection) -> None:
+    columns = await conn.run_sync(lambda sync: {c["name"] for c in inspect(sync).get_columns("orders")})
+    for column in ("dispatched_at", "estimated_delivery_time"):
+        if column not in columns:
+            await conn.execute(text(f"ALTER TABLE orders ADD COLUMN {column} TIMESTAMP"))
+    await conn.run_sync(lambda sync: EtaStat.__table__.create(sync, checkfirst=True))
+
+
+
+# Job owner and heartbeat, so only jobs of dead workers are requeued (see jobs.requeue_stale)
+async def _add_job_owner(conn: AsyncConnection) -> None:
+    columns = await conn.run_sync(lambda sync: {c["name"] for c in inspect(sync).get_columns("jobs")})
+    if "worker" not in columns:
+        await conn.execute(text("ALTER TABLE jobs ADD COLUMN worker VARCHAR(100)"))
+    if "heartbeat_at" not in columns:
+        await conn.execute(text("ALTER TABLE jobs ADD COLUMN heartbeat_at TIMESTAMP"))
+
+
+MIGRATIONS: List[Tuple[int, str, Callable[[AsyncConnection], Awaitable[None]]]] = [
+    (1, "baseline: all tables as of the first versioned release", _baseline),
+    (2, "version columns for optimistic concurrency", _add_version_columns),
+    (3, "normalized (trimmed, lowercased) customer emails", _normalize_emails),
+    (4, "restaurants.deleted_at for soft delete", _add_restaurant_deleted_at),
+    (5, "order phase timestamps and eta_stats", _add_eta),
+    (6, "jobs.worker and jobs.heartbeat_at", _add_job_owner),
+]
+LATEST = MIGRATIONS[-1][0]
+
+
+async def _set_version(conn: AsyncConnection, version: int) -> None:
+    await conn.execute(delete(SchemaVersion))
+    await conn.execute(insert(SchemaVersion).values(version=version))
+
+
+# The database's schema version; 0 when it predates versioning (or is empty)
+async def current_version(conn: AsyncConnection) -> int:
+    try:
+        return (await conn.execute(select(SchemaVersion.version))).scalar() or 0
+    except DBAPIError:  # no schema_version table yet
+        await conn.rollback()
+        return 0
+
+
+# Serialize upgrades across processes for the lifetime of `conn`'s migration run
+@asynccontextmanager
+async def _migration_lock(conn: AsyncConnection):
+    if conn.dialect.name == "postgresql":
+        await conn.execute(text("SELECT pg_advisory_lock(hashtext('zomato_migrations'))"))
+        await conn.commit()
+        try:
+            yield
+        finally:
+            await conn.execute(text("SELECT pg_advisory_unlock(hashtext('zomato_migrations'))"))
+            await conn.commit()
+        return
+    database = conn.engine.url.database
+    if conn.dialect.name != "sqlite" or not database or database == ":memory:":
+        yield
+        return
+    with open(f"{database}.migrate.lock", "w") as lock_file:
+        await asyncio.to_thread(fcntl.flock, lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+# Bring the database up to LATEST; returns the version it ends at
+async def upgrade(engine: AsyncEngine) -> int:
+    async with engine.connect() as conn, _migration_lock(conn):
+        # Read under the lock: another process may have just migrated
+        version = await current_version(conn)
+        await conn.rollback()  # end the read so each migration gets its own transaction
+        if version == 0:
+            existing = await conn.run_sync(lambda sync_conn: inspect(sync_conn).has_table("restaurants"))
+            await conn.rollback()
+            async with conn.begin():
+                await _baseline(conn)
+                version = 1 if existing else LATEST
+                await _set_version(conn, version)
+            logger.info(f"Database {'stamped at baseline' if existing else 'created'} (schema version {version})")
+        for number, description, migrate in MIGRATIONS:
+            if number <= version:
+                continue
+            async with conn.begin():
+                await migrate(conn)
+                await _set_version(conn, number)
+            logger.info(f"Applied migration {number}: {description}")
+            version = number
+    return version
+
+
+# Startup check: one query when the schema is current. Runs pending migrations when
+# MIGRATE_ON_STARTUP is set, otherwise refuses to start against an outdated schema.
+async def check(engine: AsyncEngine, auto_upgrade: bool = MIGRATE_ON_STARTUP) -> int:
+    async with engine.connect() as conn:
+        version = await current_version(conn)
+    if version == LATEST:
+        return version
+    if version > LATEST:
+        raise RuntimeError(f"Database schema version {version} is newer than this code ({LATEST})")
+    if not auto_upgrade:
+        raise RuntimeError(
+            f"Database schema version {version} is behind {LATEST}; run `python migrations.py upgrade`"
+        )
+    return await upgrade(engine)
+
+
+if __name__ == "__main__":
+    import sys
+    from database import engine
+
+    async def _main(command: str) -> None:
+        if command == "upgrade":
+            print(f"Schema version {await upgrade(engine)}")
+        else:
+            async with engine.connect() as conn:
+                print(f"Schema version {await current_version(conn)} (latest {LATEST})")
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("upgrade", "current"):
+        sys.exit("usage: python migrations.py upgrade|current")
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(sys.argv[1]))
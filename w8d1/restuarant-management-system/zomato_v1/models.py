@@ -1,7 +1,7 @@
 
 # Import necessary modules from SQLAlchemy and other libraries
-from sqlalchemy import Column, Integer, String, Float, Boolean, Time, DateTime, func, ForeignKey, Numeric
-from sqlalchemy.orm import relationship, declarative_base
+from sqlalchemy import Column, Integer, String, Float, Boolean, Time, DateTime, func, ForeignKey, Numeric, JSON, Index, PrimaryKeyConstraint, event, select
+from sqlalchemy.orm import relationship, declarative_base, Session, with_loader_criteria
 
 # Create a base class for declarative class definitions
 Base = declarative_base()
@@ -22,14 +22,42 @@ class Restaurant(Base):
     closing_time = Column(Time, nullable=False)  # Closing time, required
     created_at = Column(DateTime(timezone=True), server_default=func.now())  # Timestamp of creation
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())  # Timestamp of last update
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped on every update (optimistic concurrency)
+    deleted_at = Column(DateTime(timezone=True), nullable=True, index=True)  # Soft delete; purged later (see crud.purge_restaurant)
 
-    # Relationship: One restaurant has many menu items
+    __mapper_args__ = {"version_id_col": version}
+
+    # Relationship: One restaurant has many menu items (removed by the database's
+    # ON DELETE CASCADE, never loaded just to be deleted)
     menu_items = relationship(
         "MenuItem",
         back_populates="restaurant",
-        cascade="all, delete-orphan"
+        cascade="all, delete-orphan",
+        passive_deletes=True
     )
 
+# Soft-deleted restaurants, and their menu items until the purge removes them, are
+# invisible to every ORM query (selects, and bulk UPDATE/DELETE) unless it opts in with
+# .execution_options(include_deleted=True)
+@event.listens_for(Session, "do_orm_execute")
+def _hide_deleted_restaurants(state):
+    if (
+        (state.is_select or state.is_update or state.is_delete)
+        and not state.is_column_load and not state.is_relationship_load
+        and not state.execution_options.get("include_deleted", False)
+    ):
+        state.statement = state.statement.options(
+            with_loader_criteria(Restaurant, Restaurant.deleted_at.is_(None), include_aliases=True),
+            with_loader_criteria(
+                MenuItem,
+                lambda cls: select(Restaurant.id)
+                .where(Restaurant.id == cls.restaurant_id, Restaurant.deleted_at.is_(None))
+                .correlate_except(Restaurant)  # the outer query may join restaurants too
+                .exists(),
+                include_aliases=True,
+            ),
+        )
+
 # Define the MenuItem model/table
 class MenuItem(Base):
     __tablename__ = "menu_items"  # Table name in the database
@@ -46,6 +74,9 @@ class MenuItem(Base):
     restaurant_id = Column(Integer, ForeignKey("restaurants.id", ondelete="CASCADE"), nullable=False)  # FK to Restaurant
     created_at = Column(DateTime(timezone=True), server_default=func.now())  # Timestamp of creation
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())  # Timestamp of last update
+    version = Column(Integer, nullable=False, default=1, server_default="1")  # Bumped on every update (optimistic concurrency)
+
+    __mapper_args__ = {"version_id_col": version}
 
     # Relationship: Each menu item belongs to a restaurant
     restaurant = relationship("Restaurant", back_populates="menu_items")
@@ -62,6 +93,9 @@ class Customer(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     # Relationships
     orders = relationship("Order", back_populates="customer", cascade="all, delete-orphan")
@@ -80,6 +114,11 @@ class Order(Base):
     special_instructions = Column(String, nullable=True)
     order_date = Column(DateTime(timezone=True), server_default=func.now())
     delivery_time = Column(DateTime(timezone=True), nullable=True)
+    dispatched_at = Column(DateTime(timezone=True), nullable=True)  # Set on the move to out_for_delivery
+    estimated_delivery_time = Column(DateTime(timezone=True), nullable=True)  # Predicted when placed (eta.py)
+    version = Column(Integer, nullable=False, default=1, server_default="1")
+
+    __mapper_args__ = {"version_id_col": version}
 
     # Relationships
     customer = relationship("Customer", back_populates="orders")
@@ -118,3 +157,132 @@ class Review(Base):
     customer = relationship("Customer", back_populates="reviews")
     restaurant = relationship("Restaurant")
     order = relationship("Order", back_populates="review")
+
+# --- Order archive (cold storage) ---
+# Delivered orders older than the retention window are moved here by crud.archive_orders
+# (POST /orders/archive, or the archive_orders job) so the hot orders/order_items tables
+# stay small. Ids are kept, so reviews and clients can still refer to an archived order.
+# Line items are stored inline as JSON: archived orders are read whole and never
+# updated, so one compact row per order is enough.
+class ArchivedOrder(Base):
+    __tablename__ = "orders_archive"
+
+    id = Column(Integer, primary_key=True)  # Same id the order had in the hot table
+    customer_id = Column(Integer, nullable=False, index=True)
+    restaurant_id = Column(Integer, nullable=False, index=True)
+    order_status = Column(String(30), nullable=False)
+    total_amount = Column(Numeric(10, 2), nullable=False)
+    delivery_address = Column(String(255), nullable=False)
+    special_instructions = Column(String, nullable=True)
+    order_date = Column(DateTime(timezone=True), nullable=False)
+    delivery_time = Column(DateTime(timezone=True), nullable=True)
+    order_items = Column(JSON, nullable=False, default=list)  # [{id, menu_item_id, quantity, item_price, special_requests}]
+    archived_at = Column(DateTime(timezone=True), server_default=func.now())
+
+# Lets the archiver find old delivered orders without scanning the hot table
+Index("ix_orders_status_date", Order.order_status, Order.order_date)
+
+# --- Order analytics rollups ---
+# Pre-aggregated order volume and revenue per restaurant and time bucket, kept up to
+# date incrementally by analytics.record_order (see analytics.py)
+class OrderRollup(Base):
+    __tablename__ = "order_rollups"
+    __table_args__ = (PrimaryKeyConstraint("restaurant_id", "granularity", "bucket_start"),)
+
+    restaurant_id = Column(Integer, nullable=False)
+    granularity = Column(String(10), nullable=False)  # "hour" or "day"
+    bucket_start = Column(DateTime, nullable=False)  # Naive UTC start of the bucket
+    order_count = Column(Integer, nullable=False, default=0)
+    revenue = Column(Numeric(12, 2), nullable=False, default=0)
+
+# --- Customer order-history summary ---
+# One compact row per customer backing GET /customers/{id}/summary (recent orders,
+# favourite restaurants, items they keep reordering). Maintained by customer_summary.py:
+# updated in place when an order is placed, dropped and rebuilt lazily on other changes.
+class CustomerSummary(Base):
+    __tablename__ = "customer_summaries"
+
+    customer_id = Column(Integer, primary_key=True)
+    data = Column(JSON, nullable=False)  # {"recent_orders": [...], "restaurants": {...}, "items": {...}}
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+
+# --- Recommendations (see recommendations.py) ---
+# Sparse co-occurrence counts: for kind "item", how many orders contain both menu items;
+# for kind "restaurant", how many customers ordered from both restaurants. The diagonal
+# (entity_id == other_id) holds the entity's own order/customer count.
+class CoOccurrence(Base):
+    __tablename__ = "co_occurrences"
+    __table_args__ = (PrimaryKeyConstraint("kind", "entity_id", "other_id"),)
+
+    kind = Column(String(10), nullable=False)  # "item" or "restaurant"
+    entity_id = Column(Integer, nullable=False)
+    other_id = Column(Integer, nullable=False)
+    count = Column(Integer, nullable=False, default=0)
+
+# Precomputed top-K neighbours per entity, read directly by GET /customers/{id}/recommendations
+class Neighbor(Base):
+    __tablename__ = "recommendation_neighbors"
+    __table_args__ = (PrimaryKeyConstraint("kind", "entity_id", "rank"),)
+
+    kind = Column(String(10), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    rank = Column(Integer, nullable=False)  # 0 = most similar
+    neighbor_id = Column(Integer, nullable=False)
+    score = Column(Float, nullable=False)
+
+# Watermarks for incremental jobs (e.g. the last order id folded into the co-occurrences)
+class JobState(Base):
+    __tablename__ = "job_state"
+
+    name = Column(String(50), primary_key=True)
+    last_order_id = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+
+# --- Background jobs (see jobs.py) ---
+# Persisted job records: submitted through /jobs, picked up by the worker pool in the
+# API process or by a separate `python jobs.py worker` process
+class Job(Base):
+    __tablename__ = "jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    type = Column(String(50), nullable=False)
+    params = Column(JSON, nullable=False, default=dict)
+    status = Column(String(20), nullable=False, default="queued")  # queued, running, succeeded, failed
+    attempts = Column(Integer, nullable=False, default=0)
+    max_attempts = Column(Integer, nullable=False, default=3)
+    run_after = Column(DateTime, nullable=False)  # Naive UTC; retries are pushed back here
+    result = Column(JSON, nullable=True)
+    error = Column(String, nullable=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime, nullable=True)
+    finished_at = Column(DateTime, nullable=True)
+    worker = Column(String(100), nullable=True)  # "host:pid" of the process that claimed it
+    heartbeat_at = Column(DateTime, nullable=True)  # Naive UTC; refreshed while it runs
+
+# Lets workers find the next runnable job without scanning finished ones
+Index("ix_jobs_status_run_after", Job.status, Job.run_after)
+
+# --- Delivery time estimates (see eta.py) ---
+# Checkpoint of the in-memory ETA model: exponentially weighted averages of observed
+# preparation (placed -> out_for_delivery) and delivery (out_for_delivery -> delivered)
+# durations, per restaurant (kind "restaurant"), per menu item ("item") and overall
+# ("global", entity_id 0).
+class EtaStat(Base):
+    __tablename__ = "eta_stats"
+    __table_args__ = (PrimaryKeyConstraint("kind", "entity_id"),)
+
+    kind = Column(String(10), nullable=False)
+    entity_id = Column(Integer, nullable=False)
+    prep_seconds = Column(Float, nullable=True)
+    prep_samples = Column(Integer, nullable=False, default=0)
+    delivery_seconds = Column(Float, nullable=True)
+    delivery_samples = Column(Integer, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
+
+# --- Schema version (see migrations.py) ---
+# Single row holding the migration the database is at; startup only reads this
+class SchemaVersion(Base):
+    __tablename__ = "schema_version"
+
+    version = Column(Integer, primary_key=True)
+    applied_at = Column(DateTime(timezone=True), server_default=func.now())
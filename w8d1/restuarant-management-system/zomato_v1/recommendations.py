@@ -0,0 +1,324 @@
+# Recommendations from order co-occurrence
+#
+# Two sparse co-occurrence matrices are built from the order history:
+#   item        C[i, j] = number of orders containing both menu items i and j
+#   restaurant  C[r, s] = number of customers who ordered from both restaurants r and s
+# The diagonal holds each entity's own count. Similarity is the cosine of the two
+# incidence columns, C[i, j] / sqrt(C[i, i] * C[j, j]), so popular entities don't
+# crowd out everything else. The top-K neighbours per entity are written to
+# recommendation_neighbors; serving a customer (crud.get_customer_recommendations)
+# only reads the neighbours of the few items and restaurants in their summary, i.e.
+# O(K) rows per seed. This module is only imported by the offline jobs (NumPy/SciPy
+# stay out of the API's import path).
+#
+# build()   full rebuild, reading hot and archived orders in id-ordered chunks
+# update()  folds in orders placed since the last run (watermark in job_state) and
+#           recomputes the neighbours of the entities whose counts changed
+#
+#   python recommendations.py build
+#   python recommendations.py update
+import asyncio
+from typing import AsyncIterator, Dict, List, Optional, Tuple
+
+import numpy as np
+from scipy import sparse
+from sqlalchemy import delete, func, insert, select
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from models import ArchivedOrder, CoOccurrence, JobState, Neighbor, Order, OrderItem
+
+KINDS = ("item", "restaurant")
+TOP_K = 20
+CHUNK_SIZE = 10000  # orders per read
+WRITE_BATCH = 5000  # rows per INSERT
+JOB_NAME = "recommendations"
+
+# (order_ids, customer_ids, restaurant_ids) per order, (order_ids, menu_item_ids) per order item
+Chunk = Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+
+
+# --- Reading the order history in chunks ---
+
+async def _hot_chunks(db: AsyncSession, after_id: int, upto_id: int, chunk_size: int) -> AsyncIterator[Chunk]:
+    while True:
+        orders = (await db.execute(
+            select(Order.id, Order.customer_id, Order.restaurant_id)
+            .where(Order.id > after_id, Order.id <= upto_id)
+            .order_by(Order.id)
+            .limit(chunk_size)
+        )).all()
+        if not orders:
+            return
+        items = (await db.execute(
+            select(OrderItem.order_id, OrderItem.menu_item_id)
+            .where(OrderItem.order_id.between(orders[0].id, orders[-1].id))
+        )).all()
+        yield _to_arrays(orders, items)
+        after_id = orders[-1].id
+
+
+async def _archived_chunks(db: AsyncSession, upto_id: int, chunk_size: int) -> AsyncIterator[Chunk]:
+    after_id = 0
+    while True:
+        orders = (await db.execute(
+            select(ArchivedOrder.id, ArchivedOrder.customer_id, ArchivedOrder.restaurant_id, ArchivedOrder.order_items)
+            .where(ArchivedOrder.id > after_id, ArchivedOrder.id <= upto_id)
+            .order_by(ArchivedOrder.id)
+            .limit(chunk_size)
+        )).all()
+        if not orders:
+            return
+        items = [(order.id, item["menu_item_id"]) for order in orders for item in order.order_items or []]
+        yield _to_arrays([order[:3] for order in orders], items)
+        after_id = orders[-1].id
+
+
+def _to_arrays(orders: list, items: list) -> Chunk:
+    order_columns = np.array(orders, dtype=np.int64).reshape(-1, 3)
+    item_columns = np.array(items, dtype=np.int64).reshape(-1, 2)
+    return order_columns[:, 0], order_columns[:, 1], order_columns[:, 2], item_columns[:, 0], item_columns[:, 1]
+
+
+# --- Sparse matrix helpers ---
+
+# Binary incidence matrix (rows x cols) from parallel index arrays; duplicates count once
+def _incidence(rows: np.ndarray, cols: np.ndarray, shape: Tuple[int, int]) -> sparse.csr_matrix:
+    matrix = sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=shape)
+    matrix.data[:] = 1
+    return matrix
+
+
+# a + b for sparse matrices whose shapes may differ (ids grow as the history is read)
+def _add(a: Optional[sparse.csr_matrix], b: sparse.csr_matrix) -> sparse.csr_matrix:
+    if a is None:
+        return b
+    shape = (max(a.shape[0], b.shape[0]), max(a.shape[1], b.shape[1]))
+    a.resize(shape)
+    b.resize(shape)
+    return (a + b).tocsr()
+
+
+# Item-item co-occurrence of the orders in one chunk
+def _item_counts(item_order_ids: np.ndarray, menu_item_ids: np.ndarray) -> Optional[sparse.csr_matrix]:
+    if not len(menu_item_ids):
+        return None
+    _, rows = np.unique(item_order_ids, return_inverse=True)
+    orders_x_items = _incidence(rows, menu_item_ids, (rows.max() + 1, menu_item_ids.max() + 1))
+    return (orders_x_items.T @ orders_x_items).tocsr()
+
+
+# Customer x restaurant incidence for a set of (customer_id, restaurant_id) pairs
+def _customer_restaurants(customer_ids: np.ndarray, restaurant_ids: np.ndarray, n_restaurants: int = 0) -> sparse.csr_matrix:
+    shape = (int(customer_ids.max(initial=0)) + 1, max(int(restaurant_ids.max(initial=0)) + 1, n_restaurants))
+    return _incidence(customer_ids, restaurant_ids, shape)
+
+
+# Top-K neighbours of `entity_id` given its row of the co-occurrence matrix and the diagonal
+def _top_k(entity_id: int, cols: np.ndarray, counts: np.ndarray, diagonal: np.ndarray, k: int) -> List[dict]:
+    keep = (cols != entity_id) & (cols < len(diagonal))
+    cols, counts = cols[keep], counts[keep]
+    keep = diagonal[cols] > 0
+    cols, counts = cols[keep], counts[keep]
+    if not len(cols) or diagonal[entity_id] <= 0:
+        return []
+    scores = counts / np.sqrt(diagonal[entity_id] * diagonal[cols])
+    best = np.argsort(-scores, kind="stable")[:k]
+    return [
+        {"entity_id": int(entity_id), "rank": rank, "neighbor_id": int(cols[i]), "score": float(scores[i])}
+        for rank, i in enumerate(best)
+    ]
+
+
+# --- Writing counts and neighbours ---
+
+# INSERT ... ON CONFLICT DO UPDATE adding count deltas to existing co-occurrence rows
+def _upsert(dialect: str, rows: List[dict]):
+    dialect_insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+    stmt = dialect_insert(CoOccurrence).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=[CoOccurrence.kind, CoOccurrence.entity_id, CoOccurrence.other_id],
+        set_={"count": CoOccurrence.count + stmt.excluded.count},
+    )
+
+
+def _count_rows(kind: str, counts: sparse.csr_matrix) -> List[dict]:
+    coo = counts.tocoo()
+    return [
+        {"kind": kind, "entity_id": int(i), "other_id": int(j), "count": int(c)}
+        for i, j, c in zip(coo.row, coo.col, coo.data) if c
+    ]
+
+
+async def _write_neighbors(db: AsyncSession, kind: str, rows: List[dict], entity_ids: Optional[List[int]] = None) -> None:
+    if entity_ids is None:
+        await db.execute(delete(Neighbor).where(Neighbor.kind == kind))
+    else:
+        for i in range(0, len(entity_ids), WRITE_BATCH):
+            await db.execute(delete(Neighbor).where(
+                Neighbor.kind == kind, Neighbor.entity_id.in_(entity_ids[i:i + WRITE_BATCH])
+            ))
+    rows = [{**row, "kind": kind} for row in rows]
+    for i in range(0, len(rows), WRITE_BATCH):
+        await db.execute(insert(Neighbor), rows[i:i + WRITE_BATCH])
+
+
+async def _set_watermark(db: AsyncSession, last_order_id: int) -> None:
+    state = await db.get(JobState, JOB_NAME)
+    if state is None:
+        db.add(JobState(name=JOB_NAME, last_order_id=last_order_id))
+    else:
+        state.last_order_id = last_order_id
+
+
+async def _max_order_id(db: AsyncSession) -> int:
+    hot = (await db.execute(select(func.max(Order.id)))).scalar() or 0
+    archived = (await db.execute(select(func.max(ArchivedOrder.id)))).scalar() or 0
+    return max(hot, archived)
+
+
+# --- Jobs ---
+
+# Rebuild both matrices and all neighbour lists from scratch. Only the sparse matrices
+# are held in memory (plus the customer x restaurant incidence), never the orders.
+async def build(db: AsyncSession, k: int = TOP_K, chunk_size: int = CHUNK_SIZE) -> Dict[str, int]:
+    upto_id = await _max_order_id(db)
+    item_counts = None
+    customers_x_restaurants = None
+
+    def fold(chunk: Chunk) -> None:
+        nonlocal item_counts, customers_x_restaurants
+        _, customer_ids, restaurant_ids, item_order_ids, menu_item_ids = chunk
+        delta = _item_counts(item_order_ids, menu_item_ids)
+        if delta is not None:
+            item_counts = _add(item_counts, delta)
+        if len(customer_ids):
+            customers_x_restaurants = _add(customers_x_restaurants, _customer_restaurants(customer_ids, restaurant_ids))
+            customers_x_restaurants.data[:] = 1
+
+    async for chunk in _hot_chunks(db, 0, upto_id, chunk_size):
+        fold(chunk)
+    async for chunk in _archived_chunks(db, upto_id, chunk_size):
+        fold(chunk)
+
+    matrices = {"item": item_counts}
+    if customers_x_restaurants is not None:
+        matrices["restaurant"] = (customers_x_restaurants.T @ customers_x_restaurants).tocsr()
+
+    written = {}
+    for kind in KINDS:
+        await db.execute(delete(CoOccurrence).where(CoOccurrence.kind == kind))
+        counts = matrices.get(kind)
+        neighbors = []
+        if counts is not None:
+            rows = _count_rows(kind, counts)
+            for i in range(0, len(rows), WRITE_BATCH):
+                await db.execute(insert(CoOccurrence), rows[i:i + WRITE_BATCH])
+            diagonal = counts.diagonal().astype(float)
+            for entity_id in np.flatnonzero(np.diff(counts.indptr)):
+                start, end = counts.indptr[entity_id], counts.indptr[entity_id + 1]
+                neighbors.extend(_top_k(entity_id, counts.indices[start:end], counts.data[start:end], diagonal, k))
+        await _write_neighbors(db, kind, neighbors)
+        written[kind] = len(neighbors)
+    await _set_watermark(db, upto_id)
+    await db.commit()
+    return written
+
+
+# Recompute neighbour lists for `entity_ids` from the stored counts
+async def _refresh_neighbors(db: AsyncSession, kind: str, entity_ids: List[int], k: int) -> int:
+    diagonal_rows = (await db.execute(
+        select(CoOccurrence.entity_id, CoOccurrence.count)
+        .where(CoOccurrence.kind == kind, CoOccurrence.entity_id == CoOccurrence.other_id)
+    )).all()
+    if not diagonal_rows:
+        return 0
+    ids, counts = np.array(diagonal_rows, dtype=np.int64).T
+    diagonal = np.zeros(ids.max() + 1)
+    diagonal[ids] = counts
+
+    neighbors = []
+    for i in range(0, len(entity_ids), WRITE_BATCH):
+        batch = entity_ids[i:i + WRITE_BATCH]
+        rows = (await db.execute(
+            select(CoOccurrence.entity_id, CoOccurrence.other_id, CoOccurrence.count)
+            .where(CoOccurrence.kind == kind, CoOccurrence.entity_id.in_(batch))
+            .order_by(CoOccurrence.entity_id)
+        )).all()
+        if not rows:
+            continue
+        entity_column, other_column, count_column = np.array(rows, dtype=np.int64).T
+        starts = np.flatnonzero(np.r_[True, entity_column[1:] != entity_column[:-1]])
+        for start, end in zip(starts, np.r_[starts[1:], len(rows)]):
+            neighbors.extend(_top_k(
+                int(entity_column[start]), other_column[start:end], count_column[start:end], diagonal, k
+            ))
+    await _write_neighbors(db, kind, neighbors, entity_ids)
+    return len(neighbors)
+
+
+# Fold orders placed since the last run into the stored counts and refresh the neighbours
+# of every entity whose row changed. Neighbours of other entities can drift slightly as
+# popularity (the diagonal) changes; a periodic build() resets them exactly.
+async def update(db: AsyncSession, k: int = TOP_K, chunk_size: int = CHUNK_SIZE) -> Dict[str, int]:
+    state = await db.get(JobState, JOB_NAME)
+    if state is None:
+        return await build(db, k, chunk_size)
+    last_order_id = state.last_order_id
+    upto_id = (await db.execute(select(func.max(Order.id)))).scalar() or 0
+    dialect = db.bind.dialect.name
+    touched: Dict[str, set] = {kind: set() for kind in KINDS}
+
+    async for order_ids, customer_ids, restaurant_ids, item_order_ids, menu_item_ids in _hot_chunks(db, last_order_id, upto_id, chunk_size):
+        deltas = {"item": _item_counts(item_order_ids, menu_item_ids)}
+
+        # Restaurant pairs only change for (customer, restaurant) pairs seen for the first time
+        chunk_customers = np.unique(customer_ids).tolist()
+        known = []
+        for table in (Order, ArchivedOrder):
+            for i in range(0, len(chunk_customers), WRITE_BATCH):
+                known.extend((await db.execute(
+                    select(table.customer_id, table.restaurant_id).distinct()
+                    .where(table.customer_id.in_(chunk_customers[i:i + WRITE_BATCH]), table.id <= last_order_id)
+                )).all())
+        known = np.array(known, dtype=np.int64).reshape(-1, 2)
+        n_restaurants = int(max(restaurant_ids.max(), known[:, 1].max(initial=0))) + 1
+        n_customers = int(max(customer_ids.max(), known[:, 0].max(initial=0))) + 1
+        old = _incidence(known[:, 0], known[:, 1], (n_customers, n_restaurants))
+        seen = _incidence(customer_ids, restaurant_ids, (n_customers, n_restaurants))
+        new = seen - seen.multiply(old)
+        new.eliminate_zeros()
+        if new.nnz:
+            deltas["restaurant"] = (new.T @ old + old.T @ new + new.T @ new).tocsr()
+
+        for kind, delta in deltas.items():
+            if delta is None:
+                continue
+            rows = _count_rows(kind, delta)
+            for i in range(0, len(rows), WRITE_BATCH):
+                await db.execute(_upsert(dialect, rows[i:i + WRITE_BATCH]))
+            touched[kind].update(row["entity_id"] for row in rows)
+        last_order_id = int(order_ids[-1])
+
+    refreshed = {}
+    for kind in KINDS:
+        refreshed[kind] = await _refresh_neighbors(db, kind, sorted(touched[kind]), k) if touched[kind] else 0
+    await _set_watermark(db, max(last_order_id, upto_id))
+    await db.commit()
+    return refreshed
+
+
+if __name__ == "__main__":
+    import sys
+    from database import AsyncSessionLocal, engine
+    import migrations
+
+    async def _main(command: str) -> None:
+        await migrations.upgrade(engine)
+        async with AsyncSessionLocal() as session:
+            result = await (build(session) if command == "build" else update(session))
+            print(f"Neighbour rows written: {result}")
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ("build", "update"):
+        sys.exit("usage: python recommendations.py build|update")
+    asyncio.run(_main(sys.argv[1]))
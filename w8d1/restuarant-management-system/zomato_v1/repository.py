@@ -0,0 +1,315 @@
+# Storage behind the core entity routes: restaurants, menu items and customers
+#
+# Repository is the interface those routes depend on (Depends(get_repository)). It has
+# two implementations:
+#   SqlRepository      the crud.py functions on a request-scoped AsyncSession (default)
+#   MemoryRepository   dicts keyed by id plus secondary indexes (menu items by restaurant,
+#                      restaurants by name, customers by email), no I/O at all
+#
+# Swap in the in-memory one for tests and microbenchmarks, where it leaves only the cost
+# of routing, validation and serialization:
+#   app.dependency_overrides[get_repository] = lambda: MemoryRepository()
+# (see benchmarks/bench_routes.py). The memory rows are transient instances of the ORM
+# models, so the routes serialize them exactly as they do database rows.
+#
+# Orders, reviews, analytics and the maintenance jobs stay on crud.py and the database.
+import itertools
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Protocol, Sequence, Tuple
+
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import crud
+import jobs
+import search_cache
+from database import AsyncSessionLocal
+from email_index import normalize_email
+from models import Customer, MenuItem, Restaurant
+from schemas import (
+    CustomerCreate, CustomerUpdate, MenuItemCreate, MenuItemUpdate, RestaurantCreate, RestaurantUpdate
+)
+
+RestaurantVersion = Tuple[int, Optional[datetime], int]
+MenuVersion = Tuple[Optional[datetime], int, int, int]
+
+
+class Repository(Protocol):
+    async def create_restaurant(self, restaurant: RestaurantCreate) -> Restaurant: ...
+    async def get_restaurant(self, restaurant_id: int) -> Optional[Restaurant]: ...
+    async def get_restaurant_version(self, restaurant_id: int) -> Optional[RestaurantVersion]: ...
+    async def search_by_cuisine(
+        self, cuisine_type: str, skip: int = 0, limit: int = 10, fields: Optional[Sequence[str]] = None
+    ) -> List[Restaurant]: ...
+    async def update_restaurant(
+        self, restaurant_id: int, restaurant: RestaurantUpdate, expected_version: Optional[int] = None
+    ) -> Optional[Restaurant]: ...
+    async def delete_restaurant(self, restaurant_id: int) -> bool: ...
+
+    async def create_menu_item(self, restaurant_id: int, item: MenuItemCreate) -> MenuItem: ...
+    async def get_menu_item(self, item_id: int) -> Optional[MenuItem]: ...
+    async def get_menu_version(self, restaurant_id: int) -> Optional[MenuVersion]: ...
+    async def get_menu_for_restaurant(
+        self, restaurant_id: int, skip: int = 0, limit: int = 10, fields: Optional[Sequence[str]] = None
+    ) -> List[MenuItem]: ...
+    async def search_menu_items(
+        self, category: Optional[str] = None, vegetarian: Optional[bool] = None, skip: int = 0, limit: int = 10
+    ) -> List[MenuItem]: ...
+    async def update_menu_item(
+        self, item_id: int, item: MenuItemUpdate, expected_version: Optional[int] = None
+    ) -> Optional[MenuItem]: ...
+    async def delete_menu_item(self, item_id: int) -> bool: ...
+
+    async def create_customer(self, customer: CustomerCreate) -> Customer: ...
+    async def get_customer(self, customer_id: int) -> Optional[Customer]: ...
+    async def list_customers(self, skip: int = 0, limit: int = 10) -> List[Customer]: ...
+    async def email_available(self, email: str) -> bool: ...
+    async def update_customer(
+        self, customer_id: int, customer: CustomerUpdate, expected_version: Optional[int] = None
+    ) -> Optional[Customer]: ...
+    async def delete_customer(self, customer_id: int) -> bool: ...
+
+
+class SqlRepository:
+    def __init__(self, db: AsyncSession) -> None:
+        self.db = db
+
+    async def create_restaurant(self, restaurant):
+        return await crud.create_restaurant(self.db, restaurant)
+
+    async def get_restaurant(self, restaurant_id):
+        return await crud.get_restaurant(self.db, restaurant_id)
+
+    async def get_restaurant_version(self, restaurant_id):
+        return await crud.get_restaurant_version(self.db, restaurant_id)
+
+    async def search_by_cuisine(self, cuisine_type, skip=0, limit=10, fields=None):
+        return await crud.search_by_cuisine(self.db, cuisine_type, skip=skip, limit=limit, fields=fields)
+
+    async def update_restaurant(self, restaurant_id, restaurant, expected_version=None):
+        return await crud.update_restaurant(self.db, restaurant_id, restaurant, expected_version)
+
+    # Soft delete now, purge in the background (see crud.purge_restaurant)
+    async def delete_restaurant(self, restaurant_id):
+        if not await crud.delete_restaurant(self.db, restaurant_id):
+            return False
+        await jobs.submit(self.db, "purge_restaurant", {"restaurant_id": restaurant_id})
+        return True
+
+    async def create_menu_item(self, restaurant_id, item):
+        return await crud.create_menu_item(self.db, restaurant_id, item)
+
+    async def get_menu_item(self, item_id):
+        return await crud.get_menu_item(self.db, item_id)
+
+    async def get_menu_version(self, restaurant_id):
+        return await crud.get_menu_version(self.db, restaurant_id)
+
+    async def get_menu_for_restaurant(self, restaurant_id, skip=0, limit=10, fields=None):
+        return await crud.get_menu_for_restaurant(self.db, restaurant_id, skip=skip, limit=limit, fields=fields)
+
+    async def search_menu_items(self, category=None, vegetarian=None, skip=0, limit=10):
+        return await crud.search_menu_items(self.db, category, vegetarian, skip=skip, limit=limit)
+
+    async def update_menu_item(self, item_id, item, expected_version=None):
+        return await crud.update_menu_item(self.db, item_id, item, expected_version)
+
+    async def delete_menu_item(self, item_id):
+        return await crud.delete_menu_item(self.db, item_id)
+
+    async def create_customer(self, customer):
+        return await crud.create_customer(self.db, customer)
+
+    async def get_customer(self, customer_id):
+        return await crud.get_customer(self.db, customer_id)
+
+    async def list_customers(self, skip=0, limit=10):
+        return await crud.list_customers(self.db, skip=skip, limit=limit)
+
+    async def email_available(self, email):
+        return await crud.email_available(self.db, email)
+
+    async def update_customer(self, customer_id, customer, expected_version=None):
+        return await crud.update_customer(self.db, customer_id, customer, expected_version)
+
+    async def delete_customer(self, customer_id):
+        return await crud.delete_customer(self.db, customer_id)
+
+
+def _now() -> datetime:
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+# Apply an update in place, with the optimistic concurrency rules of crud.versioned_update
+def _apply(row, values: dict, expected_version: Optional[int]) -> None:
+    if expected_version is not None and row.version != expected_version:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"{type(row).__name__} {row.id} was modified (now version {row.version}); reload and retry"
+        )
+    for name, value in values.items():
+        setattr(row, name, value)
+    row.version += 1
+    row.updated_at = _now()
+
+
+class MemoryRepository:
+    def __init__(self) -> None:
+        self.restaurants: Dict[int, Restaurant] = {}
+        self.menu_items: Dict[int, MenuItem] = {}
+        self.customers: Dict[int, Customer] = {}
+        # Secondary indexes. Dicts keep insertion (= id) order, so the per-restaurant
+        # menu lists in id order like the database does.
+        self.menu_by_restaurant: Dict[int, Dict[int, MenuItem]] = {}
+        self.restaurant_by_name: Dict[str, int] = {}
+        self.customer_by_email: Dict[str, int] = {}
+        self._ids = {name: itertools.count(1) for name in ("restaurant", "menu_item", "customer")}
+
+    # --- Restaurants ---
+
+    async def create_restaurant(self, restaurant):
+        if restaurant.name in self.restaurant_by_name:
+            raise HTTPException(status_code=400, detail="Restaurant name already exists.")
+        now = _now()
+        row = Restaurant(
+            **restaurant.dict(), id=next(self._ids["restaurant"]), version=1, created_at=now, updated_at=now
+        )
+        self.restaurants[row.id] = row
+        self.restaurant_by_name[row.name] = row.id
+        self.menu_by_restaurant[row.id] = {}
+        return row
+
+    async def get_restaurant(self, restaurant_id):
+        return self.restaurants.get(restaurant_id)
+
+    async def get_restaurant_version(self, restaurant_id):
+        row = self.restaurants.get(restaurant_id)
+        return (row.id, row.updated_at, row.version) if row else None
+
+    async def search_by_cuisine(self, cuisine_type, skip=0, limit=10, fields=None):
+        term = search_cache.normalize(cuisine_type)
+        matches = (row for row in self.restaurants.values() if term in row.cuisine_type.casefold())
+        return list(itertools.islice(matches, skip, skip + limit))
+
+    async def update_restaurant(self, restaurant_id, restaurant, expected_version=None):
+        row = self.restaurants.get(restaurant_id)
+        if row is None:
+            return None
+        values = restaurant.dict(exclude_unset=True)
+        name = values.get("name", row.name)
+        if self.restaurant_by_name.get(name, row.id) != row.id:
+            raise HTTPException(status_code=400, detail="Restaurant name already exists.")
+        old_name = row.name
+        _apply(row, values, expected_version)
+        del self.restaurant_by_name[old_name]
+        self.restaurant_by_name[row.name] = row.id
+        return row
+
+    # Deletes the menu with it (what the database's ON DELETE CASCADE does)
+    async def delete_restaurant(self, restaurant_id):
+        row = self.restaurants.pop(restaurant_id, None)
+        if row is None:
+            return False
+        del self.restaurant_by_name[row.name]
+        for item_id in self.menu_by_restaurant.pop(restaurant_id):
+            del self.menu_items[item_id]
+        return True
+
+    # --- Menu items ---
+
+    async def create_menu_item(self, restaurant_id, item):
+        if restaurant_id not in self.restaurants:
+            raise HTTPException(status_code=404, detail="Restaurant not found")
+        now = _now()
+        row = MenuItem(
+            **item.dict(), id=next(self._ids["menu_item"]), restaurant_id=restaurant_id,
+            version=1, created_at=now, updated_at=now
+        )
+        self.menu_items[row.id] = row
+        self.menu_by_restaurant[restaurant_id][row.id] = row
+        return row
+
+    async def get_menu_item(self, item_id):
+        return self.menu_items.get(item_id)
+
+    async def get_menu_version(self, restaurant_id):
+        restaurant = self.restaurants.get(restaurant_id)
+        if restaurant is None:
+            return None
+        menu = self.menu_by_restaurant[restaurant_id].values()
+        last_modified = max([restaurant.updated_at, *(row.updated_at for row in menu)])
+        return last_modified, len(menu), restaurant.version, sum(row.version for row in menu)
+
+    async def get_menu_for_restaurant(self, restaurant_id, skip=0, limit=10, fields=None):
+        menu = self.menu_by_restaurant.get(restaurant_id, {}).values()
+        return list(itertools.islice(menu, skip, skip + limit))
+
+    async def search_menu_items(self, category=None, vegetarian=None, skip=0, limit=10):
+        term = search_cache.normalize(category)
+        matches = (
+            row for row in self.menu_items.values()
+            if term in row.category.casefold() and (vegetarian is None or row.is_vegetarian == vegetarian)
+        )
+        return list(itertools.islice(matches, skip, skip + limit))
+
+    async def update_menu_item(self, item_id, item, expected_version=None):
+        row = self.menu_items.get(item_id)
+        if row is None:
+            return None
+        _apply(row, item.dict(exclude_unset=True), expected_version)
+        return row
+
+    async def delete_menu_item(self, item_id):
+        row = self.menu_items.pop(item_id, None)
+        if row is None:
+            return False
+        del self.menu_by_restaurant[row.restaurant_id][item_id]
+        return True
+
+    # --- Customers ---
+
+    async def create_customer(self, customer):
+        if customer.email in self.customer_by_email:
+            raise HTTPException(status_code=400, detail="Email already registered")
+        now = _now()
+        row = Customer(
+            **customer.dict(), id=next(self._ids["customer"]), version=1, created_at=now, updated_at=now
+        )
+        self.customers[row.id] = row
+        self.customer_by_email[row.email] = row.id
+        return row
+
+    async def get_customer(self, customer_id):
+        return self.customers.get(customer_id)
+
+    async def list_customers(self, skip=0, limit=10):
+        return list(itertools.islice(self.customers.values(), skip, skip + limit))
+
+    async def email_available(self, email):
+        return normalize_email(email) not in self.customer_by_email
+
+    async def update_customer(self, customer_id, customer, expected_version=None):
+        row = self.customers.get(customer_id)
+        if row is None:
+            return None
+        values = customer.dict(exclude_unset=True)
+        if self.customer_by_email.get(values.get("email", row.email), row.id) != row.id:
+            raise HTTPException(status_code=400, detail="Email already registered")
+        old_email = row.email
+        _apply(row, values, expected_version)
+        del self.customer_by_email[old_email]
+        self.customer_by_email[row.email] = row.id
+        return row
+
+    async def delete_customer(self, customer_id):
+        row = self.customers.pop(customer_id, None)
+        if row is None:
+            return False
+        del self.customer_by_email[row.email]
+        return True
+
+
+# FastAPI dependency: the database-backed repository on a request-scoped session
+async def get_repository():
+    async with AsyncSessionLocal() as session:
+        yield SqlRepository(session)
@@ -8,11 +8,13 @@ from .menu_items import router as menu_router
 from .orders import router as order_router
 from .customers import router as customer_router
 from .reviews import router as review_router
+from .jobs import router as job_router
 
 __all__ = [
     'restaurant_router',
     'menu_router',
     'order_router',
     'customer_router',
-    'review_router'
+    'review_router',
+    'job_router'
 ]
@@ -1,14 +1,20 @@
 # Customer endpoints router (CRUD, analytics)
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
 from database import get_db
 from crud import (
-    create_customer, get_customer, list_customers, update_customer, delete_customer,
-    get_customer_orders, get_customer_reviews
+    get_customer, get_customer_orders, get_customer_reviews, get_customer_summary, get_customer_recommendations
 )
-from schemas import CustomerCreate, CustomerUpdate, CustomerOut, OrderOut, ReviewOut
+from repository import Repository, get_repository
+from schemas import (
+    CustomerCreate, CustomerUpdate, CustomerOut, OrderOut, ReviewOut, CustomerSummaryOut,
+    CustomerRecommendations, EmailAvailability
+)
+from serializers import render
+from conditional import version_etag, if_match_version
+from email_index import normalize_email
 
 router = APIRouter(prefix="/customers", tags=["customers"])
 
@@ -16,48 +22,62 @@ router = APIRouter(prefix="/customers", tags=["customers"])
 @router.post("/", response_model=CustomerOut, status_code=status.HTTP_201_CREATED)
 async def create_new_customer(
     customer: CustomerCreate,
-    db: AsyncSession = Depends(get_db)
+    repo: Repository = Depends(get_repository)
 ):
     """Create a new customer account."""
-    return await create_customer(db, customer)
+    return await repo.create_customer(customer)
+
+# Check whether an email can still be registered (declared before /{customer_id})
+@router.get("/email-available", response_model=EmailAvailability)
+async def check_email_available(
+    email: str = Query(..., min_length=3, max_length=100),
+    repo: Repository = Depends(get_repository)
+):
+    """Whether no customer has registered this email (case-insensitive) yet."""
+    return {"email": normalize_email(email), "available": await repo.email_available(email)}
 
 # Get customer by ID
 @router.get("/{customer_id}", response_model=CustomerOut)
-async def get_customer_by_id(customer_id: int, db: AsyncSession = Depends(get_db)):
-    """Get details of a specific customer."""
-    customer = await get_customer(db, customer_id)
+async def get_customer_by_id(customer_id: int, response: Response, repo: Repository = Depends(get_repository)):
+    """Get details of a specific customer (ETag carries its version, for If-Match on update)."""
+    customer = await repo.get_customer(customer_id)
     if not customer:
         raise HTTPException(status_code=404, detail="Customer not found")
-    return customer
+    response.headers["ETag"] = version_etag("customer", customer_id, customer.version)
+    return render(customer, CustomerOut, response)
 
 # List all customers with pagination
 @router.get("/", response_model=List[CustomerOut])
 async def list_all_customers(
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_db)
+    repo: Repository = Depends(get_repository)
 ):
     """List all customers with pagination."""
-    return await list_customers(db, skip=skip, limit=limit)
+    customers = await repo.list_customers(skip=skip, limit=limit)
+    return render(customers, CustomerOut, many=True)
 
 # Update customer
 @router.put("/{customer_id}", response_model=CustomerOut)
 async def update_customer_by_id(
     customer_id: int,
     customer: CustomerUpdate,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    response: Response,
+    repo: Repository = Depends(get_repository)
 ):
-    """Update an existing customer's details."""
-    updated = await update_customer(db, customer_id, customer)
+    """Update an existing customer's details (If-Match: their ETag; 409 if it changed since)."""
+    updated = await repo.update_customer(customer_id, customer, if_match_version(request, "customer", customer_id))
     if not updated:
         raise HTTPException(status_code=404, detail="Customer not found")
+    response.headers["ETag"] = version_etag("customer", customer_id, updated.version)
     return updated
 
 # Delete customer
 @router.delete("/{customer_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_customer_by_id(customer_id: int, db: AsyncSession = Depends(get_db)):
+async def delete_customer_by_id(customer_id: int, repo: Repository = Depends(get_repository)):
     """Delete a customer account."""
-    success = await delete_customer(db, customer_id)
+    success = await repo.delete_customer(customer_id)
     if not success:
         raise HTTPException(status_code=404, detail="Customer not found")
     return None
@@ -68,10 +88,31 @@ async def get_customer_order_history(
     customer_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    include_archived: bool = Query(True, description="Continue into archived (old delivered) orders"),
     db: AsyncSession = Depends(get_db)
 ):
-    """Get order history for a customer."""
-    return await get_customer_orders(db, customer_id, skip=skip, limit=limit)
+    """Get order history for a customer (recent orders first, then archived ones)."""
+    return await get_customer_orders(db, customer_id, skip=skip, limit=limit, include_archived=include_archived)
+
+# Home screen summary: recent orders, favourite restaurants, reorder suggestions
+@router.get("/{customer_id}/summary", response_model=CustomerSummaryOut)
+async def get_customer_order_summary(customer_id: int, db: AsyncSession = Depends(get_db)):
+    """Get a customer's recent orders, favourite restaurants and most reordered items."""
+    if not await get_customer(db, customer_id):
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return await get_customer_summary(db, customer_id)
+
+# Recommended dishes and restaurants based on what similar orders contain
+@router.get("/{customer_id}/recommendations", response_model=CustomerRecommendations)
+async def get_customer_recommendation_list(
+    customer_id: int,
+    limit: int = Query(10, ge=1, le=50),
+    db: AsyncSession = Depends(get_db)
+):
+    """Get menu items and restaurants the customer hasn't tried yet, ranked by order co-occurrence."""
+    if not await get_customer(db, customer_id):
+        raise HTTPException(status_code=404, detail="Customer not found")
+    return await get_customer_recommendations(db, customer_id, limit=limit)
 
 # Get customer's reviews
 @router.get("/{customer_id}/reviews", response_model=List[ReviewOut])
@@ -0,0 +1,49 @@
+# Background job endpoints (submit and inspect maintenance jobs)
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from sqlalchemy.ext.asyncio import AsyncSession
+from typing import List, Optional
+
+from database import get_db
+from jobs import JOB_TYPES, submit, get_job, list_jobs
+from schemas import JobCreate, JobOut
+
+router = APIRouter(prefix="/jobs", tags=["jobs"])
+
+# Submit a job; it runs on the worker pool, not on this request
+@router.post("/", response_model=JobOut, status_code=status.HTTP_202_ACCEPTED)
+async def submit_job(job: JobCreate, db: AsyncSession = Depends(get_db)):
+    """Queue a background job. Poll GET /jobs/{id} for its status and result."""
+    try:
+        return await submit(db, job.type, job.params, delay_seconds=job.delay_seconds)
+    except ValueError as exc:
+        raise HTTPException(status_code=422, detail=str(exc))
+
+# List registered job types and their limits
+@router.get("/types")
+async def list_job_types():
+    """List the job types that can be submitted."""
+    return {
+        name: {"concurrency": spec.concurrency, "max_attempts": spec.max_attempts}
+        for name, spec in JOB_TYPES.items()
+    }
+
+# List jobs, newest first
+@router.get("/", response_model=List[JobOut])
+async def list_all_jobs(
+    status: Optional[str] = Query(None, pattern="^(queued|running|succeeded|failed)$"),
+    type: Optional[str] = None,
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """List jobs, optionally filtered by status and type."""
+    return await list_jobs(db, status=status, type=type, skip=skip, limit=limit)
+
+# Get job by ID
+@router.get("/{job_id}", response_model=JobOut)
+async def get_job_by_id(job_id: int, db: AsyncSession = Depends(get_db)):
+    """Get a job's status, attempts, result or last error."""
+    job = await get_job(db, job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
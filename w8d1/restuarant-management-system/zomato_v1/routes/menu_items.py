@@ -1,14 +1,16 @@
 # Menu items router (CRUD, search, and analytics)
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from database import get_db
-from crud import (
-    create_menu_item, get_menu_item, list_menu_items, update_menu_item,
-    delete_menu_item, get_menu_item_with_restaurant, search_menu_items
-)
-from schemas import MenuItemCreate, MenuItemUpdate, MenuItemOut
+from database import get_db, run_in_session
+from crud import MENU_ITEM_LISTS, list_menu_items, get_menu_item_with_restaurant, get_popular_menu_items
+from repository import Repository, get_repository
+from schemas import MenuItemCreate, MenuItemUpdate, MenuItemOut, PopularItem
+from leaderboard import WINDOW_PATTERN
+from serializers import render, serialize, parse_fields, fields_key, FIELDS_HELP
+from compression import cached_json
+from conditional import version_etag, if_match_version
 
 router = APIRouter(prefix="/menu-items", tags=["menu-items"])
 
@@ -17,29 +19,47 @@ router = APIRouter(prefix="/menu-items", tags=["menu-items"])
 async def create_new_menu_item(
     restaurant_id: int,
     item: MenuItemCreate,
-    db: AsyncSession = Depends(get_db)
+    repo: Repository = Depends(get_repository)
 ):
     """Create a new menu item for a restaurant."""
-    return await create_menu_item(db, restaurant_id, item)
+    return await repo.create_menu_item(restaurant_id, item)
+
+# Most ordered menu items across all restaurants (declared before /{item_id})
+@router.get("/popular", response_model=List[PopularItem])
+async def get_popular_menu_items_view(
+    window: str = Query("24h", pattern=WINDOW_PATTERN),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    """Global leaderboard of the most ordered dishes over a sliding window (1h, 24h or 7d)."""
+    return await get_popular_menu_items(db, window, limit)
 
 # Get menu item by ID
 @router.get("/{item_id}", response_model=MenuItemOut)
-async def get_menu_item_by_id(item_id: int, db: AsyncSession = Depends(get_db)):
-    """Get details of a specific menu item."""
-    item = await get_menu_item(db, item_id)
+async def get_menu_item_by_id(item_id: int, response: Response, repo: Repository = Depends(get_repository)):
+    """Get details of a specific menu item (ETag carries its version, for If-Match on update)."""
+    item = await repo.get_menu_item(item_id)
     if not item:
         raise HTTPException(status_code=404, detail="Menu item not found")
-    return item
+    response.headers["ETag"] = version_etag("menu-item", item_id, item.version)
+    return render(item, MenuItemOut, response)
 
 # List all menu items with pagination
 @router.get("/", response_model=List[MenuItemOut])
 async def list_all_menu_items(
+    request: Request,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_db)
+    fields: Optional[str] = Query(None, description=FIELDS_HELP)
 ):
-    """List all menu items with pagination."""
-    return await list_menu_items(db, skip=skip, limit=limit)
+    """List all menu items with pagination (served from the precompressed cache)."""
+    projection = parse_fields(fields, MenuItemOut)
+    async def build():
+        items = await run_in_session(list_menu_items, skip=skip, limit=limit, fields=projection)
+        return serialize(items, MenuItemOut, many=True, fields=projection)
+    return await cached_json(
+        request, f"menu_items:list:{skip}:{limit}:{fields_key(projection)}", 300, build, MENU_ITEM_LISTS
+    )
 
 # Get menu item with restaurant details
 @router.get("/{item_id}/with-restaurant", response_model=MenuItemOut)
@@ -55,19 +75,22 @@ async def get_menu_item_details(item_id: int, db: AsyncSession = Depends(get_db)
 async def update_menu_item_by_id(
     item_id: int,
     item: MenuItemUpdate,
-    db: AsyncSession = Depends(get_db)
+    request: Request,
+    response: Response,
+    repo: Repository = Depends(get_repository)
 ):
-    """Update an existing menu item."""
-    updated = await update_menu_item(db, item_id, item)
+    """Update an existing menu item (If-Match: its ETag; 409 if it changed since)."""
+    updated = await repo.update_menu_item(item_id, item, if_match_version(request, "menu-item", item_id))
     if not updated:
         raise HTTPException(status_code=404, detail="Menu item not found")
+    response.headers["ETag"] = version_etag("menu-item", item_id, updated.version)
     return updated
 
 # Delete menu item
 @router.delete("/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_menu_item_by_id(item_id: int, db: AsyncSession = Depends(get_db)):
+async def delete_menu_item_by_id(item_id: int, repo: Repository = Depends(get_repository)):
     """Delete a menu item."""
-    deleted = await delete_menu_item(db, item_id)
+    deleted = await repo.delete_menu_item(item_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Menu item not found")
     return None
@@ -79,7 +102,7 @@ async def search_menu_items_by_filters(
     vegetarian: Optional[bool] = None,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_db)
+    repo: Repository = Depends(get_repository)
 ):
     """Search menu items by category and dietary preference."""
-    return await search_menu_items(db, category, vegetarian, skip=skip, limit=limit)
\ No newline at end of file
+    return await repo.search_menu_items(category, vegetarian, skip=skip, limit=limit)
\ No newline at end of file
@@ -1,16 +1,21 @@
 # Order endpoints router (place order, status, history, analytics)
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 from datetime import datetime
 
 from database import get_db
+from conditional import version_etag, if_match_version
 from crud import (
-    create_order, get_order, list_orders, update_order_status,
+    create_order, get_order, list_orders, update_order_status, update_order_statuses,
     get_customer_orders, get_restaurant_orders, calculate_order_total,
-    add_order_item, remove_order_item, get_order_items
+    add_order_item, remove_order_item, get_order_items,
+    archive_orders, ORDER_ARCHIVE_AFTER_DAYS
+)
+from schemas import (
+    OrderCreate, OrderUpdate, OrderOut, OrderItemCreate, OrderItemOut,
+    OrderStatusChange, OrderStatusResult
 )
-from schemas import OrderCreate, OrderUpdate, OrderOut, OrderItemCreate, OrderItemOut
 from models import Order
 
 router = APIRouter(prefix="/orders", tags=["orders"])
@@ -24,13 +29,24 @@ async def create_new_order(
     """Create a new order for a customer."""
     return await create_order(db, order)
 
+# Move old delivered orders to the archive tables
+@router.post("/archive")
+async def archive_old_orders(
+    older_than_days: int = Query(ORDER_ARCHIVE_AFTER_DAYS, ge=0),
+    db: AsyncSession = Depends(get_db)
+):
+    """Archive delivered orders older than `older_than_days` days."""
+    return {"archived": await archive_orders(db, older_than_days=older_than_days)}
+
 # Get order by ID
 @router.get("/{order_id}", response_model=OrderOut)
-async def get_order_by_id(order_id: int, db: AsyncSession = Depends(get_db)):
-    """Get details of a specific order."""
-    order = await get_order(db, order_id)
+async def get_order_by_id(order_id: int, response: Response, db: AsyncSession = Depends(get_db)):
+    """Get details of a specific order (hot or archived; hot orders carry a versioned ETag)."""
+    order = await get_order(db, order_id, include_archived=True)
     if not order:
         raise HTTPException(status_code=404, detail="Order not found")
+    if getattr(order, "version", None) is not None:
+        response.headers["ETag"] = version_etag("order", order_id, order.version)
     return order
 
 # List all orders with pagination
@@ -48,24 +64,37 @@ async def list_all_orders(
 async def update_status(
     order_id: int,
     order: OrderUpdate,
+    request: Request,
+    response: Response,
     db: AsyncSession = Depends(get_db)
 ):
-    """Update the status of an order."""
-    updated = await update_order_status(db, order_id, order)
+    """Update the status of an order (If-Match: its ETag; 409 if it changed since)."""
+    updated = await update_order_status(db, order_id, order, if_match_version(request, "order", order_id))
     if not updated:
         raise HTTPException(status_code=404, detail="Order not found")
+    response.headers["ETag"] = version_etag("order", order_id, updated.version)
     return updated
 
+# Batch status update (kitchen displays)
+@router.patch("/status", response_model=List[OrderStatusResult])
+async def update_statuses(
+    changes: List[OrderStatusChange],
+    db: AsyncSession = Depends(get_db)
+):
+    """Move several orders to new statuses; each only moves if it is still in its expected status."""
+    return await update_order_statuses(db, changes)
+
 # Get orders for a customer
 @router.get("/customer/{customer_id}", response_model=List[OrderOut])
 async def get_orders_by_customer(
     customer_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    include_archived: bool = Query(False, description="Continue into archived (old delivered) orders"),
     db: AsyncSession = Depends(get_db)
 ):
     """Get all orders for a specific customer."""
-    return await get_customer_orders(db, customer_id, skip=skip, limit=limit)
+    return await get_customer_orders(db, customer_id, skip=skip, limit=limit, include_archived=include_archived)
 
 # Get orders for a restaurant
 @router.get("/restaurant/{restaurant_id}", response_model=List[OrderOut])
@@ -73,10 +102,11 @@ async def get_orders_by_restaurant(
     restaurant_id: int,
     skip: int = Query(0, ge=0),
     limit: int = Query(10, ge=1, le=100),
+    include_archived: bool = Query(False, description="Continue into archived (old delivered) orders"),
     db: AsyncSession = Depends(get_db)
 ):
     """Get all orders for a specific restaurant."""
-    return await get_restaurant_orders(db, restaurant_id, skip=skip, limit=limit)
+    return await get_restaurant_orders(db, restaurant_id, skip=skip, limit=limit, include_archived=include_archived)
 
 # Calculate order total
 @router.get("/{order_id}/total", response_model=float)
@@ -1,244 +1,245 @@
 # FastAPI routes for Restaurant CRUD and search endpoints
-from fastapi import APIRouter, Depends, HTTPException, status, Query
+import asyncio
+from datetime import datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Response
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
-from database import get_db
+from database import get_db, run_in_session
 from crud import (
-    create_restaurant, get_restaurant, list_restaurants, update_restaurant,
-    delete_restaurant, search_by_cuisine, list_active_restaurants,
-    get_menu_for_restaurant, get_restaurant_reviews, calculate_restaurant_rating,
-    get_restaurant_orders, get_average_menu_price, get_restaurant_with_menu
+    RESTAURANT_LISTS, RESTAURANT_PAGES, page_cache_key, get_restaurant, list_restaurants, list_active_restaurants,
+    get_menu_for_restaurant, get_restaurant_with_menu,
+    get_average_menu_price, get_restaurant_version, get_menu_version,
+    get_top_reviews, calculate_restaurant_rating, sync_menu, get_popular_menu_items, get_eta_model
 )
+from menu_import import read_menu_upload
+from repository import Repository, get_repository
+from analytics import get_series, to_naive_utc, BUCKETS
+from leaderboard import WINDOW_PATTERN
+from conditional import make_etag, version_etag, if_match_version, is_not_modified, set_validators, not_modified
+from serializers import render, serialize, parse_fields, fields_key, FIELDS_HELP
+from compression import cached_json
 from schemas import (
-    RestaurantCreate, RestaurantUpdate, RestaurantOut,
-    MenuItemOut, ReviewOut, OrderOut
+    RestaurantCreate, RestaurantUpdate, RestaurantOut, RestaurantWithMenu,
+    MenuItemCreate, MenuItemOut,
+    RestaurantPage, ReviewSummary, MenuSyncResult, AnalyticsPoint, PopularItem, EtaModel
 )
 
-router = APIRouter(prefix="/restaurants", tags=["restaurants"])
-
-# Create new restaurant
-@router.post("/", response_model=RestaurantOut, status_code=status.HTTP_201_CREATED)
-async def create_new_restaurant(
-    restaurant: RestaurantCreate,
-    db: AsyncSession = Depends(get_db)
-):
-    """Create a new restaurant."""
-    return await create_restaurant(db, restaurant)
-
-# Get restaurant by ID
-@router.get("/{restaurant_id}", response_model=RestaurantOut)
-async def get_restaurant_by_id(restaurant_id: int, db: AsyncSession = Depends(get_db)):
-    """Get details of a specific restaurant."""
-    restaurant = await get_restaurant(db, restaurant_id)
+PAGE_MENU_LIMIT = 100
+PAGE_TOP_REVIEWS = 5
+PAGE_CACHE_TTL = 60
+LIST_CACHE_TTL = 300
+
+# Cache keys and document builders for the cached reads, shared with the startup warmer
+def list_cache_key(kind: str, skip: int, limit: int, projection=None) -> str:
+    return f"restaurants:{kind}:{skip}:{limit}:{fields_key(projection)}"
+
+# JSON-ready page of GET /restaurants/ (kind "list") or /restaurants/active (kind "active")
+async def restaurant_list_document(db: AsyncSession, kind: str, skip: int, limit: int, projection=None) -> list:
+    fetch = list_active_restaurants if kind == "active" else list_restaurants
+    restaurants = await fetch(db, skip=skip, limit=limit, fields=projection)
+    return serialize(restaurants, RestaurantOut, many=True, fields=projection)
+
+# JSON-ready restaurant page: each part runs on its own session concurrently
+async def restaurant_page_document(restaurant_id: int) -> dict:
+    restaurant, menu, reviews, rating, avg_price = await asyncio.gather(
+        run_in_session(get_restaurant, restaurant_id),
+        run_in_session(get_menu_for_restaurant, restaurant_id, limit=PAGE_MENU_LIMIT),
+        run_in_session(get_top_reviews, restaurant_id, limit=PAGE_TOP_REVIEWS),
+        run_in_session(calculate_restaurant_rating, restaurant_id),
+        run_in_session(get_average_menu_price, restaurant_id),
+    )
     if not restaurant:
         raise HTTPException(status_code=404, detail="Restaurant not found")
-    return restaurant
-
-# List all restaurants with pagination
-@router.get("/", response_model=List[RestaurantOut])
-async def list_all_restaurants(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_db)
-):
-    """List all restaurants with pagination."""
-    return await list_restaurants(db, skip=skip, limit=limit)
-
-# Update restaurant
-@router.put("/{restaurant_id}", response_model=RestaurantOut)
-async def update_restaurant_by_id(
-    restaurant_id: int,
-    restaurant: RestaurantUpdate,
-    db: AsyncSession = Depends(get_db)
-):
-    """Update an existing restaurant's details."""
-    updated = await update_restaurant(db, restaurant_id, restaurant)
-    if not updated:
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    return updated
-
-# Delete restaurant
-@router.delete("/{restaurant_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_restaurant_by_id(restaurant_id: int, db: AsyncSession = Depends(get_db)):
-    """Delete a restaurant."""
-    success = await delete_restaurant(db, restaurant_id)
-    if not success:
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    return None
-
-# Search restaurants by cuisine
-@router.get("/search/cuisine/{cuisine_type}", response_model=List[RestaurantOut])
-async def search_restaurants_by_cuisine(
-    cuisine_type: str,
-    skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_db)
-):
-    """Search restaurants by cuisine type."""
-    return await search_by_cuisine(db, cuisine_type, skip=skip, limit=limit)
-
-# List active restaurants
-@router.get("/active/", response_model=List[RestaurantOut])
-async def get_active_restaurants(
-    skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_db)
-):
-    """List only active restaurants."""
-    return await list_active_restaurants(db, skip=skip, limit=limit)
-
-# Get restaurant menu
-@router.get("/{restaurant_id}/menu", response_model=List[MenuItemOut])
-async def get_restaurant_menu(
-    restaurant_id: int,
-    skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_db)
-):
-    """Get the menu for a specific restaurant."""
-    menu = await get_menu_for_restaurant(db, restaurant_id, skip=skip, limit=limit)
-    if not menu and not await get_restaurant(db, restaurant_id):
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    return menu
-
-# Get restaurant reviews
-@router.get("/{restaurant_id}/reviews", response_model=List[ReviewOut])
-async def get_reviews_for_restaurant(
-    restaurant_id: int,
-    skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_db)
-):
-    """Get all reviews for a specific restaurant."""
-    if not await get_restaurant(db, restaurant_id):
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    return await get_restaurant_reviews(db, restaurant_id, skip=skip, limit=limit)
-
-# Get restaurant rating
-@router.get("/{restaurant_id}/rating", response_model=float)
-async def get_restaurant_avg_rating(restaurant_id: int, db: AsyncSession = Depends(get_db)):
-    """Get the average rating for a restaurant."""
-    if not await get_restaurant(db, restaurant_id):
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    rating = await calculate_restaurant_rating(db, restaurant_id)
-    return rating if rating is not None else 0.0
-
-# Get restaurant orders
-@router.get("/{restaurant_id}/orders", response_model=List[OrderOut])
-async def get_orders_for_restaurant(
-    restaurant_id: int,
-    skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_db)
-):
-    """Get all orders for a specific restaurant."""
-    if not await get_restaurant(db, restaurant_id):
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    return await get_restaurant_orders(db, restaurant_id, skip=skip, limit=limit)
-
-# Get average menu price
-@router.get("/{restaurant_id}/average-price", response_model=float)
-async def get_menu_average_price(restaurant_id: int, db: AsyncSession = Depends(get_db)):
-    """Calculate and return the average menu item price for a restaurant."""
-    if not await get_restaurant(db, restaurant_id):
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    avg_price = await get_average_menu_price(db, restaurant_id)
-    return avg_price if avg_price is not None else 0.0
-
-# Get restaurant with full menu
-@router.get("/{restaurant_id}/full-details", response_model=RestaurantOut)
-async def get_restaurant_full_details(restaurant_id: int, db: AsyncSession = Depends(get_db)):
-    """Get restaurant details including its complete menu."""
-    restaurant = await get_restaurant_with_menu(db, restaurant_id)
-    if not restaurant:
-        raise HTTPException(status_code=404, detail="Restaurant not found")
-    return restaurant
-
-from crud import (
-    create_menu_item, get_menu_item, list_menu_items, update_menu_item, delete_menu_item,
-    get_menu_for_restaurant, get_menu_item_with_restaurant, get_restaurant_with_menu,
-    search_menu_items, get_average_menu_price
-)
-from schemas import (
-    RestaurantCreate, RestaurantUpdate, RestaurantOut, RestaurantWithMenu,
-    MenuItemCreate, MenuItemUpdate, MenuItemOut, MenuItemWithRestaurant
-)
+    return {
+        "restaurant": serialize(restaurant, RestaurantOut),
+        "menu": serialize(menu, MenuItemOut, many=True),
+        "top_reviews": serialize(reviews, ReviewSummary, many=True),
+        "rating": rating if rating is not None else 0.0,
+        "average_price": avg_price if avg_price is not None else 0.0,
+    }
 
 # --- Restaurant Router ---
 router = APIRouter(prefix="/restaurants", tags=["restaurants"])
 
 # Create new restaurant
 @router.post("/", response_model=RestaurantOut, status_code=status.HTTP_201_CREATED)
-async def create_restaurant_view(restaurant: RestaurantCreate, db: AsyncSession = Depends(get_db)):
-    return await create_restaurant(db, restaurant)
+async def create_restaurant_view(restaurant: RestaurantCreate, repo: Repository = Depends(get_repository)):
+    return await repo.create_restaurant(restaurant)
 
 # List all restaurants (with pagination)
 @router.get("/", response_model=List[RestaurantOut])
 async def list_restaurants_view(
-    skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=100), db: AsyncSession = Depends(get_db)
+    request: Request,
+    skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=100),
+    fields: Optional[str] = Query(None, description=FIELDS_HELP)
+):
+    projection = parse_fields(fields, RestaurantOut)
+    return await cached_json(
+        request, list_cache_key("list", skip, limit, projection), LIST_CACHE_TTL,
+        lambda: run_in_session(restaurant_list_document, "list", skip, limit, projection), RESTAURANT_LISTS
+    )
+
+# Search by cuisine type (this and /active are declared before /{restaurant_id}, which
+# would otherwise claim their paths)
+@router.get("/search", response_model=List[RestaurantOut])
+async def search_by_cuisine_view(
+    cuisine: str, skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=100),
+    fields: Optional[str] = Query(None, description=FIELDS_HELP), repo: Repository = Depends(get_repository)
 ):
-    return await list_restaurants(db, skip=skip, limit=limit)
+    projection = parse_fields(fields, RestaurantOut)
+    restaurants = await repo.search_by_cuisine(cuisine, skip=skip, limit=limit, fields=projection)
+    return render(restaurants, RestaurantOut, many=True, fields=projection)
 
-# Get specific restaurant by ID
+# List only active restaurants
+@router.get("/active", response_model=List[RestaurantOut])
+async def list_active_restaurants_view(
+    request: Request,
+    skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=100),
+    fields: Optional[str] = Query(None, description=FIELDS_HELP)
+):
+    projection = parse_fields(fields, RestaurantOut)
+    return await cached_json(
+        request, list_cache_key("active", skip, limit, projection), LIST_CACHE_TTL,
+        lambda: run_in_session(restaurant_list_document, "active", skip, limit, projection), RESTAURANT_LISTS
+    )
+
+# Get specific restaurant by ID (answers 304 when the client's ETag/Last-Modified is current)
 @router.get("/{restaurant_id}", response_model=RestaurantOut)
-async def get_restaurant_view(restaurant_id: int, db: AsyncSession = Depends(get_db)):
-    restaurant = await get_restaurant(db, restaurant_id)
+async def get_restaurant_view(
+    restaurant_id: int, request: Request, response: Response, repo: Repository = Depends(get_repository)
+):
+    version = await repo.get_restaurant_version(restaurant_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    etag = version_etag("restaurant", restaurant_id, version[2])
+    if is_not_modified(request, etag, version[1]):
+        return not_modified(etag, version[1])
+    restaurant = await repo.get_restaurant(restaurant_id)
     if not restaurant:
         raise HTTPException(status_code=404, detail="Restaurant not found")
-    return restaurant
+    set_validators(response, etag, version[1])
+    return render(restaurant, RestaurantOut, response)
 
-# Update restaurant by ID
+# Update restaurant by ID (send the ETag from GET as If-Match; 409 if it changed since)
 @router.put("/{restaurant_id}", response_model=RestaurantOut)
 async def update_restaurant_view(
-    restaurant_id: int, restaurant: RestaurantUpdate, db: AsyncSession = Depends(get_db)
+    restaurant_id: int, restaurant: RestaurantUpdate, request: Request, response: Response,
+    repo: Repository = Depends(get_repository)
 ):
-    updated = await update_restaurant(db, restaurant_id, restaurant)
+    expected_version = if_match_version(request, "restaurant", restaurant_id)
+    updated = await repo.update_restaurant(restaurant_id, restaurant, expected_version)
     if not updated:
         raise HTTPException(status_code=404, detail="Restaurant not found")
+    response.headers["ETag"] = version_etag("restaurant", restaurant_id, updated.version)
     return updated
 
-# Delete restaurant by ID
+# Delete restaurant by ID: hidden at once, its menu, orders and reviews are purged by a
+# background job, so this returns immediately whatever the restaurant's size
 @router.delete("/{restaurant_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_restaurant_view(restaurant_id: int, db: AsyncSession = Depends(get_db)):
-    deleted = await delete_restaurant(db, restaurant_id)
+async def delete_restaurant_view(restaurant_id: int, repo: Repository = Depends(get_repository)):
+    deleted = await repo.delete_restaurant(restaurant_id)
     if not deleted:
         raise HTTPException(status_code=404, detail="Restaurant not found")
     return None
 
-# Search by cuisine type
-@router.get("/search", response_model=List[RestaurantOut])
-async def search_by_cuisine_view(
-    cuisine: str, skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=100), db: AsyncSession = Depends(get_db)
-):
-    return await search_by_cuisine(db, cuisine, skip=skip, limit=limit)
-
-# List only active restaurants
-@router.get("/active", response_model=List[RestaurantOut])
-async def list_active_restaurants_view(
-    skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=100), db: AsyncSession = Depends(get_db)
-):
-    return await list_active_restaurants(db, skip=skip, limit=limit)
-
 # --- Menu Item Endpoints under /restaurants ---
 
 # Add menu item to restaurant
 @router.post("/{restaurant_id}/menu-items/", response_model=MenuItemOut, status_code=status.HTTP_201_CREATED)
-async def add_menu_item(restaurant_id: int, item: MenuItemCreate, db: AsyncSession = Depends(get_db)):
-    return await create_menu_item(db, restaurant_id, item)
+async def add_menu_item(restaurant_id: int, item: MenuItemCreate, repo: Repository = Depends(get_repository)):
+    return await repo.create_menu_item(restaurant_id, item)
 
-# Get all menu items for a restaurant
+# Get all menu items for a restaurant (conditional on the menu version)
 @router.get("/{restaurant_id}/menu", response_model=List[MenuItemOut])
-async def get_menu(restaurant_id: int, skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=100), db: AsyncSession = Depends(get_db)):
-    return await get_menu_for_restaurant(db, restaurant_id, skip=skip, limit=limit)
+async def get_menu(
+    restaurant_id: int, request: Request, response: Response,
+    skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=100),
+    fields: Optional[str] = Query(None, description=FIELDS_HELP), repo: Repository = Depends(get_repository)
+):
+    projection = parse_fields(fields, MenuItemOut)
+    version = await repo.get_menu_version(restaurant_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    etag = make_etag("menu", restaurant_id, *version, skip, limit, fields_key(projection))
+    if is_not_modified(request, etag, version[0]):
+        return not_modified(etag, version[0])
+    set_validators(response, etag, version[0])
+    menu = await repo.get_menu_for_restaurant(restaurant_id, skip=skip, limit=limit, fields=projection)
+    return render(menu, MenuItemOut, response, many=True, fields=projection)
+
+# Replace the whole menu from a JSON document ({"items": [...]}) or a streamed CSV upload
+# (Content-Type: text/csv, header row with MenuItemCreate field names). Items are matched
+# by name; missing items are deleted unless delete_missing=false. One transaction.
+@router.put("/{restaurant_id}/menu", response_model=MenuSyncResult)
+async def replace_menu(
+    restaurant_id: int, request: Request,
+    delete_missing: bool = Query(True), db: AsyncSession = Depends(get_db)
+):
+    items = await read_menu_upload(request)
+    return await sync_menu(db, restaurant_id, items, delete_missing=delete_missing)
 
-# Get restaurant with all menu items
+# Get restaurant with all menu items (conditional on the restaurant + menu version)
 @router.get("/{restaurant_id}/with-menu", response_model=RestaurantWithMenu)
-async def get_restaurant_menu(restaurant_id: int, db: AsyncSession = Depends(get_db)):
+@router.get("/{restaurant_id}/full-details", response_model=RestaurantWithMenu)
+async def get_restaurant_menu(
+    restaurant_id: int, request: Request, response: Response, db: AsyncSession = Depends(get_db)
+):
+    version = await get_menu_version(db, restaurant_id)
+    if not version:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    etag = make_etag("full-details", restaurant_id, *version)
+    if is_not_modified(request, etag, version[0]):
+        return not_modified(etag, version[0])
     restaurant = await get_restaurant_with_menu(db, restaurant_id)
     if not restaurant:
         raise HTTPException(status_code=404, detail="Restaurant not found")
-    return restaurant
+    set_validators(response, etag, version[0])
+    return render(restaurant, RestaurantWithMenu, response)
+
+# Aggregated restaurant page: restaurant, menu, top reviews, rating and price stats in
+# one request. The composed document is cached (precompressed) for a short time.
+@router.get("/{restaurant_id}/page", response_model=RestaurantPage)
+async def get_restaurant_page(restaurant_id: int, request: Request):
+    return await cached_json(
+        request, page_cache_key(restaurant_id), PAGE_CACHE_TTL,
+        lambda: restaurant_page_document(restaurant_id), RESTAURANT_PAGES
+    )
+
+# Most ordered dishes at this restaurant over a sliding window
+@router.get("/{restaurant_id}/popular-items", response_model=List[PopularItem])
+async def get_restaurant_popular_items(
+    restaurant_id: int,
+    window: str = Query("24h", pattern=WINDOW_PATTERN),
+    limit: int = Query(10, ge=1, le=100),
+    db: AsyncSession = Depends(get_db)
+):
+    return await get_popular_menu_items(db, window, limit, restaurant_id=restaurant_id)
+
+# Order volume, revenue and average ticket per hour/day/week, served from the rollups
+@router.get("/{restaurant_id}/analytics", response_model=List[AnalyticsPoint])
+async def get_restaurant_analytics(
+    restaurant_id: int,
+    start: datetime = Query(..., alias="from"),
+    end: Optional[datetime] = Query(None, alias="to"),
+    bucket: str = Query("day", pattern=f"^({'|'.join(BUCKETS)})$"),
+    db: AsyncSession = Depends(get_db)
+):
+    if not await get_restaurant_version(db, restaurant_id):
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    start = to_naive_utc(start)
+    end = to_naive_utc(end or datetime.now(timezone.utc))
+    if end <= start:
+        raise HTTPException(status_code=400, detail="'to' must be after 'from'")
+    return await get_series(db, restaurant_id, start, end, bucket)
+
+# Inspect the delivery time estimator's averages for this restaurant and its dishes
+@router.get("/{restaurant_id}/eta-model", response_model=EtaModel)
+async def get_restaurant_eta_model(restaurant_id: int, db: AsyncSession = Depends(get_db)):
+    model = await get_eta_model(db, restaurant_id)
+    if model is None:
+        raise HTTPException(status_code=404, detail="Restaurant not found")
+    return model
 
 # Get average menu price per restaurant
 @router.get("/{restaurant_id}/menu/average-price", response_model=float)
@@ -247,54 +248,3 @@ async def average_menu_price(restaurant_id: int, db: AsyncSession = Depends(get_
     if avg is None:
         raise HTTPException(status_code=404, detail="No menu items found for this restaurant")
     return avg
-
-# --- Standalone Menu Item Router ---
-menu_router = APIRouter(prefix="/menu-items", tags=["menu-items"])
-
-# List all menu items
-@menu_router.get("/", response_model=List[MenuItemOut])
-async def list_menu_items_view(skip: int = Query(0, ge=0), limit: int = Query(10, ge=1, le=100), db: AsyncSession = Depends(get_db)):
-    return await list_menu_items(db, skip=skip, limit=limit)
-
-# Get specific menu item
-@menu_router.get("/{item_id}", response_model=MenuItemOut)
-async def get_menu_item_view(item_id: int, db: AsyncSession = Depends(get_db)):
-    item = await get_menu_item(db, item_id)
-    if not item:
-        raise HTTPException(status_code=404, detail="Menu item not found")
-    return item
-
-# Get menu item with restaurant details
-@menu_router.get("/{item_id}/with-restaurant", response_model=MenuItemWithRestaurant)
-async def get_menu_item_with_restaurant_view(item_id: int, db: AsyncSession = Depends(get_db)):
-    item = await get_menu_item_with_restaurant(db, item_id)
-    if not item:
-        raise HTTPException(status_code=404, detail="Menu item not found")
-    return item
-
-# Update menu item
-@menu_router.put("/{item_id}", response_model=MenuItemOut)
-async def update_menu_item_view(item_id: int, item: MenuItemUpdate, db: AsyncSession = Depends(get_db)):
-    updated = await update_menu_item(db, item_id, item)
-    if not updated:
-        raise HTTPException(status_code=404, detail="Menu item not found")
-    return updated
-
-# Delete menu item
-@menu_router.delete("/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
-async def delete_menu_item_view(item_id: int, db: AsyncSession = Depends(get_db)):
-    deleted = await delete_menu_item(db, item_id)
-    if not deleted:
-        raise HTTPException(status_code=404, detail="Menu item not found")
-    return None
-
-# Search menu items by category and vegetarian
-@menu_router.get("/search", response_model=List[MenuItemOut])
-async def search_menu_items_view(
-    category: Optional[str] = None,
-    vegetarian: Optional[bool] = None,
-    skip: int = Query(0, ge=0),
-    limit: int = Query(10, ge=1, le=100),
-    db: AsyncSession = Depends(get_db)
-):
-    return await search_menu_items(db, category, vegetarian, skip=skip, limit=limit)
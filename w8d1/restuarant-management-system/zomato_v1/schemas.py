@@ -2,7 +2,7 @@
 
 # Import required modules from Pydantic and typing
 from pydantic import BaseModel, Field, validator, condecimal
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 from datetime import time, datetime
 import re
 
@@ -88,6 +88,11 @@ class CustomerBase(BaseModel):
             raise ValueError("Invalid phone number format")
         return v
 
+    # Stored and compared normalized (email_index.normalize_email)
+    @validator('email')
+    def normalize_email(cls, v):
+        return v.strip().lower()
+
 class CustomerCreate(CustomerBase):
     pass
 
@@ -107,10 +112,20 @@ class CustomerUpdate(BaseModel):
             raise ValueError("Invalid phone number format")
         return v
 
+    @validator('email')
+    def normalize_email(cls, v):
+        return v.strip().lower() if v is not None else v
+
+# Answer of GET /customers/email-available
+class EmailAvailability(BaseModel):
+    email: str
+    available: bool
+
 class CustomerOut(CustomerBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime]
+    version: int
     class Config:
         orm_mode = True
 
@@ -142,7 +157,8 @@ class OrderBase(BaseModel):
     special_instructions: Optional[str] = None
 
 class OrderCreate(OrderBase):
-    order_items: List[OrderItemCreate]
+    customer_id: int
+    order_items: List[OrderItemCreate] = Field(..., min_items=1)
 
 class OrderUpdate(BaseModel):
     order_status: Optional[str] = None
@@ -156,12 +172,26 @@ class OrderOut(OrderBase):
     total_amount: Decimal
     order_date: datetime
     delivery_time: Optional[datetime]
+    estimated_delivery_time: Optional[datetime] = None  # None for archived orders
+    version: Optional[int] = None  # None for archived orders
     order_items: List['OrderItemOut'] = []
     restaurant: Optional['RestaurantOut']
     customer: Optional['CustomerOut']
     class Config:
         orm_mode = True
 
+# One move in a batch status update; applied only if the order is still in expected_status
+class OrderStatusChange(BaseModel):
+    order_id: int
+    order_status: str = Field(..., min_length=1, max_length=30)
+    expected_status: str = Field(..., min_length=1, max_length=30)
+
+# result: "updated", "conflict" (the order was in another status, given in order_status) or "not_found"
+class OrderStatusResult(BaseModel):
+    order_id: int
+    result: str
+    order_status: Optional[str] = None
+
 # --- Review Schemas ---
 class ReviewBase(BaseModel):
     rating: float = Field(..., ge=0.0, le=5.0)
@@ -213,6 +243,7 @@ class MenuItemOut(MenuItemBase):
     restaurant_id: int
     created_at: datetime
     updated_at: Optional[datetime]
+    version: int
 
     class Config:
         orm_mode = True
@@ -236,10 +267,144 @@ class RestaurantOut(RestaurantBase):
     id: int
     created_at: datetime
     updated_at: Optional[datetime]
+    version: int
+
+    class Config:
+        orm_mode = True
+
+# Result of a full menu sync (PUT /restaurants/{id}/menu)
+class MenuSyncResult(BaseModel):
+    inserted: int
+    updated: int
+    deleted: int
+    unchanged: int
+
+# Leaderboard entry for the popular dishes endpoints
+class PopularItem(BaseModel):
+    menu_item_id: int
+    restaurant_id: int
+    name: str
+    quantity: int
+
+# Averages of the delivery time estimator (see eta.py); None until the first observation
+class EtaStatOut(BaseModel):
+    prep_seconds: Optional[float]
+    prep_samples: int
+    delivery_seconds: Optional[float]
+    delivery_samples: int
+
+class EtaItemStat(EtaStatOut):
+    menu_item_id: int
+    name: str
+    preparation_time: Optional[int]  # Menu value in minutes, used until the item has samples
+
+# GET /restaurants/{id}/eta-model
+class EtaModel(BaseModel):
+    restaurant_id: int
+    alpha: float
+    overall: EtaStatOut
+    restaurant: EtaStatOut
+    items: List[EtaItemStat]
+
+# One bucket of GET /restaurants/{id}/analytics
+class AnalyticsPoint(BaseModel):
+    bucket_start: datetime
+    order_count: int
+    revenue: float
+    average_ticket: float
+
+# Compact review for embedding in other documents (no nested customer/order)
+class ReviewSummary(ReviewBase):
+    id: int
+    customer_id: int
+    created_at: datetime
+
+    class Config:
+        orm_mode = True
+
+# Customer home screen summary (GET /customers/{id}/summary)
+class SummaryOrder(BaseModel):
+    id: int
+    restaurant_id: int
+    restaurant_name: str
+    order_date: datetime
+    total_amount: float
+    order_status: str
+    item_count: int
+
+class FavoriteRestaurant(BaseModel):
+    restaurant_id: int
+    name: str
+    order_count: int
+    last_ordered: Optional[datetime]
+
+class ReorderItem(BaseModel):
+    menu_item_id: int
+    restaurant_id: int
+    name: str
+    order_count: int
+    quantity: int
+
+class CustomerSummaryOut(BaseModel):
+    customer_id: int
+    order_count: int
+    recent_orders: List[SummaryOrder] = []
+    favorite_restaurants: List[FavoriteRestaurant] = []
+    reorder_items: List[ReorderItem] = []
+
+# Recommendations for a customer (GET /customers/{id}/recommendations)
+class RecommendedItem(BaseModel):
+    menu_item_id: int
+    restaurant_id: int
+    name: str
+    price: Decimal
+    score: float
+
+class RecommendedRestaurant(BaseModel):
+    restaurant_id: int
+    name: str
+    cuisine_type: str
+    rating: Optional[float]
+    score: float
+
+class CustomerRecommendations(BaseModel):
+    customer_id: int
+    menu_items: List[RecommendedItem] = []
+    restaurants: List[RecommendedRestaurant] = []
+
+# Background jobs (/jobs)
+class JobCreate(BaseModel):
+    type: str
+    params: Dict[str, Any] = {}
+    delay_seconds: int = Field(0, ge=0)
+
+class JobOut(BaseModel):
+    id: int
+    type: str
+    params: Dict[str, Any]
+    status: str
+    attempts: int
+    max_attempts: int
+    run_after: datetime
+    result: Optional[Any]
+    error: Optional[str]
+    created_at: Optional[datetime]
+    started_at: Optional[datetime]
+    finished_at: Optional[datetime]
+    worker: Optional[str]
+    heartbeat_at: Optional[datetime]
 
     class Config:
         orm_mode = True
 
+# Aggregated restaurant page: everything the restaurant screen needs in one response
+class RestaurantPage(BaseModel):
+    restaurant: RestaurantOut
+    menu: List[MenuItemOut] = []
+    top_reviews: List[ReviewSummary] = []
+    rating: float = 0.0
+    average_price: float = 0.0
+
 # For forward references in nested schemas
 MenuItemWithRestaurant.update_forward_refs()
 OrderItemOut.update_forward_refs()
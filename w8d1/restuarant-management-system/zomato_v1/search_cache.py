@@ -0,0 +1,91 @@
+# Result-id cache for the filtered search endpoints (menu items by category, restaurants
+# by cuisine)
+#
+# A search's filters are normalized first (whitespace collapsed, case folded), so
+# "Pizza", " pizza " and "PIZZA" are one entry. An entry holds only the ids of the
+# matching page, in order; the caller loads the rows themselves by primary key, so a
+# cached search never serves stale row contents, only a possibly stale membership.
+#
+# Membership is kept correct by invalidation: a mutation that can change which rows
+# match calls invalidate() with the category / cuisine values involved (old and new),
+# and every cached search whose term is a substring of one of them (the searches use
+# ILIKE '%term%') is dropped, along with the unfiltered searches. A search built while
+# a mutation commits can still store the old membership; SEARCH_CACHE_TTL bounds that.
+#
+# Entries live in the shared cache backend. The cached terms of each kind are tracked
+# in a registry (see cache_registry.py) so any worker can invalidate them; a term drops
+# out of it when its entry expires, so the registry doesn't grow with every distinct
+# search ever made.
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Awaitable, Callable, Iterable, List, Optional, Tuple
+
+from fastapi_cache import FastAPICache
+
+import cache_registry
+
+logger = logging.getLogger(__name__)
+
+SEARCH_CACHE_TTL = int(os.getenv("SEARCH_CACHE_TTL", "300"))
+
+
+# The one spelling of a search term that is cached and queried; "" means no filter
+def normalize(term: Optional[str]) -> str:
+    return " ".join(term.split()).casefold() if term else ""
+
+
+def _entry_key(kind: str, filters: Tuple[Any, ...]) -> str:
+    digest = hashlib.sha1(json.dumps(filters).encode()).hexdigest()
+    return f"{FastAPICache.get_prefix()}:search:{kind}:{digest}"
+
+
+def _registry(kind: str) -> str:
+    return f"search:{kind}"
+
+
+# The ids for a search, from the cache or from build() (then cached). `filters` is the
+# full, normalized filter tuple, starting with the term that invalidation matches on.
+async def cached_ids(
+    kind: str, filters: Tuple[Any, ...], build: Callable[[], Awaitable[List[int]]]
+) -> List[int]:
+    if not FastAPICache.get_enable():
+        return await build()
+    key = _entry_key(kind, filters)
+    backend = FastAPICache.get_backend()
+    try:
+        entry = await backend.get(key)
+        if entry is not None:
+            return json.loads(entry)
+    except Exception:
+        logger.warning(f"Error retrieving search cache key '{key}' from backend:", exc_info=True)
+    ids = await build()
+    try:
+        # Registry members are "<term>\x00<entry key>"
+        await cache_registry.add(_registry(kind), f"{filters[0]}\x00{key}", time.time() + SEARCH_CACHE_TTL)
+        await backend.set(key, json.dumps(ids).encode(), SEARCH_CACHE_TTL)
+    except Exception:
+        logger.warning(f"Error setting search cache key '{key}' in backend:", exc_info=True)
+    return ids
+
+
+# Drop the cached searches of `kind` that rows with these category / cuisine values
+# could appear in. Call after the mutation has been committed.
+async def invalidate(kind: str, values: Iterable[Optional[str]]) -> int:
+    if not FastAPICache.get_enable():
+        return 0
+    values = [normalize(value) for value in values if value]
+    try:
+        stale = {
+            member for member in await cache_registry.members(_registry(kind))
+            if any(member.partition("\x00")[0] in value for value in values) or member.startswith("\x00")
+        }
+        if stale:
+            await cache_registry.delete_entries([member.partition("\x00")[2] for member in stale])
+            await cache_registry.remove(_registry(kind), stale)
+        return len(stale)
+    except Exception:
+        logger.warning(f"Could not invalidate {kind} searches for {values}", exc_info=True)
+        return 0
@@ -0,0 +1,271 @@
+# Synthetic data generator: a reproducible, realistically skewed dataset at any scale
+#
+#   python seed.py --scale small|medium|large [--seed 42] [--orders N] [--end 2024-06-30]
+#
+# Generates restaurants with menus, customers, orders with items and reviews into the
+# database at DATABASE_URL, which must be empty (the schema is created if needed).
+#
+#   restaurants   popularity is Zipfian: a few restaurants get most of the orders
+#   customers     order frequency is Zipfian too (a long tail of one-off customers);
+#                 each has three favourite restaurants that get most of their orders
+#   menu items    within a restaurant, dish popularity is Zipfian
+#   order times   spread over --days days with lunch and dinner peaks, busier weekends,
+#                 and a few short promotional bursts that take a share of the orders
+#   statuses      old orders are delivered (some cancelled); the last two hours are in
+#                 progress
+#   reviews       a fraction of delivered orders, scored around the restaurant's quality
+#
+# Rows are written with Core bulk inserts (executemany), in fixed-size batches, one
+# transaction each, bypassing the ORM unit of work. Restaurant ratings (the mean of
+# their reviews) are accumulated while generating and written with one bulk UPDATE.
+# --rollups also backfills the analytics rollups (one row per restaurant and hour, so
+# that takes longer than the orders themselves at scale). The same --seed, scale and --end give the same
+# database; without --end the timeline ends at the current hour, so only the absolute
+# timestamps move between runs.
+import argparse
+import asyncio
+import logging
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+import numpy as np
+from sqlalchemy import bindparam, func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+import analytics
+import migrations
+from database import AsyncSessionLocal, engine
+from models import Customer, MenuItem, Order, OrderItem, Restaurant, Review
+
+logger = logging.getLogger(__name__)
+
+# restaurants, customers, orders
+SCALES: Dict[str, Dict[str, int]] = {
+    "small": {"restaurants": 200, "customers": 2_000, "orders": 20_000},
+    "medium": {"restaurants": 2_000, "customers": 100_000, "orders": 1_000_000},
+    "large": {"restaurants": 20_000, "customers": 1_000_000, "orders": 10_000_000},
+}
+DEFAULT_SEED = 42
+BATCH = 50_000  # rows per insert; fixed so a seed always draws the same random stream
+
+RESTAURANT_ZIPF = 0.9
+CUSTOMER_ZIPF = 0.9
+DISH_ZIPF = 1.6  # numpy zipf parameter (> 1) for the dish picked within a restaurant
+FAVOURITE_SHARE = 0.6  # share of a customer's orders placed at one of their favourites
+MENU_SIZE = (10, 40)
+ITEMS_PER_ORDER_P = 0.55  # geometric: ~1.8 lines per order on average, capped at 6
+REVIEW_RATE = 0.15
+CANCEL_RATE = 0.04
+IN_PROGRESS_WINDOW = timedelta(hours=2)
+IN_PROGRESS_STATUSES = ["placed", "confirmed", "preparing", "out_for_delivery"]
+# Relative order volume by hour of day (UTC): lunch and dinner peaks
+HOUR_WEIGHTS = np.array([1, 0.5, 0.3, 0.2, 0.2, 0.3, 0.6, 1.2, 2, 2.5, 3, 5,
+                         9, 8, 4, 3, 3, 5, 8, 11, 10, 7, 4, 2], dtype=float)
+WEEKEND_BOOST = 1.3
+BURSTS_PER_WEEK = 2
+BURST_SHARE = 0.05  # share of all orders falling into burst windows
+BURST_HOURS = 2
+CUISINES = ["Italian", "Indian", "Chinese", "Mexican", "Thai", "Japanese", "American", "Mediterranean"]
+CATEGORIES = ["Starter", "Main", "Dessert", "Drink", "Side"]
+
+
+@lru_cache(maxsize=None)
+def _money(cents: int) -> Decimal:
+    return Decimal(cents).scaleb(-2)
+
+
+# Zipf weights over n ids, with the ranks shuffled so popularity isn't ordered by id
+def _zipf_weights(rng: np.random.Generator, n: int, s: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** s
+    rng.shuffle(weights)
+    return weights / weights.sum()
+
+
+# Slot weights (one per hour of the timeline) for daily and weekly seasonality plus bursts
+def _hour_weights(rng: np.random.Generator, start: datetime, hours: int) -> np.ndarray:
+    slots = np.array([start + timedelta(hours=h) for h in range(hours)], dtype="datetime64[h]")
+    hour_of_day = (slots - slots.astype("datetime64[D]")).astype(int)
+    weekday = (slots.astype("datetime64[D]").astype(int) + 3) % 7  # 1970-01-01 was a Thursday
+    weights = HOUR_WEIGHTS[hour_of_day] * np.where(weekday >= 5, WEEKEND_BOOST, 1.0)
+    weights /= weights.sum()
+    bursts = max(1, int(hours / (24 * 7) * BURSTS_PER_WEEK))
+    burst = np.zeros(hours)
+    for first in rng.integers(0, max(hours - BURST_HOURS, 1), bursts):
+        burst[first:first + BURST_HOURS] = 1.0
+    return (1 - BURST_SHARE) * weights + BURST_SHARE * burst / burst.sum()
+
+
+async def _insert(db_engine: AsyncEngine, table, rows: List[dict]) -> None:
+    for i in range(0, len(rows), BATCH):
+        async with db_engine.begin() as conn:
+            await conn.execute(insert(table), rows[i:i + BATCH])
+
+
+async def seed(
+    db_engine: AsyncEngine, restaurants: int, customers: int, orders: int,
+    seed_value: int = DEFAULT_SEED, days: int = 90, end: Optional[datetime] = None
+) -> Dict[str, int]:
+    rng = np.random.default_rng(seed_value)
+    end = end or datetime.now(timezone.utc).replace(tzinfo=None, minute=0, second=0, microsecond=0)
+    start = end - timedelta(days=days)
+    created = start - timedelta(days=30)
+    counts = {}
+
+    # Restaurants and menus
+    quality = rng.beta(5, 2, restaurants) * 4 + 1  # mean review score, 1..5
+    menu_sizes = rng.integers(MENU_SIZE[0], MENU_SIZE[1] + 1, restaurants)
+    first_item = np.concatenate(([0], np.cumsum(menu_sizes)[:-1])) + 1  # first menu item id per restaurant
+    cuisine = rng.integers(0, len(CUISINES), restaurants)
+    await _insert(db_engine, Restaurant, [
+        {"id": r + 1, "name": f"{CUISINES[cuisine[r]]} Kitchen {r + 1}", "description": f"Seeded restaurant {r + 1}",
+         "cuisine_type": CUISINES[cuisine[r]], "address": f"{r + 1} Market Street", "phone_number": "+15550100000",
+         "rating": 0.0, "is_active": True, "opening_time": datetime(2000, 1, 1, 8).time(),
+         "closing_time": datetime(2000, 1, 1, 23).time(), "created_at": created, "updated_at": created}
+        for r in range(restaurants)
+    ])
+    counts["restaurants"] = restaurants
+
+    total_items = int(menu_sizes.sum())
+    prices = rng.integers(150, 3500, total_items)  # cents
+    item_restaurant = np.repeat(np.arange(restaurants), menu_sizes)
+    vegetarian = rng.random(total_items) < 0.35
+    vegan = vegetarian & (rng.random(total_items) < 0.3)
+    category = rng.integers(0, len(CATEGORIES), total_items)
+    prep_time = rng.integers(5, 45, total_items)
+    await _insert(db_engine, MenuItem, [
+        {"id": i + 1, "name": f"Dish {i + 1 - int(first_item[item_restaurant[i]]) + 1}", "description": None,
+         "price": _money(int(prices[i])), "category": CATEGORIES[category[i]], "is_vegetarian": bool(vegetarian[i]),
+         "is_vegan": bool(vegan[i]), "is_available": True, "preparation_time": int(prep_time[i]),
+         "restaurant_id": int(item_restaurant[i]) + 1, "created_at": created, "updated_at": created}
+        for i in range(total_items)
+    ])
+    counts["menu_items"] = total_items
+
+    # Customers, each with three favourite restaurants
+    restaurant_p = _zipf_weights(rng, restaurants, RESTAURANT_ZIPF)
+    customer_p = _zipf_weights(rng, customers, CUSTOMER_ZIPF)
+    favourites = rng.choice(restaurants, size=(customers, 3), p=restaurant_p)
+    await _insert(db_engine, Customer, [
+        {"id": c + 1, "name": f"Customer {c + 1}", "email": f"customer{c + 1}@example.com",
+         "phone_number": "+15550200000", "address": f"{c + 1} Residential Road", "is_active": True,
+         "created_at": created, "updated_at": created}
+        for c in range(customers)
+    ])
+    counts["customers"] = customers
+
+    # Orders, their items and reviews, one batch of orders at a time
+    hours = days * 24
+    slot_p = _hour_weights(rng, start, hours)
+    in_progress_after = np.datetime64(end - IN_PROGRESS_WINDOW, "s")
+    next_item_id = next_review_id = 1
+    rating_sum, rating_count = np.zeros(restaurants), np.zeros(restaurants)
+    counts.update(orders=0, order_items=0, reviews=0)
+    for first_order in range(0, orders, BATCH):
+        n = min(BATCH, orders - first_order)
+        order_ids = np.arange(first_order + 1, first_order + n + 1)
+        customer = rng.choice(customers, n, p=customer_p)
+        restaurant = np.where(
+            rng.random(n) < FAVOURITE_SHARE,
+            favourites[customer, rng.integers(0, 3, n)],
+            rng.choice(restaurants, n, p=restaurant_p),
+        )
+        slot = rng.choice(hours, n, p=slot_p)
+        order_date = (np.datetime64(start, "s") + slot * 3600 + rng.integers(0, 3600, n)).astype("datetime64[s]")
+        order_date.sort()  # ids follow time, as they would in production
+
+        lines = np.minimum(rng.geometric(ITEMS_PER_ORDER_P, n), 6)
+        line_order = np.repeat(np.arange(n), lines)
+        line_restaurant = restaurant[line_order]
+        dish = (rng.zipf(DISH_ZIPF, len(line_order)) - 1) % menu_sizes[line_restaurant]
+        line_item = first_item[line_restaurant] + dish
+        quantity = np.minimum(rng.geometric(0.7, len(line_order)), 5)
+        line_cents = prices[line_item - 1] * quantity
+        totals = np.zeros(n, dtype=np.int64)
+        np.add.at(totals, line_order, line_cents)
+
+        status = np.where(rng.random(n) < CANCEL_RATE, "cancelled", "delivered").astype(object)
+        recent = order_date >= in_progress_after
+        status[recent] = rng.choice(IN_PROGRESS_STATUSES, int(recent.sum()))
+        delivered_at = order_date + rng.integers(20 * 60, 70 * 60, n)
+
+        dates = order_date.tolist()
+        deliveries = delivered_at.astype("datetime64[s]").tolist()
+        await _insert(db_engine, Order, [
+            {"id": int(order_ids[i]), "customer_id": int(customer[i]) + 1, "restaurant_id": int(restaurant[i]) + 1,
+             "order_status": status[i], "total_amount": _money(int(totals[i])),
+             "delivery_address": f"{int(customer[i]) + 1} Residential Road", "special_instructions": None,
+             "order_date": dates[i], "delivery_time": deliveries[i] if status[i] == "delivered" else None}
+            for i in range(n)
+        ])
+        await _insert(db_engine, OrderItem, [
+            {"id": next_item_id + j, "order_id": int(order_ids[line_order[j]]), "menu_item_id": int(line_item[j]),
+             "quantity": int(quantity[j]), "item_price": _money(int(prices[line_item[j] - 1])), "special_requests": None}
+            for j in range(len(line_order))
+        ])
+        next_item_id += len(line_order)
+
+        reviewed = np.flatnonzero((status == "delivered") & (rng.random(n) < REVIEW_RATE))
+        scores = np.clip(np.round(rng.normal(quality[restaurant[reviewed]], 0.8) * 2) / 2, 1, 5)
+        review_delay = rng.integers(3600, 48 * 3600, len(reviewed))
+        review_dates = (order_date[reviewed] + review_delay).astype("datetime64[s]").tolist()
+        await _insert(db_engine, Review, [
+            {"id": next_review_id + k, "customer_id": int(customer[i]) + 1, "restaurant_id": int(restaurant[i]) + 1,
+             "order_id": int(order_ids[i]), "rating": float(scores[k]), "comment": None, "created_at": review_dates[k]}
+            for k, i in enumerate(reviewed)
+        ])
+        next_review_id += len(reviewed)
+        np.add.at(rating_sum, restaurant[reviewed], scores)
+        np.add.at(rating_count, restaurant[reviewed], 1)
+
+        counts["orders"] += n
+        counts["order_items"] += len(line_order)
+        counts["reviews"] += len(reviewed)
+        logger.info(f"Seeded {counts['orders']}/{orders} orders")
+
+    ratings = np.divide(rating_sum, rating_count, out=np.zeros(restaurants), where=rating_count > 0)
+    async with db_engine.begin() as conn:
+        await conn.execute(
+            update(Restaurant).where(Restaurant.id == bindparam("restaurant_id")).values(rating=bindparam("average")),
+            [{"restaurant_id": r + 1, "average": float(ratings[r])} for r in range(restaurants)]
+        )
+    return counts
+
+
+async def _main(args: argparse.Namespace) -> None:
+    sizes = dict(SCALES[args.scale])
+    for name in sizes:
+        if getattr(args, name) is not None:
+            sizes[name] = getattr(args, name)
+    engine.echo = False
+    await migrations.upgrade(engine)
+    async with AsyncSessionLocal() as session:
+        if (await session.execute(select(func.count()).select_from(Restaurant))).scalar():
+            raise SystemExit("The database already has data; seed.py only fills an empty database")
+
+    started = time.perf_counter()
+    counts = await seed(engine, seed_value=args.seed, days=args.days, end=args.end, **sizes)
+    loaded = time.perf_counter()
+    rows = sum(counts.values())
+    print(", ".join(f"{count} {name}" for name, count in counts.items()))
+    print(f"Loaded {rows} rows in {loaded - started:.1f}s ({rows / (loaded - started):,.0f} rows/s)")
+    if args.rollups:
+        async with AsyncSessionLocal() as session:
+            rollup_rows = await analytics.backfill(session)
+        print(f"Backfilled {rollup_rows} rollup rows in {time.perf_counter() - loaded:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill an empty database with synthetic data")
+    parser.add_argument("--scale", choices=SCALES, default="small")
+    parser.add_argument("--seed", type=int, default=DEFAULT_SEED)
+    parser.add_argument("--restaurants", type=int)
+    parser.add_argument("--customers", type=int)
+    parser.add_argument("--orders", type=int)
+    parser.add_argument("--days", type=int, default=90, help="length of the order history")
+    parser.add_argument("--end", type=datetime.fromisoformat, help="end of the order history (UTC); default now")
+    parser.add_argument("--rollups", action="store_true", help="also backfill the analytics rollups")
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    asyncio.run(_main(parser.parse_args()))
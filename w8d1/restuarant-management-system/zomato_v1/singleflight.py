@@ -0,0 +1,33 @@
+# Request coalescing: concurrent calls for the same key share one in-flight coroutine
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Set
+
+
+class SingleFlight:
+    def __init__(self) -> None:
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._background: Set[asyncio.Task] = set()
+
+    # Run `fn()` unless a call for `key` is already in flight, in which case wait for
+    # that one and share its result (or exception). The work runs in its own task, so
+    # one caller being cancelled (client gone) doesn't cancel it for the others.
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    # Fire-and-forget variant for background refreshes; a no-op if `key` is already in flight
+    def spawn(self, key: str, fn: Callable[[], Awaitable[Any]]) -> None:
+        if key in self._calls:
+            return
+        task = asyncio.ensure_future(self.do(key, fn))
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+        # Errors are logged by the refresher itself; don't warn about unretrieved ones
+        task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def in_flight(self, key: str) -> bool:
+        return key in self._calls
@@ -0,0 +1,90 @@
+# Sliding window counters of the popular-dishes leaderboard, driven by a fake clock
+# Run from the zomato_v1 directory:  python -m pytest tests
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import leaderboard
+
+T0 = 1_699_999_200.0  # on an hour boundary, so minute and hour buckets start here
+MINUTE, HOUR, DAY = 60, 3600, 86400
+KEY = (1, 5)  # (restaurant_id, menu_item_id)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    now = [T0]
+    monkeypatch.setattr(leaderboard.time, "time", lambda: now[0])
+    return now
+
+
+# Each window's counts as a read sees them (expired buckets dropped first)
+def counts(windows):
+    return {name: dict(window.top(100)) for name, window in windows.items()}
+
+
+def test_counts_leave_each_window_as_it_slides(clock):
+    windows = leaderboard._new_windows()
+    leaderboard.record(*KEY, 2, T0, windows)
+    assert counts(windows) == {"1h": {KEY: 2}, "24h": {KEY: 2}, "7d": {KEY: 2}}
+
+    clock[0] = T0 + HOUR
+    assert counts(windows) == {"1h": {}, "24h": {KEY: 2}, "7d": {KEY: 2}}
+
+    clock[0] = T0 + DAY
+    assert counts(windows) == {"1h": {}, "24h": {}, "7d": {KEY: 2}}
+
+    clock[0] = T0 + 7 * DAY
+    assert counts(windows) == {"1h": {}, "24h": {}, "7d": {}}
+
+
+def test_top_expires_before_reading(clock):
+    windows = leaderboard._new_windows()
+    leaderboard.record(1, 5, 3, T0, windows)
+    leaderboard.record(1, 6, 1, T0 + 30 * MINUTE, windows)
+    clock[0] = T0 + 30 * MINUTE
+    assert windows["1h"].top(10) == [((1, 5), 3), ((1, 6), 1)]
+    clock[0] = T0 + HOUR
+    assert windows["1h"].top(10, restaurant_id=1) == [((1, 6), 1)]
+
+
+def test_removal_at_order_time_leaves_no_phantom_count(clock):
+    windows = leaderboard._new_windows()
+    leaderboard.record(*KEY, 2, T0, windows)
+    clock[0] = T0 + 30 * MINUTE
+    leaderboard.record(*KEY, -2, T0, windows)  # item removed from the order later
+    assert counts(windows)["1h"] == {}
+
+    for now in (T0 + HOUR, T0 + HOUR + 30 * MINUTE, T0 + 2 * HOUR):
+        clock[0] = now
+        assert counts(windows)["1h"] == {}
+
+
+def test_removal_keeps_other_orders_counts(clock):
+    windows = leaderboard._new_windows()
+    leaderboard.record(*KEY, 3, T0, windows)
+    leaderboard.record(*KEY, 1, T0 + 10 * MINUTE, windows)
+    clock[0] = T0 + 30 * MINUTE
+    leaderboard.record(*KEY, -1, T0 + 10 * MINUTE, windows)
+    assert counts(windows)["1h"] == {KEY: 3}
+
+    clock[0] = T0 + 50 * MINUTE
+    assert counts(windows)["1h"] == {KEY: 3}
+    clock[0] = T0 + HOUR
+    assert counts(windows)["1h"] == {}
+
+
+def test_counts_older_than_the_window_are_ignored(clock):
+    windows = leaderboard._new_windows()
+    leaderboard.record(*KEY, 4, T0 - 2 * HOUR, windows)
+    assert counts(windows) == {"1h": {}, "24h": {KEY: 4}, "7d": {KEY: 4}}
+
+
+def test_order_ts_treats_naive_dates_as_utc():
+    from datetime import datetime, timezone
+    naive = datetime(2024, 1, 1, 12, 0)
+    assert leaderboard.order_ts(naive) == naive.replace(tzinfo=timezone.utc).timestamp()
+    assert leaderboard.order_ts(naive.replace(tzinfo=timezone.utc)) == leaderboard.order_ts(naive)
@@ -0,0 +1,117 @@
+# Cache warmup: pre-populate the hottest cached documents before the app reports ready
+#
+# The hot-key list is the first pages of the restaurant listings plus the page
+# documents of the restaurants with the most orders over the last WARMUP_DAYS days
+# (read from the daily analytics rollups, so choosing them is cheap). Entries are built
+# concurrently, at most WARMUP_CONCURRENCY at a time, and stored in every encoding
+# cached_json can serve. GET /ready reports the warmup state.
+#
+# The cache is shared by all worker processes, so only one of them warms it at a time
+# (a lock in the cache); the rest report ready straight away.
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from fastapi_cache import FastAPICache
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from compression import release_lock, store_json, try_lock
+from crud import RESTAURANT_LISTS, RESTAURANT_PAGES
+from database import AsyncSessionLocal, run_in_session
+from models import OrderRollup, Restaurant
+from routes.restaurants import (
+    LIST_CACHE_TTL, PAGE_CACHE_TTL, list_cache_key, page_cache_key,
+    restaurant_list_document, restaurant_page_document
+)
+
+logger = logging.getLogger(__name__)
+
+WARMUP_TOP_N = int(os.getenv("WARMUP_TOP_N", "50"))
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "8"))
+WARMUP_LIST_PAGES = int(os.getenv("WARMUP_LIST_PAGES", "3"))
+WARMUP_DAYS = 7
+LIST_PAGE_SIZE = 10  # the list routes' default limit
+WARMUP_LOCK_TTL = 120  # seconds; released as soon as the warmup finishes
+
+# Current warmup state, reported by GET /ready
+STATE: Dict[str, object] = {"status": "pending", "warmed": 0, "failed": 0, "duration_ms": None}
+
+
+# Restaurants with the most orders recently; falls back to the best rated active ones
+async def hot_restaurant_ids(db: AsyncSession, n: int = WARMUP_TOP_N) -> List[int]:
+    since = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=WARMUP_DAYS)
+    result = await db.execute(
+        select(OrderRollup.restaurant_id)
+        .where(OrderRollup.granularity == "day", OrderRollup.bucket_start >= since)
+        .group_by(OrderRollup.restaurant_id)
+        .order_by(func.sum(OrderRollup.order_count).desc())
+        .limit(n)
+    )
+    ids = list(result.scalars().all())
+    if len(ids) < n:
+        result = await db.execute(
+            select(Restaurant.id)
+            .where(Restaurant.is_active.is_(True), Restaurant.id.notin_(ids))
+            .order_by(Restaurant.rating.desc(), Restaurant.id)
+            .limit(n - len(ids))
+        )
+        ids.extend(result.scalars().all())
+    return ids
+
+
+# (cache key, ttl, builder, cache group) for everything worth warming
+async def hot_keys(n: int = WARMUP_TOP_N) -> List[Tuple[str, int, Callable[[], Awaitable[object]], Optional[str]]]:
+    keys = []
+    for kind in ("list", "active"):
+        for page in range(WARMUP_LIST_PAGES):
+            skip = page * LIST_PAGE_SIZE
+            keys.append((
+                list_cache_key(kind, skip, LIST_PAGE_SIZE), LIST_CACHE_TTL,
+                lambda kind=kind, skip=skip: run_in_session(restaurant_list_document, kind, skip, LIST_PAGE_SIZE),
+                RESTAURANT_LISTS
+            ))
+    async with AsyncSessionLocal() as session:
+        for restaurant_id in await hot_restaurant_ids(session, n):
+            keys.append((
+                page_cache_key(restaurant_id), PAGE_CACHE_TTL,
+                lambda restaurant_id=restaurant_id: restaurant_page_document(restaurant_id),
+                RESTAURANT_PAGES
+            ))
+    return keys
+
+
+# Build and store the hot entries with bounded parallelism. Individual failures are
+# logged and counted; they never stop the app from starting.
+async def warm_cache(n: int = WARMUP_TOP_N, concurrency: int = WARMUP_CONCURRENCY) -> Dict[str, object]:
+    if not FastAPICache.get_enable():
+        STATE.update(status="ready", warmed=0, failed=0, duration_ms=0)
+        return STATE
+    if not await try_lock("warmup", WARMUP_LOCK_TTL):
+        STATE.update(status="ready", warmed=0, failed=0, duration_ms=0, warmed_by="another worker")
+        return STATE
+    STATE.update(status="warming", warmed=0, failed=0, duration_ms=None, warmed_by="this worker")
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def warm(key: str, ttl: int, build: Callable[[], Awaitable[object]], group: Optional[str]) -> None:
+        async with semaphore:
+            try:
+                await store_json(key, ttl, await build(), group)
+                STATE["warmed"] += 1
+            except Exception:
+                logger.warning(f"Cache warmup failed for '{key}'", exc_info=True)
+                STATE["failed"] += 1
+
+    try:
+        await asyncio.gather(*(warm(*entry) for entry in await hot_keys(n)))
+    except Exception:
+        logger.warning("Cache warmup aborted", exc_info=True)
+    finally:
+        await release_lock("warmup")
+    # Serving partly cold beats never becoming ready
+    STATE.update(status="ready", duration_ms=round((time.perf_counter() - started) * 1000, 1))
+    return STATE